@@ -1,3 +1,4 @@
+import configparser
 import json
 import sys
 import paho.mqtt.client as mqtt
@@ -12,6 +13,7 @@ class AlarmConsole:
 
     def start(self):
         self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
         self.client.connect(self.broker_address, self.broker_port, 60)
         self.client.loop_start()
         time.sleep(1)
@@ -19,6 +21,12 @@ class AlarmConsole:
 
     def on_connect(self, client, userdata, flags, rc):
         print(f"Conectado ao Broker MQTT de endereco {self.broker_address}.")
+        client.subscribe(f"{self.group_id}_ALARM_ACT")  # Conclusao dos comandos enviados
+
+    def on_message(self, client, userdata, message):
+        payload = json.loads(message.payload)
+        print(f"\nComando '{payload.get('acao')}' aplicado em {payload.get('salas')} salas "
+              f"({payload.get('mensagens')} mensagens, {payload.get('duracao_ms', 0):.1f} ms)")
 
     def run_console(self):
         print("Bem-vindo ao Alarm Console!")
@@ -43,8 +51,10 @@ if __name__ == "__main__":
 
     group_id = sys.argv[1]
 
-    broker_address = "192.168.1.66"  # Change to your broker's address
-    broker_port = 1883  # Change to your broker's port
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    broker_address = config.get('network', 'broker_address', fallback="192.168.1.66")
+    broker_port = config.getint('network', 'broker_port', fallback=1883)
 
     alarm_console = AlarmConsole(broker_address, broker_port, group_id)
     alarm_console.start()
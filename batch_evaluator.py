@@ -0,0 +1,88 @@
+import numpy as np
+
+from room_store import parse_timestamp
+from rules import Rule
+
+# Codigos das acoes dos atuadores; ACTIONS converte o codigo no valor de "acao" enviado a central
+NONE, DOWN, UP, OFF = 0, 1, 2, 3
+ACTIONS = (None, "DOWN", "UP", "OFF")
+
+def decode_readings(readings):
+    # Converte uma lista de leituras (dicts ja validados) em colunas NumPy
+    count = len(readings)
+    return {
+        "temperature": np.fromiter((data["temperatura"] for data in readings), dtype=np.float64, count=count),
+        "humidity": np.fromiter((data["umidade"] for data in readings), dtype=np.float64, count=count),
+        "sensor_type": np.fromiter((data["tipo_sensor"] for data in readings), dtype=np.int8, count=count),
+        "ac_funcionando": np.fromiter((data["ac_funcionando"] for data in readings), dtype=np.int8, count=count),
+        "hc_funcionando": np.fromiter((data["hc_funcionando"] for data in readings), dtype=np.int8, count=count),
+        "movement": np.fromiter((data["movimento"] for data in readings), dtype=np.int8, count=count),
+        "timestamp": decode_timestamps([data["timestamp"] for data in readings]),
+    }
+
+def decode_timestamps(timestamps):
+    # Mesmo resultado de room_store.parse_timestamp (o datetime64 do NumPy trataria o horario local como UTC)
+    return np.fromiter((parse_timestamp(timestamp) for timestamp in timestamps), dtype=np.float64, count=len(timestamps))
+
+def resolve_rows(rooms, readings, timestamps):
+    # Linha de cada leitura no RoomStore (criando as salas novas) e o last_update da linha antes do lote
+    rows = np.empty(len(readings), dtype=np.int64)
+    previous_update = np.empty(len(readings))
+    for i, data in enumerate(readings):
+        row = rooms.row(data["numero_sala"])
+        if row is None:
+            row = rooms.add(data["numero_sala"], data["temperatura"], data["umidade"], timestamps[i],
+                            data["ac_funcionando"], data["hc_funcionando"], data["movimento"])
+            previous_update[i] = np.nan
+        else:
+            previous_update[i] = rooms.last_update[row]
+        rows[i] = row
+    return rows, previous_update
+
+def to_celsius(temperature, sensor_type):
+    return np.where(sensor_type == 2, (temperature - 32) * 5 / 9, temperature)
+
+def rule_columns(rules):
+    # Limites de cada leitura, a partir da Rule (rules.py) da sua sala: campo -> array
+    table = np.array(rules, dtype=np.float64).reshape(len(rules), len(Rule._fields))
+    return {field: table[:, i] for i, field in enumerate(Rule._fields)}
+
+def evaluate_thresholds(values, running, low, high, margin):
+    # Mesma histerese do caminho escalar: liga fora do intervalo e desliga com folga de `margin` dos limites
+    # Os limites podem ser escalares ou um array com os limites de cada leitura
+    running = running.astype(bool)
+    return np.select(
+        [(values > high) & ~running, (values < low) & ~running, (values > low + margin) & (values < high - margin) & running],
+        [DOWN, UP, OFF],
+        NONE,
+    ).astype(np.int8)
+
+def integrate_energy(rows, timestamps, ac_funcionando, hc_funcionando, previous_update):
+    # Horas de AC/HC ligados por sala no lote. previous_update e o last_update da linha antes do lote
+    # (nan para salas criadas no lote); cada leitura integra o intervalo desde a leitura anterior da sala.
+    order = np.argsort(rows, kind="stable")
+    sorted_rows = rows[order]
+    sorted_timestamps = timestamps[order]
+
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = sorted_rows[1:] != sorted_rows[:-1]
+    previous = np.empty(len(rows))
+    previous[1:] = sorted_timestamps[:-1]
+    previous[first] = previous_update[order][first]
+    hours = np.nan_to_num(sorted_timestamps - previous) / 3600
+
+    group = np.cumsum(first) - 1
+    starts = np.flatnonzero(first)
+    ac_hours = np.bincount(group, hours * ac_funcionando[order], minlength=len(starts))
+    hc_hours = np.bincount(group, hours * hc_funcionando[order], minlength=len(starts))
+    last = order[np.append(starts[1:] - 1, len(rows) - 1)]  # Indice da ultima leitura de cada sala
+    return sorted_rows[first], ac_hours, hc_hours, last
+
+def last_actions(rows, actions):
+    # Indices (na ordem do lote) da ultima acao diferente de NONE de cada sala
+    indices = np.flatnonzero(actions)
+    if not indices.size:
+        return indices
+    reversed_indices = indices[::-1]
+    _, first = np.unique(rows[reversed_indices], return_index=True)
+    return np.sort(reversed_indices[first])
@@ -0,0 +1,108 @@
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # intervals.cfg e lido do diretorio atual
+
+import data_processing_unit
+
+RULES_PATH = None  # Arquivo de regras por sala (rules.py) usado nos dois caminhos
+
+def create_processor(batch_mode):
+    processor = data_processing_unit.DataProcessor("127.0.0.1", 1883, "127.0.0.1", 5000, "token", "org", "http://localhost", "bucket", 1,
+                                                   max_queue=10_000_000, batch_mode=batch_mode, rules_path=RULES_PATH, rules_poll=0,
+                                                   sink="null")
+    processor.sent = []
+    processor.central.send = processor.sent.append
+    return processor
+
+def generate_readings(rooms, readings_per_room, seed=42):
+    rng = random.Random(seed)
+    items = []
+    for step in range(readings_per_room):
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(1_700_000_000 + step * 5))
+        for room in range(rooms):
+            sensor_type = rng.choice((1, 1, 1, 2, 3)) if room % 10 == 0 else 1
+            temperature = rng.uniform(10, 30)
+            if sensor_type == 2:
+                temperature = temperature * 9 / 5 + 32
+            data = {
+                "temperatura": round(temperature, 2),
+                "umidade": round(rng.uniform(30, 70), 2),
+                "movimento": int(rng.random() < 0.05),
+                "ac_funcionando": rng.randint(0, 1),
+                "hc_funcionando": rng.randint(0, 1),
+                "tipo_sensor": sensor_type,
+                "numero_sala": room,
+                "timestamp": timestamp,
+            }
+            items.append((data, "1_ACT"))
+    rng.shuffle(items)
+    items.sort(key=lambda item: item[0]["timestamp"])  # Ordem entre salas aleatoria, mas cronologica por sala
+    return items
+
+def deduplicate(commands):
+    # Mesma deduplicacao do caminho em lote: o ultimo comando de cada sala por tipo de controle
+    last = {}
+    for data in commands:
+        last[(data["numero_sala"], data["tipo_controle"])] = (data["acao"], data.get("valor_ideal"), data["response_topic"])
+    return last
+
+def check_parity(items, batch_size):
+    scalar = create_processor(False)
+    batch = create_processor(True)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for start in range(0, len(items), batch_size):
+            chunk = items[start:start + batch_size]
+            scalar.sent.clear()
+            batch.sent.clear()
+            for data, response_topic in chunk:
+                scalar.process_sensor_data(data, response_topic)
+            batch.process_sensor_batch(chunk)
+            if deduplicate(scalar.sent) != deduplicate(batch.sent):
+                raise AssertionError(f"Comandos divergentes no lote iniciado em {start}")
+            if len(batch.sent) != len(deduplicate(batch.sent)):
+                raise AssertionError(f"Comandos duplicados no lote iniciado em {start}")
+
+    for room_number in scalar.rooms.room_numbers:
+        expected = scalar.rooms.get(room_number)
+        actual = batch.rooms.get(room_number)
+        for field, value in expected.items():
+            if abs(float(value) - float(actual[field])) > 1e-6:
+                raise AssertionError(f"Estado divergente na sala {room_number}, campo {field}: {value} != {actual[field]}")
+    print(f"Paridade OK: {len(items)} leituras em lotes de {batch_size}")
+
+def bench(items, batch_size, repeat=3):
+    # Melhor de repeat execucoes de cada caminho, cada uma com um processador novo
+    scalar_time = batch_time = float("inf")
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            scalar = create_processor(False)
+            start = time.perf_counter()
+            for data, response_topic in items:
+                scalar.process_sensor_data(data, response_topic)
+            scalar_time = min(scalar_time, time.perf_counter() - start)
+
+            batch = create_processor(True)
+            start = time.perf_counter()
+            for offset in range(0, len(items), batch_size):
+                batch.process_sensor_batch(items[offset:offset + batch_size])
+            batch_time = min(batch_time, time.perf_counter() - start)
+
+    print(f"Escalar: {len(items) / scalar_time:,.0f} leituras/s ({len(scalar.sent)} comandos)")
+    print(f"Lote ({batch_size}): {len(items) / batch_time:,.0f} leituras/s ({len(batch.sent)} comandos)")
+
+if __name__ == "__main__":
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    readings_per_room = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 256
+    RULES_PATH = sys.argv[4] if len(sys.argv) > 4 else None
+
+    items = generate_readings(rooms, readings_per_room)
+    check_parity(items, batch_size)
+    bench(items, batch_size)
@@ -0,0 +1,255 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import paho.mqtt.client as mqtt
+
+from benchmarks.standins import run_broker
+from cluster import partition_of
+from telemetry_codec import encode_room_data
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+def process_usage(pid):
+    # Tempo de CPU (s) e RSS (MB) de um processo, lidos de /proc
+    with open(f"/proc/{pid}/stat") as file:
+        fields = file.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    with open(f"/proc/{pid}/status") as file:
+        rss = next(int(line.split()[1]) for line in file if line.startswith("VmRSS:")) / 1024
+    return cpu, rss
+
+def quiet():
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+
+def run_central(group_id, broker_port, central_port, verbose):
+    if not verbose:
+        quiet()
+    from control_central import ControlCentral
+    ControlCentral(group_id, "127.0.0.1", broker_port, "127.0.0.1", central_port).start()
+
+def run_processor(group_id, broker_port, central_port, options, started, finished, results, verbose):
+    if not verbose:
+        quiet()
+    os.chdir(ROOT)  # intervals.cfg e lido do diretorio atual
+    import data_processing_unit
+
+    processor = data_processing_unit.DataProcessor("127.0.0.1", broker_port, "127.0.0.1", central_port, "token", "org", "http://localhost", "bucket",
+                                                   group_id, sink="null", **options)
+    processor.start()
+
+    # Contagens da janela de publicacao do driver mais a drenagem; as taxas usam a duracao da publicacao
+    started.wait()
+    processed = sum(processor.pool.processed)
+    points = processor.sink.points
+    finished.wait()
+    stats = processor.stats()
+    results.put({
+        "processed": sum(processor.pool.processed) - processed,
+        "influx_points": processor.sink.points - points,
+        "stats": stats,
+    })
+    time.sleep(0.5)
+    os._exit(0)
+
+class Driver:
+    # Publica leituras no broker e mede a latencia ate o comando correspondente em <grupo>_ACT.
+    # A cada probe_every leituras de uma sala e enviada uma leitura que provoca um comando do AC,
+    # alternando entre DOWN (temperatura alta, AC desligado) e OFF (temperatura ideal, AC ligado).
+    # As stale leituras seguintes repetem a leitura do probe, como uma sala cujo atuador ainda nao reagiu.
+    def __init__(self, group_id, broker_port, rooms, rate, probe_every, binary, stale=0, partitions=0):
+        self.group_id = group_id
+        self.partitions = partitions  # Com processadores em cluster, publica no topico da particao de cada sala
+        self.rooms = rooms
+        self.rate = rate
+        self.probe_every = probe_every
+        self.binary = binary
+        self.stale = stale
+
+        self.pending = {}  # (sala, acao) -> instante da publicacao
+        self.latencies = []
+        self.published = 0
+        self.act_messages = 0  # Todas as mensagens recebidas em <grupo>_ACT, incluindo comandos repetidos
+        self.lock = threading.Lock()
+
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+        self.client.on_connect = lambda client, userdata, flags, rc: client.subscribe(f"{group_id}_ACT")
+        self.client.on_message = self.on_message
+        self.client.connect("127.0.0.1", broker_port, 60)
+        self.client.loop_start()
+
+    def on_message(self, client, userdata, message):
+        received = time.perf_counter()
+        self.act_messages += 1
+        payload = json.loads(message.payload)
+        with self.lock:
+            sent = self.pending.pop((payload.get("numero_sala"), payload.get("acao")), None)
+        if sent is not None:
+            self.latencies.append(received - sent)
+
+    def reading(self, room, sequence):
+        offset = sequence % self.probe_every
+        phase = (sequence // self.probe_every) % 2
+        if offset <= self.stale and phase == 0:
+            temperature, ac, action = 35.0, 0, "DOWN"
+        elif offset <= self.stale:
+            temperature, ac, action = 23.0, 1, "OFF"
+        else:
+            temperature, ac, action = 23.0, 0, None
+        if offset:
+            action = None  # Apenas o primeiro comando de cada probe entra na medida de latencia
+        if self.binary:
+            payload = encode_room_data(room, 1, temperature, 50.0, 0, ac, 0, int(time.time() * 1000))
+        else:
+            payload = json.dumps({"temperatura": temperature, "umidade": 50.0, "movimento": 0, "ac_funcionando": ac, "hc_funcionando": 0,
+                                  "tipo_sensor": 1, "numero_sala": room, "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+        return payload, action
+
+    def run(self, duration):
+        topics = [f"{self.group_id}_ROOM_DATA/{partition_of(room, self.partitions)}" if self.partitions else f"{self.group_id}_ROOM_DATA"
+                  for room in range(self.rooms + 1)]
+        interval = 1 / self.rate
+        start = time.perf_counter()
+        next_send = start
+        sequence = 0
+        while time.perf_counter() - start < duration:
+            room = sequence % self.rooms + 1
+            payload, action = self.reading(room, sequence // self.rooms)
+            if action:
+                with self.lock:
+                    self.pending[(room, action)] = time.perf_counter()
+            self.client.publish(topics[room], payload)
+            self.published += 1
+            sequence += 1
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return time.perf_counter() - start
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta com broker, InfluxDB e central locais")
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=1000, help="Leituras publicadas por segundo")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--probe-every", type=int, default=5, help="Intervalo (em leituras por sala) entre leituras que geram comandos")
+    parser.add_argument("--stale", type=int, default=0, help="Leituras repetidas apos cada probe, antes do atuador reagir")
+    parser.add_argument("--track-commands", action="store_true", help="Suprime comandos repetidos no processador")
+    parser.add_argument("--binary", action="store_true")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--conflate", action="store_true")
+    parser.add_argument("--batch", action="store_true")
+    parser.add_argument("--processors", type=int, default=1, help="Processadores em cluster (requer --partitions)")
+    parser.add_argument("--partitions", type=int, default=0, help="Particoes das salas entre os processadores")
+    parser.add_argument("--broker-port", type=int, default=18830)
+    parser.add_argument("--central-port", type=int, default=15000)
+    parser.add_argument("--output", default=None, help="Arquivo JSON com os resultados")
+    parser.add_argument("--compare", default=None, help="Resultado anterior para comparacao")
+    parser.add_argument("--verbose", action="store_true", help="Mantem a saida dos componentes")
+    args = parser.parse_args()
+
+    group_id = "1"
+    options = {"workers": args.workers, "conflate": args.conflate, "batch_mode": args.batch, "command_tracking": args.track_commands}
+    if args.partitions:
+        options.update(cluster_partitions=args.partitions, cluster_heartbeat=0.5)
+    results = multiprocessing.Queue()
+    started = multiprocessing.Event()
+    finished = multiprocessing.Event()
+    broker = multiprocessing.Process(target=run_broker, args=("127.0.0.1", args.broker_port), daemon=True)
+    central = multiprocessing.Process(target=run_central, args=(group_id, args.broker_port, args.central_port, args.verbose), daemon=True)
+    broker.start()
+    time.sleep(0.5)
+    central.start()
+    time.sleep(1)
+    processors = []
+    for i in range(args.processors):
+        processor_options = dict(options, instance_id=f"processor-{i}") if args.partitions else options
+        processor = multiprocessing.Process(target=run_processor, args=(group_id, args.broker_port, args.central_port, processor_options, started,
+                                                                         finished, results, args.verbose), daemon=True)
+        processor.start()
+        processors.append(processor)
+    time.sleep(3 if args.partitions else 1.5)  # No cluster, aguarda a divisao das particoes
+
+    components = {"broker": broker.pid, "central": central.pid}
+    for i, processor in enumerate(processors):
+        components["processor" if len(processors) == 1 else f"processor-{i}"] = processor.pid
+    usage_before = {name: process_usage(pid) for name, pid in components.items()}
+    driver = Driver(group_id, args.broker_port, args.rooms, args.rate, args.probe_every, args.binary, args.stale, args.partitions)
+    driver_cpu_before = resource.getrusage(resource.RUSAGE_SELF)
+    started.set()
+    elapsed = driver.run(args.duration)
+    time.sleep(1)  # Aguarda os comandos em transito
+    finished.set()
+    usage_after = {name: process_usage(pid) for name, pid in components.items()}
+    driver_cpu_after = resource.getrusage(resource.RUSAGE_SELF)
+    processor_results = [results.get(timeout=30) for _ in processors]
+
+    for process in (*processors, central, broker):
+        process.terminate()
+
+    latencies = driver.latencies
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "config": vars(args),
+        "published": driver.published,
+        "publish_rate": driver.published / elapsed,
+        "readings_per_second": sum(result["processed"] for result in processor_results) / elapsed,
+        "influx_points_per_second": sum(result["influx_points"] for result in processor_results) / elapsed,
+        "commands_matched": len(latencies),
+        "commands_pending": len(driver.pending),
+        "act_messages": driver.act_messages,
+        "central_messages": sum(result["stats"]["central"]["messages_sent"] for result in processor_results),
+        "latency_p50_ms": percentile(latencies, 0.5) * 1000 if latencies else None,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "components": {
+            name: {"cpu_seconds": usage_after[name][0] - usage_before[name][0], "cpu_percent": (usage_after[name][0] - usage_before[name][0]) / elapsed * 100,
+                   "rss_mb": usage_after[name][1]}
+            for name in components
+        },
+        "processor_stats": processor_results[0]["stats"] if len(processor_results) == 1 else [result["stats"] for result in processor_results],
+    }
+    driver_cpu = (driver_cpu_after.ru_utime + driver_cpu_after.ru_stime) - (driver_cpu_before.ru_utime + driver_cpu_before.ru_stime)
+    report["components"]["driver"] = {"cpu_seconds": driver_cpu, "cpu_percent": driver_cpu / elapsed * 100,
+                                      "rss_mb": driver_cpu_after.ru_maxrss / 1024}
+
+    print(f"Leituras publicadas: {report['published']} ({report['publish_rate']:.0f}/s)")
+    print(f"Leituras processadas: {report['readings_per_second']:.0f}/s")
+    print(f"Pontos no InfluxDB: {report['influx_points_per_second']:.0f}/s")
+    if latencies:
+        print(f"Latencia leitura -> comando: p50 {report['latency_p50_ms']:.2f} ms, p99 {report['latency_p99_ms']:.2f} ms "
+              f"({len(latencies)} comandos, {len(driver.pending)} sem resposta)")
+    print(f"Mensagens para a central: {report['central_messages']}, mensagens em {group_id}_ACT: {report['act_messages']}")
+    for name, usage in report["components"].items():
+        print(f"{name:10} CPU {usage['cpu_percent']:6.1f}%  RSS {usage['rss_mb']:7.1f} MB")
+
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+        for key in ("readings_per_second", "influx_points_per_second", "latency_p50_ms", "latency_p99_ms", "central_messages", "act_messages"):
+            if previous.get(key) and report.get(key):
+                print(f"{key}: {previous[key]:.2f} -> {report[key]:.2f} ({(report[key] / previous[key] - 1) * 100:+.1f}%)")
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"e2e-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Resultados salvos em {output}")
+
+if __name__ == "__main__":
+    main()
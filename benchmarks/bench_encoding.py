@@ -0,0 +1,65 @@
+import datetime
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from room_store import parse_timestamp
+from telemetry_codec import decode_payload, encode_room_data
+
+def generate_readings(count, seed=42):
+    rng = random.Random(seed)
+    readings = []
+    for i in range(count):
+        readings.append({
+            "temperatura": round(rng.uniform(15, 35), 2),
+            "umidade": round(rng.uniform(20, 90), 2),
+            "movimento": rng.randint(0, 1),
+            "ac_funcionando": rng.randint(0, 1),
+            "hc_funcionando": rng.randint(0, 1),
+            "tipo_sensor": 1,
+            "numero_sala": rng.randint(1, 100_000),
+            "timestamp": 1_700_000_000_000 + i * 1000,
+        })
+    return readings
+
+def encode_json(data):
+    return json.dumps(data).encode()
+
+def encode_binary(data):
+    return encode_room_data(data["numero_sala"], data["tipo_sensor"], data["temperatura"], data["umidade"], data["movimento"],
+                            data["ac_funcionando"], data["hc_funcionando"], data["timestamp"])
+
+def bench(name, encode, readings):
+    start = time.perf_counter()
+    payloads = [encode(data) for data in readings]
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decoded = [decode_payload(payload) for payload in payloads]
+    decode_time = time.perf_counter() - start
+
+    if decoded != readings:
+        raise AssertionError(f"{name}: leituras decodificadas diferentes das originais")
+    size = sum(len(payload) for payload in payloads) / len(payloads)
+    print(f"{name:7} {size:6.1f} bytes/msg  codificacao {len(readings) / encode_time:12,.0f} msg/s  decodificacao {len(readings) / decode_time:12,.0f} msg/s")
+
+def check_timestamps(readings):
+    # O mesmo instante em texto (horario local, como no simulador JSON) e em milissegundos (telemetria binaria)
+    # precisa resultar nos mesmos segundos, para que uma sala possa trocar de formato sem saltos de custo e consumo
+    for data in readings[:1000]:
+        milliseconds = data["timestamp"] // 1000 * 1000
+        text = datetime.datetime.fromtimestamp(milliseconds / 1000).strftime("%Y-%m-%d %H:%M:%S")
+        if parse_timestamp(text) != parse_timestamp(milliseconds):
+            raise AssertionError(f"Timestamp {text} ({parse_timestamp(text)}) diferente de {milliseconds} ms")
+    print(f"Timestamps OK: texto e milissegundos no mesmo relogio ({time.tzname[0]})")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    readings = generate_readings(count)
+    check_timestamps(readings)
+    bench("JSON", encode_json, readings)
+    bench("Binario", encode_binary, readings)
@@ -0,0 +1,160 @@
+import argparse
+import configparser
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import paho.mqtt.client as mqtt
+
+from benchmarks.bench_e2e import process_usage, quiet, run_central
+from benchmarks.standins import run_broker
+from telemetry_codec import encode_room_data
+
+def process_resources(pid):
+    # RSS (MB), threads e sockets abertos de um processo, lidos de /proc
+    _, rss = process_usage(pid)
+    with open(f"/proc/{pid}/status") as file:
+        threads = next(int(line.split()[1]) for line in file if line.startswith("Threads:"))
+    sockets = 0
+    for fd in os.listdir(f"/proc/{pid}/fd"):
+        try:
+            sockets += os.readlink(f"/proc/{pid}/fd/{fd}").startswith("socket:")
+        except OSError:
+            pass
+    return rss, threads, sockets
+
+def processor_options(broker_port, central_port, config_path=os.path.join(ROOT, "config.ini")):
+    from data_processing_unit import read_config
+    options = read_config(config_path)
+    options.update(broker_address="127.0.0.1", broker_port=broker_port, central_ip="127.0.0.1", central_port=central_port,
+                   sink="null", spool_dir=None, snapshot_path=None, metrics_port=0, read_api_port=0, profiling_dir=None,
+                   cluster_partitions=0, stats_interval=0, log_messages=False)
+    return options
+
+def check_cluster_config(broker_port, central_port):
+    # Um config.ini com [cluster] partitions > 0 nao impede o GroupHost de iniciar, e as leituras publicadas
+    # nos topicos de particao chegam ao grupo
+    os.chdir(ROOT)
+    from group_host import GroupHost
+    config = configparser.ConfigParser()
+    config.read(os.path.join(ROOT, "config.ini"))
+    if not config.has_section("cluster"):
+        config.add_section("cluster")
+    config.set("cluster", "partitions", "4")
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = os.path.join(directory, "config.ini")
+        with open(config_path, "w") as file:
+            config.write(file)
+        options = processor_options(broker_port, central_port, config_path)
+        options["cluster_partitions"] = config.getint("cluster", "partitions")  # Valor do arquivo, como em group_host.py
+        groups_path = os.path.join(directory, "groups.txt")
+        with open(groups_path, "w") as file:
+            file.write("1\n2\n")
+        host = GroupHost(options, groups_path)
+        if sorted(host.groups) != ["1", "2"] or any(processor.cluster for processor in host.groups.values()):
+            raise AssertionError("GroupHost com cluster no config.ini nao criou os grupos sem cluster")
+        message = mqtt.MQTTMessage(topic=b"2_ROOM_DATA/3")
+        message.payload = encode_room_data(7, 1, 23.0, 50.0, 0, 0, 0, int(time.time() * 1000))
+        host.on_message(host.client, None, message)
+        if sum(queue.qsize() for queue in host.pool.queues) != 1:
+            raise AssertionError("Leitura do topico de particao nao chegou ao grupo")
+    print("GroupHost com [cluster] partitions = 4: OK (grupos sem cluster, topicos de particao assinados)")
+
+def run_host(groups, broker_port, central_port, groups_path):
+    quiet()
+    os.chdir(ROOT)  # intervals.cfg e lido do diretorio atual
+    from group_host import GroupHost
+    with open(groups_path, "w") as file:
+        file.write("\n".join(str(group_id) for group_id in groups) + "\n")
+    GroupHost(processor_options(broker_port, central_port), groups_path).start()
+    time.sleep(3600)
+
+def run_processor(group_id, broker_port, central_port):
+    quiet()
+    os.chdir(ROOT)
+    from data_processing_unit import DataProcessor
+    DataProcessor(group_id=group_id, **processor_options(broker_port, central_port)).start()
+    time.sleep(3600)
+
+def publish(groups, rooms, broker_port, duration, rate):
+    # Leituras de rooms salas em cada grupo, distribuidas igualmente entre os grupos
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+    client.connect("127.0.0.1", broker_port, 60)
+    client.loop_start()
+    interval = 1 / rate
+    start = time.perf_counter()
+    sequence = 0
+    while time.perf_counter() - start < duration:
+        group_id = groups[sequence % len(groups)]
+        room = sequence // len(groups) % rooms + 1
+        client.publish(f"{group_id}_ROOM_DATA", encode_room_data(room, 1, 23.0, 50.0, 0, 0, 0, int(time.time() * 1000)))
+        sequence += 1
+        delay = start + sequence * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    client.loop_stop()
+    client.disconnect()
+    return sequence
+
+def measure(mode, count, args):
+    groups = list(range(1, count + 1))
+    if mode == "host":
+        with tempfile.NamedTemporaryFile(suffix=".txt", delete=False) as file:
+            groups_path = file.name
+        processes = [multiprocessing.Process(target=run_host, args=(groups, args.broker_port, args.central_port, groups_path), daemon=True)]
+    else:
+        processes = [multiprocessing.Process(target=run_processor, args=(group_id, args.broker_port, args.central_port), daemon=True)
+                     for group_id in groups]
+    for process in processes:
+        process.start()
+    time.sleep(2 + count * 0.05)
+    published = publish(groups, args.rooms, args.broker_port, args.duration, args.rate)
+    time.sleep(1)
+    usage = [process_resources(process.pid) for process in processes]
+    for process in processes:
+        process.terminate()
+        process.join()
+    if mode == "host":
+        os.unlink(groups_path)
+    return {
+        "rss_mb": sum(rss for rss, _, _ in usage),
+        "threads": sum(threads for _, threads, _ in usage),
+        "sockets": sum(sockets for _, _, sockets in usage),
+        "published": published,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria, threads e conexoes: um GroupHost com N grupos contra N processos DataProcessor")
+    parser.add_argument("--groups", type=int, nargs="+", default=[1, 10, 30])
+    parser.add_argument("--rooms", type=int, default=50, help="Salas por grupo")
+    parser.add_argument("--rate", type=float, default=1000, help="Leituras publicadas por segundo (todos os grupos)")
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--modes", nargs="+", default=["host", "processes"], choices=["host", "processes"])
+    parser.add_argument("--broker-port", type=int, default=18832)
+    parser.add_argument("--central-port", type=int, default=15002)
+    args = parser.parse_args()
+
+    check_cluster_config(args.broker_port, args.central_port)
+    broker = multiprocessing.Process(target=run_broker, args=("127.0.0.1", args.broker_port), daemon=True)
+    central = multiprocessing.Process(target=run_central, args=("1", args.broker_port, args.central_port, False), daemon=True)
+    broker.start()
+    time.sleep(0.5)
+    central.start()
+    time.sleep(1)
+
+    print(f"{'modo':<10}{'grupos':>7}{'RSS':>12}{'RSS/grupo':>12}{'threads':>9}{'sockets':>9}")
+    for count in args.groups:
+        for mode in args.modes:
+            result = measure(mode, count, args)
+            print(f"{mode:<10}{count:>7}{result['rss_mb']:>9.1f} MB{result['rss_mb'] / count:>9.2f} MB{result['threads']:>9}{result['sockets']:>9}")
+
+    central.terminate()
+    broker.terminate()
+
+if __name__ == "__main__":
+    main()
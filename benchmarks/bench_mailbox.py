@@ -0,0 +1,63 @@
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from worker_pool import ConflatingMailbox
+
+def generate_puts(rooms, count, movement_ratio, seed=42):
+    # (sala, sequencia, movimento); a sequencia cresce por sala, como o timestamp das leituras
+    rng = random.Random(seed)
+    sequence = [0] * rooms
+    puts = []
+    for _ in range(count):
+        room = rng.randrange(rooms)
+        sequence[room] += 1
+        puts.append((room, sequence[room], rng.random() < movement_ratio))
+    return puts
+
+def check_order(puts, conflate_threshold, rooms):
+    # Mailbox sempre acima do limite de mesclagem: a saida de cada sala precisa estar em ordem crescente,
+    # sem perder leituras de movimento e terminando na leitura mais recente
+    mailbox = ConflatingMailbox(len(puts) + 1, conflate_threshold, len(puts) + 1)
+    for room, sequence, movement in puts:
+        mailbox.put(room, (room, sequence, movement), mergeable=not movement)
+    output = [mailbox.get() for _ in range(mailbox.qsize())]
+
+    last = {}
+    for room, sequence, _ in output:
+        if sequence <= last.get(room, 0):
+            raise AssertionError(f"Sala {room}: leitura {sequence} depois da leitura {last[room]}")
+        last[room] = sequence
+    expected_last = {}
+    for room, sequence, _ in puts:
+        expected_last[room] = sequence
+    if last != expected_last:
+        raise AssertionError("Leitura mais recente de alguma sala perdida na mesclagem")
+    movements = {(room, sequence) for room, sequence, movement in puts if movement}
+    if not movements <= {(room, sequence) for room, sequence, _ in output}:
+        raise AssertionError("Leitura de movimento mesclada")
+    print(f"Ordem OK: {len(puts)} leituras de {rooms} salas, {len(output)} na saida ({mailbox.merged} mescladas)")
+
+def bench(puts, conflate_threshold):
+    mailbox = ConflatingMailbox(len(puts) + 1, conflate_threshold, len(puts) + 1)
+    start = time.perf_counter()
+    for room, sequence, movement in puts:
+        mailbox.put(room, (room, sequence, movement), mergeable=not movement)
+    while mailbox.qsize():
+        mailbox.get()
+    elapsed = time.perf_counter() - start
+    print(f"Limite {conflate_threshold}: {len(puts) / elapsed:,.0f} leituras/s ({mailbox.merged} mescladas)")
+
+if __name__ == "__main__":
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    movement_ratio = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+
+    puts = generate_puts(rooms, count, movement_ratio)
+    check_order(puts, 0, rooms)
+    bench(puts, len(puts) + 1)  # Sem mesclagem
+    bench(puts, 0)
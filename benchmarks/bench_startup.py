@@ -0,0 +1,70 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sinks import SINKS
+
+def rss_mb():
+    with open("/proc/self/status") as file:
+        return next(int(line.split()[1]) for line in file if line.startswith("VmRSS:")) / 1024
+
+def child(sink, path):
+    # Executado em um processo novo: mede a importacao do modulo e a criacao do DataProcessor com o sink escolhido
+    start = time.perf_counter()
+    os.chdir(ROOT)  # intervals.cfg e lido do diretorio atual
+    import data_processing_unit
+    imported = time.perf_counter()
+    data_processing_unit.DataProcessor("127.0.0.1", 1883, "127.0.0.1", 5000, "token", "org", "http://localhost", "bucket", 1,
+                                       sink=sink, sink_path=path)
+    created = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (imported - start) * 1000,
+        "startup_ms": (created - start) * 1000,
+        "rss_mb": rss_mb(),
+        "modules": len(sys.modules),
+        "influx_loaded": "influxdb_client_3" in sys.modules,
+    }))
+
+def measure(sink, runs, path):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-W", "ignore", __file__, "--child", sink, "--path", path],
+                                capture_output=True, text=True, check=True).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        sample["process_ms"] = (time.perf_counter() - start) * 1000  # Inclui a inicializacao do interpretador
+        samples.append(sample)
+    result = {key: statistics.median(sample[key] for sample in samples) for key in ("import_ms", "startup_ms", "process_ms", "rss_mb", "modules")}
+    result["influx_loaded"] = samples[0]["influx_loaded"]
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de inicializacao e RSS do DataProcessor para cada sink")
+    parser.add_argument("--sinks", nargs="+", default=list(SINKS), choices=SINKS)
+    parser.add_argument("--runs", type=int, default=5, help="processos por sink (e apresentada a mediana)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.path)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "points.lp")
+        print(f"{'sink':<8}{'import':>10}{'startup':>10}{'processo':>10}{'RSS':>10}{'modulos':>9}  influxdb_client_3")
+        for sink in args.sinks:
+            result = measure(sink, args.runs, path)
+            print(f"{sink:<8}{result['import_ms']:>8.0f}ms{result['startup_ms']:>8.0f}ms{result['process_ms']:>8.0f}ms"
+                  f"{result['rss_mb']:>7.1f} MB{result['modules']:>9.0f}  {'carregado' if result['influx_loaded'] else 'nao carregado'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import asyncio
+import itertools
+import struct
+import sys
+
+# Substituto local da infraestrutura externa (broker MQTT), usado pelos benchmarks; o InfluxDB e substituido pelo sink "null"
+
+def topic_matches(topic_filter, topic):
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[i]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+class MiniBroker:
+    # Broker MQTT 3.1.1 minimo: QoS 0 na entrega, PUBACK para publicacoes QoS 1, curingas + e #
+    # e assinaturas compartilhadas ($share/<grupo>/<filtro>) com distribuicao round-robin
+    def __init__(self, host="127.0.0.1", port=1883):
+        self.host = host
+        self.port = port
+        self.sessions = {}  # writer -> set de filtros
+        self.shared = {}  # (grupo, filtro) -> lista de writers
+        self.round_robin = {}
+        self.routes = {}  # Cache topico -> writers
+        self.messages_in = 0
+        self.messages_out = 0
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        async with server:
+            await server.serve_forever()
+
+    async def read_packet(self, reader):
+        header = await reader.readexactly(1)
+        length, multiplier = 0, 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                break
+        body = await reader.readexactly(length) if length else b""
+        return header[0], body
+
+    async def handle(self, reader, writer):
+        self.sessions[writer] = set()
+        try:
+            while True:
+                header, body = await self.read_packet(reader)
+                packet_type = header >> 4
+                if packet_type == 1:  # CONNECT
+                    writer.write(b"\x20\x02\x00\x00")
+                elif packet_type == 3:  # PUBLISH
+                    qos = (header >> 1) & 3
+                    (topic_length,) = struct.unpack_from(">H", body)
+                    topic = body[2:2 + topic_length].decode()
+                    offset = 2 + topic_length
+                    if qos:
+                        writer.write(b"\x40\x02" + body[offset:offset + 2])
+                        offset += 2
+                    self.route(topic, body[offset:])
+                elif packet_type == 8:  # SUBSCRIBE
+                    packet_id, offset, granted = body[:2], 2, bytearray()
+                    while offset < len(body):
+                        (filter_length,) = struct.unpack_from(">H", body, offset)
+                        self.subscribe(writer, body[offset + 2:offset + 2 + filter_length].decode())
+                        offset += 3 + filter_length
+                        granted.append(0)
+                    writer.write(b"\x90" + encode_length(2 + len(granted)) + packet_id + bytes(granted))
+                elif packet_type == 10:  # UNSUBSCRIBE
+                    offset = 2
+                    while offset < len(body):
+                        (filter_length,) = struct.unpack_from(">H", body, offset)
+                        self.unsubscribe(writer, body[offset + 2:offset + 2 + filter_length].decode())
+                        offset += 2 + filter_length
+                    writer.write(b"\xb0\x02" + body[:2])
+                elif packet_type == 12:  # PINGREQ
+                    writer.write(b"\xd0\x00")
+                elif packet_type == 14:  # DISCONNECT
+                    break
+                if writer.transport.get_write_buffer_size() > 1 << 20:
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for topic_filter in list(self.sessions.pop(writer, ())):
+                self.unsubscribe(writer, topic_filter)
+            writer.close()
+
+    def subscribe(self, writer, topic_filter):
+        self.sessions[writer].add(topic_filter)
+        if topic_filter.startswith("$share/"):
+            _, group, shared_filter = topic_filter.split("/", 2)
+            members = self.shared.setdefault((group, shared_filter), [])
+            if writer not in members:
+                members.append(writer)
+                self.round_robin[(group, shared_filter)] = itertools.cycle(list(members))
+        self.routes.clear()
+
+    def unsubscribe(self, writer, topic_filter):
+        self.sessions.get(writer, set()).discard(topic_filter)
+        if topic_filter.startswith("$share/"):
+            _, group, shared_filter = topic_filter.split("/", 2)
+            members = self.shared.get((group, shared_filter), [])
+            if writer in members:
+                members.remove(writer)
+            if members:
+                self.round_robin[(group, shared_filter)] = itertools.cycle(list(members))
+            else:
+                self.shared.pop((group, shared_filter), None)
+                self.round_robin.pop((group, shared_filter), None)
+        self.routes.clear()
+
+    def route(self, topic, payload):
+        self.messages_in += 1
+        subscribers = self.routes.get(topic)
+        if subscribers is None:
+            subscribers = [writer for writer, filters in self.sessions.items()
+                           if any(not f.startswith("$share/") and topic_matches(f, topic) for f in filters)]
+            self.routes[topic] = subscribers
+        targets = list(subscribers)
+        for (group, shared_filter), members in self.shared.items():
+            if topic_matches(shared_filter, topic):
+                targets.append(next(self.round_robin[(group, shared_filter)]))
+
+        encoded_topic = topic.encode()
+        body = struct.pack(">H", len(encoded_topic)) + encoded_topic + payload
+        packet = b"\x30" + encode_length(len(body)) + body
+        for writer in targets:
+            if not writer.is_closing():
+                writer.write(packet)
+                self.messages_out += 1
+
+def run_broker(host="127.0.0.1", port=1883):
+    asyncio.run(MiniBroker(host, port).serve())
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 1883
+    print(f"Broker MQTT local em 127.0.0.1:{port}")
+    run_broker("127.0.0.1", port)
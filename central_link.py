@@ -0,0 +1,141 @@
+import asyncio
+import json
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+# Cada mensagem trafega como: tamanho (4 bytes, big-endian) + JSON em UTF-8
+HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+def encode_frame(data):
+    body = json.dumps(data).encode()
+    return HEADER.pack(len(body)) + body
+
+def decode_frame(body):
+    return json.loads(body)
+
+async def read_frame(reader):
+    # Le a proxima mensagem de um StreamReader; retorna None quando a conexao e fechada
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Mensagem de {size} bytes excede o limite")
+    body = await reader.readexactly(size)
+    return decode_frame(body)
+
+class CentralLink:
+    def __init__(self, central_ip, central_port, max_queue=10000, max_retries=5, retry_delay=0.2, max_retry_delay=5.0, max_batch=256, metrics=None):
+        self.central_ip = central_ip
+        self.central_port = central_port
+        self.max_queue = max_queue
+        self.max_retries = max_retries  # Tentativas de reconexao por ciclo, com espera exponencial
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_batch = max_batch  # Mensagens agrupadas em um unico sendall
+
+        self.queue = deque()  # Fila de saida mantida enquanto a conexao esta fora
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.sock = None
+
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.connections = 0
+        self.send_calls = 0
+        self.send_seconds = metrics.stage("central_send") if metrics else None  # Duracao de cada sendall
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="central-link", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        with self.lock:
+            self.running = False
+            self.not_empty.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+        self.close()
+
+    def send(self, data):
+        frame = encode_frame(data)
+        with self.lock:
+            if len(self.queue) >= self.max_queue:
+                self.queue.popleft()  # Descarta a mensagem mais antiga
+                self.messages_dropped += 1
+            self.queue.append(frame)
+            self.not_empty.notify()
+
+    def connect(self):
+        delay = self.retry_delay
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                sock = socket.create_connection((self.central_ip, self.central_port), timeout=5)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.settimeout(None)
+                self.sock = sock
+                self.connections += 1
+                print(f"Conectado a central {self.central_ip}:{self.central_port}")
+                return True
+            except OSError as e:
+                print(f"Falha ao conectar a central ({attempt}/{self.max_retries}): {e}")
+                if not self.running:
+                    return False
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+        return False
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.queue and self.running:
+                    self.not_empty.wait()
+                if not self.queue and not self.running:
+                    return
+                batch = [self.queue.popleft() for _ in range(min(self.max_batch, len(self.queue)))]
+
+            while self.sock is None:
+                if not self.connect():
+                    if not self.running:
+                        return
+                    print(f"Central indisponivel, {len(self.queue) + len(batch)} mensagens aguardando na fila")
+                    time.sleep(self.max_retry_delay)
+
+            try:
+                start = time.perf_counter()
+                self.sock.sendall(b"".join(batch))
+                if self.send_seconds:
+                    self.send_seconds.observe(time.perf_counter() - start)
+                self.messages_sent += len(batch)
+                self.send_calls += 1
+            except OSError as e:
+                print(f"Erro ao enviar mensagens para a central: {e}")
+                self.close()
+                with self.lock:
+                    self.queue.extendleft(reversed(batch))  # Devolve o lote para o inicio da fila
+
+    def stats(self):
+        return {
+            "queue_size": len(self.queue),
+            "messages_sent": self.messages_sent,
+            "messages_dropped": self.messages_dropped,
+            "connections": self.connections,
+            "send_calls": self.send_calls,
+        }
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from state_snapshot import decode_columns, encode_columns
+
+HANDOFF = struct.Struct("<I")  # salas no estado transferido
+
+def partition_of(room_number, partitions):
+    # Particao das leituras de uma sala: publicadas em {grupo}_ROOM_DATA/<particao>. Numeros inteiros (os dos
+    # simuladores) usam o resto da divisao; outra chave, como um numero em texto ou ausente, usa um hash estavel
+    # do texto (o hash() do Python muda a cada processo), igual em todas as instancias e simuladores
+    if isinstance(room_number, int):
+        return room_number % partitions
+    return int.from_bytes(hashlib.blake2b(str(room_number).encode(), digest_size=8).digest(), "big") % partitions
+
+def default_instance_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def encode_partition_state(columns, rows):
+    return HANDOFF.pack(len(rows)) + encode_columns(columns, rows)
+
+def decode_partition_state(data):
+    count, = HANDOFF.unpack_from(data)
+    return decode_columns(data, HANDOFF.size, count)
+
+class ClusterMembership:
+    # Membros do cluster de processadores de um grupo, anunciados por heartbeats em {grupo}_CLUSTER/members/<id>.
+    # Cada particao pertence ao membro vivo de maior peso hash(membro, particao) (rendezvous hashing): quando um
+    # membro entra ou sai, apenas as particoes que ele ganha ou perde mudam de dono.
+    # on_change(assigned, revoked) e chamado na thread do cluster, nunca na thread do MQTT.
+    def __init__(self, client, group_id, instance_id, partitions, on_change, heartbeat_interval=1.0, member_timeout=5.0):
+        self.client = client
+        self.prefix = f"{group_id}_CLUSTER"
+        self.instance_id = instance_id
+        self.partitions = partitions
+        self.on_change = on_change
+        self.heartbeat_interval = heartbeat_interval
+        self.member_timeout = member_timeout
+
+        self.members = {}  # Outros membros -> instante (monotonic) do ultimo heartbeat
+        self.owned = set()
+        self.joined = False
+        self.lock = threading.Lock()
+        self.changed = threading.Event()
+        self.running = False
+
+        self.rebalances = 0
+        self.handoffs_sent = 0
+        self.handoffs_received = 0
+        # Se o processo cair, o broker anuncia a saida e as particoes sao redistribuidas sem esperar member_timeout
+        client.will_set(self.member_topic(instance_id), json.dumps({"instance": instance_id, "leaving": True}), qos=1)
+
+    def member_topic(self, instance_id):
+        return f"{self.prefix}/members/{instance_id}"
+
+    def handoff_topic(self, partition):
+        return f"{self.prefix}/handoff/{partition}"
+
+    def weight(self, member, partition):
+        return hashlib.blake2b(f"{member}/{partition}".encode(), digest_size=8).digest()
+
+    def owner(self, partition, members):
+        return max(members, key=lambda member: self.weight(member, partition))
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self.run, name="cluster", daemon=True).start()
+
+    def stop(self):
+        # Saida ordenada: anuncia a saida, espera os demais assinarem as particoes e so entao transfere o estado
+        self.running = False
+        self.changed.set()
+        self.client.publish(self.member_topic(self.instance_id), json.dumps({"instance": self.instance_id, "leaving": True}), qos=1)
+        time.sleep(self.heartbeat_interval)
+        owned, self.owned = self.owned, set()
+        self.on_change(set(), owned)
+
+    def run(self):
+        # Antes de assumir particoes, espera os heartbeats dos membros ja presentes. Os demais so passam a contar
+        # com este membro no heartbeat seguinte, quando ele ja assinou as particoes que recebe
+        self.heartbeat()
+        time.sleep(self.heartbeat_interval * 2)
+        self.joined = True
+        next_heartbeat = time.monotonic()
+        while self.running:
+            self.rebalance()
+            if time.monotonic() >= next_heartbeat:
+                self.heartbeat()
+                next_heartbeat = time.monotonic() + self.heartbeat_interval
+            self.changed.wait(max(next_heartbeat - time.monotonic(), 0))
+            self.changed.clear()
+
+    def heartbeat(self):
+        self.client.publish(self.member_topic(self.instance_id), json.dumps({"instance": self.instance_id, "joined": self.joined,
+                                                                               "partitions": len(self.owned)}))
+
+    def on_message(self, topic, payload):
+        member = topic.rsplit("/", 1)[1]
+        if member == self.instance_id:
+            return
+        data = json.loads(payload)
+        if not data.get("leaving") and not data.get("joined"):
+            return  # Membro ainda entrando
+        with self.lock:
+            known = member in self.members
+            if data.get("leaving"):
+                self.members.pop(member, None)
+            else:
+                self.members[member] = time.monotonic()
+        if known != (not data.get("leaving")):
+            self.changed.set()  # Entrada ou saida de um membro
+
+    def rebalance(self):
+        now = time.monotonic()
+        with self.lock:
+            for member, seen in list(self.members.items()):
+                if now - seen > self.member_timeout:
+                    del self.members[member]
+            members = [self.instance_id, *self.members]
+        if not self.joined:
+            return
+        owned = {partition for partition in range(self.partitions) if self.owner(partition, members) == self.instance_id}
+        if owned == self.owned:
+            return
+        assigned, revoked = owned - self.owned, self.owned - owned
+        self.owned = owned
+        self.rebalances += 1
+        print(f"Cluster com {len(members)} membros: {len(owned)} particoes ({len(assigned)} recebidas, {len(revoked)} transferidas)")
+        self.on_change(assigned, revoked)
+
+    def stats(self):
+        return {
+            "members": len(self.members) + 1,
+            "partitions": len(self.owned),
+            "rebalances": self.rebalances,
+            "handoffs_sent": self.handoffs_sent,
+            "handoffs_received": self.handoffs_received,
+        }
@@ -0,0 +1,64 @@
+import threading
+import time
+
+class CommandTracker:
+    # Ultimo comando enviado a cada (sala, atuador) ate a telemetria confirmar o novo estado.
+    # Repeticoes do mesmo comando sao suprimidas; um comando diferente substitui o anterior na hora,
+    # e o mesmo comando so e reenviado se a confirmacao nao chegar em ack_timeout segundos.
+    # Alarmes de movimento ("ALARM") sao repetidos no maximo a cada movement_window segundos
+    # enquanto o movimento continua, e liberados quando a sala volta a reportar movimento 0.
+    def __init__(self, ack_timeout=10.0, movement_window=5.0):
+        self.timeouts = {"AC": ack_timeout, "HC": ack_timeout, "ALARM": movement_window}
+        self.inflight = {}  # (sala, atuador) -> [acao, instante do ultimo envio]
+        self.lock = threading.Lock()
+
+        self.sent = 0
+        self.suppressed = 0
+        self.superseded = 0
+        self.retries = 0
+        self.acknowledged = 0
+
+    def should_send(self, room_number, actuator, action):
+        now = time.monotonic()
+        key = (room_number, actuator)
+        with self.lock:
+            entry = self.inflight.get(key)
+            if entry is not None and entry[0] == action:
+                if now - entry[1] < self.timeouts[actuator]:
+                    self.suppressed += 1
+                    return False
+                self.retries += 1  # Sem confirmacao dentro do prazo
+            elif entry is not None:
+                self.superseded += 1
+            self.inflight[key] = [action, now]
+            self.sent += 1
+            return True
+
+    def observe(self, room_number, ac_funcionando, hc_funcionando, movement):
+        # Confirma os comandos pendentes da sala com o estado reportado na leitura
+        with self.lock:
+            if not self.inflight:
+                return
+            for actuator, running in (("AC", ac_funcionando), ("HC", hc_funcionando)):
+                entry = self.inflight.get((room_number, actuator))
+                if entry is not None and (entry[0] != "OFF") == bool(running):
+                    del self.inflight[(room_number, actuator)]
+                    self.acknowledged += 1
+            if not movement:
+                self.inflight.pop((room_number, "ALARM"), None)
+
+    def forget(self, room_number):
+        # Sala desconectada: o estado dos atuadores deixa de ser conhecido
+        with self.lock:
+            for actuator in self.timeouts:
+                self.inflight.pop((room_number, actuator), None)
+
+    def stats(self):
+        return {
+            "inflight": len(self.inflight),
+            "sent": self.sent,
+            "suppressed": self.suppressed,
+            "superseded": self.superseded,
+            "retries": self.retries,
+            "acknowledged": self.acknowledged,
+        }
@@ -1,13 +1,20 @@
-import socket
+import asyncio
+import configparser
 import json
 import datetime
 import paho.mqtt.client as mqtt
 import sys
 import threading
-from queue import Queue
+import time
+import traceback
+from collections import deque
+from central_link import read_frame
+from metrics import MetricsRegistry, MetricsServer, RateLimitedLog
+from profiling import ProfilingControl
 
 class ControlCentral:
-    def __init__(self, group_id, broker_address, broker_port, central_ip, central_port):
+    def __init__(self, group_id, broker_address, broker_port, central_ip, central_port, metrics_port=0, log_messages=True, log_rate=10,
+                 broadcast_chunk=5000, profiling_dir=None, profiling_hz=100):
         self.group_id = group_id
         self.central_ip = central_ip
         self.central_port = central_port
@@ -15,39 +22,81 @@ class ControlCentral:
         self.broker_address = broker_address
         self.broker_port = broker_port
         self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-        self.queue = Queue()
+        self.queue = None  # asyncio.Queue criada dentro do event loop
+        self.latencies = deque(maxlen=1000)  # Tempo (s) entre a chegada do alarme e a publicacao no atuador
+        self.latency_lock = threading.Lock()  # latency_stats e lido pelas threads de status e de diagnostico
+        self.broadcast_chunk = broadcast_chunk  # Maximo de salas por mensagem de um comando para varias salas
+
+        self.metrics = MetricsRegistry("central")
+        self.metrics_port = metrics_port
+        self.queue_wait_seconds = self.metrics.stage("queue_wait")
+        self.publish_seconds = self.metrics.stage("actuator_publish")
+        self.alarm_seconds = self.metrics.stage("alarm_total")
+        self.alarms_received = self.metrics.counter("alarms_received", "Mensagens recebidas das unidades de processamento")
+        self.broadcast_rooms = self.metrics.counter("broadcast_rooms", "Salas atingidas por comandos para varias salas")
+        self.alarm_errors = self.metrics.counter("alarm_errors", "Alarmes descartados por erro no tratamento")
+        self.metrics.add_collector(lambda: [("queue_size", "Alarmes aguardando na fila", {}, self.queue.qsize() if self.queue else 0)])
+        self.log = RateLimitedLog(log_messages, log_rate)
+        # Canal local de diagnostico: pilhas e estado das threads, fila de alarmes e perfis sob demanda
+        self.profiling = ProfilingControl(f"central-{group_id}", self.status, profiling_dir, profiling_hz) if profiling_dir else None
 
     def start(self):
         self.client.on_connect = self.on_connect
-        self.client.on_message = self.on_message
         self.client.connect(self.broker_address, self.broker_port, 60)
-        self.start_tcp_server()
+        self.client.loop_start()  # I/O do MQTT em uma thread dedicada
+        if self.metrics_port > 0:
+            MetricsServer(self.metrics, port=self.metrics_port).start()
+        if self.profiling:
+            self.profiling.start()
+        try:
+            asyncio.run(self.start_tcp_server())
+        finally:
+            self.client.loop_stop()
 
-    def start_tcp_server(self):
-        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server_socket.bind((self.central_ip, self.central_port))
-        server_socket.listen(5)
+    async def start_tcp_server(self):
+        self.queue = asyncio.Queue()
+        server = await asyncio.start_server(self.handle_connection, self.central_ip, self.central_port)
         print(f"Bem-vindo ao Sistema de Controle Central ({self.group_id})")
         print(f"Servidor TCP iniciado em {self.central_ip}:{self.central_port}")
         print("Aguardando alarmes...")
-        while True:
-            client_socket, address = server_socket.accept()
-            data = client_socket.recv(1024).decode()
-            if data:
-                alarm_data = json.loads(data)
-                self.queue.put(alarm_data)  # Coloca os dados na fila
-            client_socket.close()
-
-    def on_connect(self, client, userdata, flags, rc):
+        queue_task = asyncio.create_task(self.handle_alarm_queue())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            queue_task.cancel()
+
+    async def handle_connection(self, reader, writer):
+        # Cada conexao e persistente e transporta varias mensagens com prefixo de tamanho
+        address = writer.get_extra_info("peername")
+        print(f"Unidade de processamento conectada: {address[0]}:{address[1]}")
+        try:
+            while True:
+                alarm_data = await read_frame(reader)
+                if alarm_data is None:
+                    break
+                self.queue.put_nowait((time.monotonic(), alarm_data))  # Coloca os dados na fila
+                self.alarms_received.inc()
+        except (OSError, ValueError) as e:
+            print(f"Erro na conexao com {address[0]}:{address[1]}: {e}")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass  # Conexao ja encerrada pela unidade de processamento
+        print(f"Unidade de processamento desconectada: {address[0]}:{address[1]}")
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
+        # A central apenas publica nos atuadores; os alarmes chegam pela conexao TCP, sem assinaturas MQTT
         print("Conectado ao Broker MQTT com código de resultado", rc)
-        client.subscribe("#")  # Subscreve a todos os tópicos
 
-    def on_message(self, client, userdata, message):
-        payload = json.loads(message.payload)
-        # Implementar conforme necessário
+    def actuator_topic(self, alarm_data):
+        # Mensagens com grupo (todas as enviadas pelo DataProcessor) vao para os atuadores desse grupo, de modo que uma
+        # unica central atende todos os grupos de um GroupHost; sem grupo, vale o grupo da central
+        return f"{alarm_data.get('grupo', self.group_id)}_ACT"
 
-    def send_mqtt_message(self, room_number, control_type, action):
-        topic = f"{self.group_id}_ACT"
+    def send_mqtt_message(self, topic, room_number, control_type, action):
         payload = {
             "numero_sala": room_number,
             "tipo_controle": control_type,
@@ -55,15 +104,57 @@ class ControlCentral:
             "timestamp": datetime.datetime.now().isoformat()
         }
 
+        self.publish(topic, payload) # Envia a mensagem para o tópico
+
+    def handle_broadcast(self, alarm_data):
+        # Comando para varias salas: publicado em partes de ate broadcast_chunk salas, e a conclusao
+        # do comando inteiro e informada uma unica vez em response_topic
+        start = time.perf_counter()
+        rooms = alarm_data["salas"]
+        chunks = [rooms[i:i + self.broadcast_chunk] for i in range(0, len(rooms), self.broadcast_chunk)]
+        timestamp = datetime.datetime.now().isoformat()
+        for part, chunk in enumerate(chunks, 1):
+            payload = {
+                "salas": chunk,
+                "tipo_controle": alarm_data["tipo_controle"],
+                "acao": alarm_data["acao"],
+                "broadcast_id": alarm_data["broadcast_id"],
+                "parte": part,
+                "partes": len(chunks),
+                "timestamp": timestamp,
+            }
+            self.publish(self.actuator_topic(alarm_data), payload)
+        self.broadcast_rooms.inc(len(rooms))
+
+        elapsed = time.perf_counter() - start
+        completion = {
+            "broadcast_id": alarm_data["broadcast_id"],
+            "tipo_controle": alarm_data["tipo_controle"],
+            "acao": alarm_data["acao"],
+            "salas": len(rooms),
+            "mensagens": len(chunks),
+            "duracao_ms": elapsed * 1000,
+            "timestamp": datetime.datetime.now().isoformat(),
+        }
+        self.publish(alarm_data["response_topic"], completion)
+        print(f"Comando {alarm_data['tipo_controle']} {alarm_data['acao']} enviado para {len(rooms)} salas "
+              f"em {len(chunks)} mensagens ({elapsed * 1000:.2f} ms)")
+
+    def publish(self, topic, payload):
         try:
-            self.client.publish(topic, json.dumps(payload)) # Envia a mensagem para o tópico
+            start = time.perf_counter()
+            self.client.publish(topic, json.dumps(payload))
+            self.publish_seconds.observe(time.perf_counter() - start)
         except Exception as e:
             print(f"Erro ao enviar mensagem para o tópico {topic}: {e}")
             print("Tentando reconectar...")
             self.client.reconnect()
 
     def handle_alarm(self, alarm_data):
-        print("\n--- Alarme Recebido ---")
+        if "salas" in alarm_data:
+            self.handle_broadcast(alarm_data)
+            return
+
         self.print_alarm(alarm_data)
 
         room_number = alarm_data["numero_sala"]
@@ -73,41 +164,75 @@ class ControlCentral:
 
         if control_type == "AC":
             if action == "DOWN":
-                print(f"Alarme de temperatura alta na sala {room_number}, ligando ar-condicionado para diminuir a temperatura.")
+                self.log(f"Alarme de temperatura alta na sala {room_number}, ligando ar-condicionado para diminuir a temperatura.")
             elif action == "UP":
-                print(f"Alarme de temperatura baixa na sala {room_number}, ligando ar-condicionado para aumentar a temperatura.")
+                self.log(f"Alarme de temperatura baixa na sala {room_number}, ligando ar-condicionado para aumentar a temperatura.")
             else:
-                print(f"Alarme de temperatura ideal na sala {room_number}, desligando ar-condicionado.")
+                self.log(f"Alarme de temperatura ideal na sala {room_number}, desligando ar-condicionado.")
         
         elif control_type == "HC":
             if action == "DOWN":
-                print(f"Alarme de umidade alta na sala {room_number}, ligando controlador de umidade.")
+                self.log(f"Alarme de umidade alta na sala {room_number}, ligando controlador de umidade.")
             elif action == "UP":
-                print(f"Alarme de umidade baixa na sala {room_number}, ligando controlador de umidade.")
+                self.log(f"Alarme de umidade baixa na sala {room_number}, ligando controlador de umidade.")
             else:
-                print(f"Alarme de umidade ideal na sala {room_number}, desligando controlador de umidade.")
+                self.log(f"Alarme de umidade ideal na sala {room_number}, desligando controlador de umidade.")
 
         elif control_type == "DISCONNECT":
-            print(f"{room_number} desconectou-se do sistema, desligando controladores..")
+            self.log(f"{room_number} desconectou-se do sistema, desligando controladores..")
 
         elif control_type == "ALARM":
             if action == "MOVEMENT":
-                print(f"Alarme de movimento na sala {room_number}, acionando alarme.")
+                self.log(f"Alarme de movimento na sala {room_number}, acionando alarme.")
                 ## Implementar alarme de movimento
                 
-        self.send_mqtt_message(room_number, control_type, action)
+        self.send_mqtt_message(self.actuator_topic(alarm_data), room_number, control_type, action)
 
     def print_alarm(self, alarm_data):
-        print(f"Sala: {alarm_data['numero_sala']}")
-        print(f"Tipo de Controle: {alarm_data['tipo_controle']}")
-        print(f"Ação: {alarm_data['acao']}")
-        print(f"Timestamp: {alarm_data['timestamp']}")
+        self.log("\n--- Alarme Recebido ---\n"
+                 f"Sala: {alarm_data['numero_sala']}\n"
+                 f"Tipo de Controle: {alarm_data['tipo_controle']}\n"
+                 f"Ação: {alarm_data['acao']}\n"
+                 f"Timestamp: {alarm_data['timestamp']}")
 
-    def handle_alarm_queue(self):
+    async def handle_alarm_queue(self):
         while True:
-            if not self.queue.empty():
-                alarm_data = self.queue.get()  # Pega o próximo item da fila
+            arrival, alarm_data = await self.queue.get()  # Aguarda o próximo item da fila sem consumir CPU
+            self.queue_wait_seconds.observe(time.monotonic() - arrival)
+            try:
                 self.handle_alarm(alarm_data)
+            except Exception:
+                # Uma mensagem invalida (ex.: sem response_topic) nao pode encerrar o unico consumidor da fila
+                self.alarm_errors.inc()
+                print(f"Erro ao tratar o alarme {alarm_data}:")
+                traceback.print_exc()
+                continue
+            latency = time.monotonic() - arrival
+            with self.latency_lock:
+                self.latencies.append(latency)
+            self.alarm_seconds.observe(latency)
+            self.log(f"Alarme tratado em {latency * 1000:.2f} ms (fila: {self.queue.qsize()})")
+
+    def latency_stats(self):
+        with self.latency_lock:
+            ordered = sorted(self.latencies)
+        if not ordered:
+            return {"count": 0}
+        return {
+            "count": len(ordered),
+            "p50_ms": ordered[len(ordered) // 2] * 1000,
+            "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+            "max_ms": ordered[-1] * 1000,
+        }
+
+    def status(self):
+        return {
+            "queue_size": self.queue.qsize() if self.queue else 0,
+            "alarms_received": self.alarms_received.value,
+            "broadcast_rooms": self.broadcast_rooms.value,
+            "alarm_errors": self.alarm_errors.value,
+            "latency": self.latency_stats(),
+        }
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -115,12 +240,23 @@ if __name__ == "__main__":
         sys.exit(1)
     
     group_id = sys.argv[1]
-    broker_address = "192.168.1.66"
-    broker_port = 1883
 
-    central_ip = "192.168.1.66"
-    central_port = 5000
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    broker_address = config.get('network', 'broker_address', fallback="192.168.1.66")
+    broker_port = config.getint('network', 'broker_port', fallback=1883)
+    central_ip = config.get('network', 'central_ip', fallback="192.168.1.66")
+    central_port = config.getint('network', 'central_port', fallback=5000)
+    metrics_port = config.getint('metrics', 'central_port', fallback=0)
+    log_messages = config.getboolean('metrics', 'log_messages', fallback=True)
+    log_rate = config.getint('metrics', 'log_rate', fallback=10)
+    broadcast_chunk = config.getint('central', 'broadcast_chunk', fallback=5000)
+    profiling_dir = config.get('profiling', 'directory', fallback="") or None
+    profiling_hz = config.getint('profiling', 'sample_hz', fallback=100)
 
-    control_central = ControlCentral(group_id, broker_address, broker_port, central_ip, central_port)
-    threading.Thread(target=control_central.handle_alarm_queue).start()  # Inicia o tratamento da fila em uma thread separada
-    control_central.start()
+    control_central = ControlCentral(group_id, broker_address, broker_port, central_ip, central_port, metrics_port, log_messages, log_rate,
+                                     broadcast_chunk, profiling_dir, profiling_hz)
+    try:
+        control_central.start()
+    except KeyboardInterrupt:
+        print("Latencia dos alarmes:", control_central.latency_stats())
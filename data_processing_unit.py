@@ -1,86 +1,340 @@
 import threading
 import paho.mqtt.client as mqtt
 import json
-import socket
-from influxdb_client_3 import InfluxDBClient3, Point
+from telemetry_codec import decode_payload
 import datetime
+import time
+import uuid
 import configparser
+from influx_writer import InfluxBatchWriter
+from sinks import Point, create_sink
+from spool import DiskSpool
+from central_link import CentralLink
+from liveness import LivenessTracker
+from worker_pool import ShardedWorkerPool
+from room_store import RoomStore, parse_timestamp
+from state_snapshot import StateSnapshot
+from cluster import ClusterMembership, decode_partition_state, default_instance_id, encode_partition_state, partition_of
+from rules import RuleEngine
+from command_tracker import CommandTracker
+from write_filter import ChangeFilter
+from rollups import RollupAggregator, window_label
+from metrics import MetricsRegistry, MetricsServer, RateLimitedLog, stats_gauges
+from read_api import ReadApi
+from profiling import ProfilingControl
+
+DRAIN_TIMEOUT = 2.0  # Espera maxima (s) pelas leituras enfileiradas antes de transferir uma particao
 
 class DataProcessor:
-    def __init__(self, broker_address, broker_port, central_ip, central_port, influx_token, influx_org, influx_host, influx_bucket, group_id):
+    def __init__(self, broker_address, broker_port, central_ip, central_port, influx_token, influx_org, influx_host, influx_bucket, group_id,
+                 batch_size=500, flush_interval=1.0, max_queue=10000, drop_policy="block", room_timeout=15,
+                 workers=4, worker_queue=10000, stats_interval=0,
+                 conflate=False, conflate_threshold=0, shed_threshold=None,
+                 batch_mode=False, batch_max=256, batch_window=0.05,
+                 metrics_port=0, log_messages=True, log_rate=10,
+                 write_deadbands=None, write_heartbeat=60,
+                 rollup_windows=None, rollup_lateness=60,
+                 spool_dir=None, spool_max_mb=512, replay_rate=50000,
+                 rules_path=None, rules_poll=2.0,
+                 command_tracking=False, ack_timeout=10.0, movement_window=5.0,
+                 snapshot_path=None, snapshot_interval=5.0, snapshot_full_every=60,
+                 cluster_partitions=0, instance_id=None, cluster_heartbeat=1.0, cluster_timeout=5.0, handoff_timeout=0,
+                 read_api_port=0, read_api_refresh=0.5,
+                 sink="influx", sink_path=None,
+                 profiling_dir=None, profiling_hz=100,
+                 host=None):
         self.group_id = group_id
         self.broker_address = broker_address
         self.broker_port = broker_port
         
         self.central_ip = central_ip
         self.central_port = central_port
+
+        # Com host (GroupHost), o grupo e um de varios atendidos pelo mesmo processo: conexao MQTT, conexao com a central,
+        # writer, workers, prazos das salas e metricas sao os do host, e este objeto guarda apenas o estado do grupo
+        self.host = host
+        if host and cluster_partitions:
+            raise ValueError("Grupos hospedados em um GroupHost nao usam cluster")
+
+        # Histogramas por etapa e contadores, exportados em /metrics quando metrics_port > 0
+        self.metrics = host.metrics if host else MetricsRegistry("processor")
+        self.metrics_port = metrics_port
+        self.receive_seconds = self.metrics.stage("mqtt_receive")
+        self.decode_seconds = self.metrics.stage("decode")
+        self.messages_received = self.metrics.counter("messages_received", "Mensagens recebidas do broker MQTT")
+        self.commands_sent = self.metrics.counter("commands_sent", "Mensagens enviadas para a central")
+        if not host:
+            self.metrics.add_collector(lambda: stats_gauges(self.stats()))
+        # Mensagens por leitura no console, opcionais e limitadas por segundo
+        self.log = RateLimitedLog(log_messages, log_rate)
+
+        if host:
+            # Os pontos do grupo recebem a tag group no writer compartilhado
+            self.central = host.central
+            self.sink = host.sink
+            self.spool = host.spool
+            self.writer = host.group_writer(group_id)
+        else:
+            # Conexao persistente com a central, com fila de saida e reconexao automatica
+            self.central = CentralLink(central_ip, central_port, metrics=self.metrics)
+
+            # Destino dos pontos: InfluxDB, arquivo local em line protocol ou nenhum; o cliente do InfluxDB so e carregado no sink "influx"
+            self.sink = create_sink(sink, influx_host, influx_token, influx_org, influx_bucket, sink_path)
+            # Todas as escritas no InfluxDB passam pelo writer em lote, fora da thread do MQTT
+            # Com spool_dir, os pontos sao guardados em disco enquanto o InfluxDB esta indisponivel e reenviados depois
+            self.spool = DiskSpool(spool_dir, max_bytes=spool_max_mb * 1024 * 1024) if spool_dir else None
+            self.writer = InfluxBatchWriter(self.sink, batch_size, flush_interval, max_queue, drop_policy, metrics=self.metrics,
+                                            spool=self.spool, replay_rate=replay_rate)
+        # Com bandas mortas definidas, room_data e alarm_data gravam apenas os campos que mudaram
+        self.write_filter = ChangeFilter(write_deadbands, write_heartbeat) if write_deadbands is not None else None
+        # Agregados por sala em janelas de rollup_windows segundos, gravados como room_rollup_<janela> ao fechar
+        self.rollups = RollupAggregator(rollup_windows, rollup_lateness, self.write_rollup) if rollup_windows else None
         
-        self.influx_client = InfluxDBClient3(host=influx_host, token=influx_token, org=influx_org)
-        self.influx_bucket = influx_bucket
-        
-        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
-        self.config = self.read_config()
+        self.client = host.client if host else mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+        # Limites por sala, zona ou padrao (intervals.cfg), recarregados quando os arquivos mudam
+        self.rules = host.rule_engine(rules_path) if host else RuleEngine(rules_path, "intervals.cfg", rules_poll)
+        # Suprime comandos repetidos enquanto a telemetria da sala nao confirma o anterior
+        self.command_tracker = CommandTracker(ack_timeout, movement_window) if command_tracking else None
 
         self.alarm = True
-        self.rooms = {}
-        self.connected_rooms = []  # Lista para armazenar os números das salas conectadas
-
-    def read_config(self):
-        config = {}
-        with open("intervals.cfg", "r") as file:
-            for line in file:
-                values = line.strip().split()
-                config["temperature"] = {"low": float(values[0]), "high": float(values[1]), "ideal": float(values[2])}
-                values = next(file).strip().split()
-                config["humidity"] = {"low": float(values[0]), "high": float(values[1]), "ideal": float(values[2])}
-        return config
+        self.rooms = RoomStore()  # Estado das salas em colunas, uma linha por sala
+        # Salas conectadas e seus prazos; a sala e desconectada apos room_timeout segundos sem leituras
+        self.liveness = host.group_liveness(group_id, self.handle_room_disconnect) if host else LivenessTracker(room_timeout, self.handle_room_disconnect)
+        # Com snapshot_path, o estado das salas e o alarme sao salvos periodicamente e restaurados no reinicio.
+        # Salas que estavam conectadas voltam conectadas, sem novos room_status, e expiram normalmente se nao enviarem leituras
+        self.snapshot = StateSnapshot(snapshot_path, self.rooms, lambda: self.alarm, snapshot_interval, snapshot_full_every) if snapshot_path else None
+        if self.snapshot:
+            alarm = self.snapshot.load()
+            if alarm is not None:
+                self.alarm = alarm
+                if not cluster_partitions:  # Em cluster, as salas voltam junto com as particoes recebidas
+                    self.liveness.restore(room_number for room_number, connected in zip(self.rooms.room_numbers, self.rooms.connected) if connected)
+        # Com cluster_partitions > 0, as leituras chegam em {grupo}_ROOM_DATA/<particao> e cada instancia assina apenas
+        # as particoes que possui. Ao mudar de dono, a particao leva o estado das suas salas: o dono anterior o publica
+        # e o novo dono guarda as leituras da particao ate recebe-lo (ou ate handoff_timeout)
+        self.cluster = None
+        if cluster_partitions:
+            self.cluster = ClusterMembership(self.client, group_id, instance_id or default_instance_id(), cluster_partitions,
+                                             self.change_partitions, cluster_heartbeat, cluster_timeout)
+        # Estado atual das salas em HTTP/JSON (painel de status e scripts), sem consultar o InfluxDB
+        self.read_api = ReadApi(self.rooms, lambda: self.alarm, port=read_api_port, refresh_interval=read_api_refresh) if read_api_port > 0 else None
+        # Canal local de diagnostico: pilhas e estado das threads, estatisticas das filas e perfis sob demanda
+        self.profiling = ProfilingControl(f"processor-{group_id}", self.stats, profiling_dir, profiling_hz) if profiling_dir else None
+        self.pending_partitions = {}  # Particao recebida -> leituras aguardando o estado do dono anterior
+        self.partition_lock = threading.Lock()
+        # Prazo pelo estado do dono anterior: ele percebe a troca pelos heartbeats (ate member_timeout com mensagens
+        # atrasadas) e ainda espera as leituras enfileiradas (wait_idle) antes de publicar; 0 usa essa soma
+        self.handoff_timeout = handoff_timeout or cluster_timeout + DRAIN_TIMEOUT + batch_window
+        # Leituras distribuidas por numero da sala; cada worker processa sempre as mesmas salas
+        # No modo de conflacao, leituras pendentes da mesma sala sao mescladas e apenas a mais recente e processada
+        # No modo em lote, cada worker acumula leituras e avalia limites e energia de forma vetorizada
+        self.batch_mode = batch_mode
+        if batch_mode:
+            import batch_evaluator  # Depende do NumPy; carregado apenas no modo em lote
+            self.batch_evaluator = batch_evaluator
+        if host:
+            self.pool = host.pool
+        else:
+            self.pool = ShardedWorkerPool(workers, self.process_sensor_data, worker_queue, conflate, conflate_threshold, shed_threshold,
+                                          self.process_sensor_batch if batch_mode else None, batch_max, batch_window, self.metrics)
+        self.stats_interval = stats_interval
 
     def start(self):
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.connect(self.broker_address, self.broker_port, 60)
         
+        self.writer.start()
+        self.central.start()
+        self.liveness.start()
+        self.rules.start()
+        self.pool.start()
+        if self.snapshot:
+            self.snapshot.start()
+        if self.cluster:
+            self.cluster.start()
+        if self.read_api:
+            self.read_api.start()
+        if self.profiling:
+            self.profiling.start()
+        if self.stats_interval > 0:
+            threading.Thread(target=self.report_stats, daemon=True).start()
+        if self.metrics_port > 0:
+            MetricsServer(self.metrics, port=self.metrics_port).start()
         threading.Thread(target=self.client.loop_forever).start()
-        threading.Thread(target=self.check_connected_rooms).start()
 
     def on_connect(self, client, userdata, flags, rc):
         print(f"Conectado ao Broket MQTT endereco {self.broker_address}")
-        client.subscribe("#")  # Subscreve a todos os tópicos
+        # Apenas os topicos tratados pelo processador
+        topics = [(f"{self.group_id}_ALARM_CONTROL", 0), ("OTHER_ROOMS", 0)]
+        if self.cluster:
+            topics.append((f"{self.cluster.prefix}/#", 1))
+            topics.extend((f"{self.group_id}_ROOM_DATA/{partition}", 0) for partition in self.cluster.owned)
+        else:
+            topics.append((f"{self.group_id}_ROOM_DATA", 0))
+        client.subscribe(topics)
 
     def on_message(self, client, userdata, message):
-        payload = json.loads(message.payload)
+        if self.cluster and message.topic.startswith(self.cluster.prefix):
+            self.on_cluster_message(message.topic, message.payload)
+            return
+        received = time.perf_counter()
+        payload = decode_payload(message.payload)  # JSON ou telemetria binaria, detectado por mensagem
+        self.decode_seconds.observe(time.perf_counter() - received)
+        self.messages_received.inc()
         topic = message.topic
-        if topic == f"{self.group_id}_ROOM_DATA":
-            self.process_sensor_data(payload, f"{self.group_id}_ACT")
+        if topic.startswith(f"{self.group_id}_ROOM_DATA"):
+            self.dispatch_reading(payload, f"{self.group_id}_ACT")
 
         elif topic == "OTHER_ROOMS":
-            self.process_sensor_data(payload, f"{self.group_id}_OTHER_ROOMS_ACT")
+            self.dispatch_reading(payload, f"{self.group_id}_OTHER_ROOMS_ACT")
 
         elif topic == f"{self.group_id}_ALARM_CONTROL":
             self.process_alarm_control(payload, f"{self.group_id}_ALARM_ACT")
 
-    def check_connected_rooms(self):
+        self.receive_seconds.observe(time.perf_counter() - received)
+
+    def dispatch_reading(self, payload, response_topic):
+        room_number = payload.get("numero_sala")
+        if self.cluster:
+            partition = partition_of(room_number, self.cluster.partitions)
+            if partition not in self.cluster.owned:
+                return  # Sala de outra instancia (OTHER_ROOMS chega a todas)
+            with self.partition_lock:
+                pending = self.pending_partitions.get(partition)
+                if pending is not None:
+                    pending.append((payload, response_topic))
+                    return
+        self.enqueue(payload, response_topic)
+
+    def enqueue(self, payload, response_topic):
+        # Leituras com movimento nunca sao mescladas nem descartadas
+        if self.host:
+            # Nos workers compartilhados, a chave inclui o grupo: salas de mesmo numero em grupos diferentes nao se mesclam
+            self.pool.dispatch((self.group_id, payload.get("numero_sala")), (self, payload, response_topic), not payload.get("movimento"))
+        else:
+            self.pool.dispatch(payload.get("numero_sala"), (payload, response_topic), not payload.get("movimento"))
+
+    def on_cluster_message(self, topic, payload):
+        if topic.startswith(f"{self.cluster.prefix}/members/"):
+            self.cluster.on_message(topic, payload)
+        elif topic.startswith(f"{self.cluster.prefix}/handoff/"):
+            self.release_partition(int(topic.rsplit("/", 1)[1]), decode_partition_state(payload))
+
+    def change_partitions(self, assigned, revoked):
+        # Chamado pelo ClusterMembership quando os membros mudam
+        with self.partition_lock:
+            for partition in assigned:
+                self.pending_partitions[partition] = []
+        if assigned:
+            self.client.subscribe([(f"{self.group_id}_ROOM_DATA/{partition}", 0) for partition in assigned])
+            for partition in assigned:
+                timer = threading.Timer(self.handoff_timeout, self.release_partition, args=(partition, None))
+                timer.daemon = True
+                timer.start()
+        if revoked:
+            self.client.unsubscribe([f"{self.group_id}_ROOM_DATA/{partition}" for partition in revoked])
+            for partition in revoked:
+                self.release_partition(partition, None)
+            self.wait_idle()
+            for partition in revoked:
+                self.send_handoff(partition)
+
+    def wait_idle(self, timeout=DRAIN_TIMEOUT):
+        # Espera as leituras ja enfileiradas antes de transferir o estado
+        deadline = time.monotonic() + timeout
+        while any(queue.qsize() for queue in self.pool.queues) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(self.pool.batch_window if self.batch_mode else 0.01)  # Leitura ou lote ainda em processamento
+
+    def send_handoff(self, partition):
+        rooms = self.rooms
+        rows = [row for row, room_number in enumerate(rooms.room_numbers) if partition_of(room_number, self.cluster.partitions) == partition]
+        self.client.publish(self.cluster.handoff_topic(partition), encode_partition_state(rooms.columns(), rows), qos=1)
+        room_numbers = [rooms.room_numbers[row] for row in rows]
+        self.liveness.forget(room_numbers)
+        for row, room_number in zip(rows, room_numbers):
+            rooms.connected[row] = 0  # A sala passa a ser do novo dono, sem alerta de desconexao
+            rooms.mark_dirty(row)
+            if self.command_tracker:
+                self.command_tracker.forget(room_number)
+            if self.rollups:
+                self.rollups.close_room(room_number)
+        self.cluster.handoffs_sent += 1
+
+    def release_partition(self, partition, state):
+        # Aplica o estado publicado pelo dono anterior (None apos handoff_timeout) e processa, em ordem,
+        # as leituras guardadas; as que o dono anterior ja tinha processado sao ignoradas
+        with self.partition_lock:
+            pending = self.pending_partitions.pop(partition, None)
+            if pending is None:
+                return  # Particao de outra instancia, ou estado que chegou depois do prazo
+            rooms = self.rooms
+            if state is not None:
+                connected = []
+                for i, room_number in enumerate(state["room_number"]):
+                    row = rooms.add(room_number, 0, 0, 0, 0, 0, 0)
+                    for field in rooms.FIELDS:
+                        getattr(rooms, field)[row] = state[field][i]
+                    rooms.mark_dirty(row)
+                    if state["connected"][i]:
+                        connected.append(room_number)
+                self.liveness.restore(connected)
+                self.cluster.handoffs_received += 1
+            for payload, response_topic in pending:
+                row = rooms.row(payload.get("numero_sala"))
+                if state is not None and row is not None and parse_timestamp(payload["timestamp"]) <= rooms.last_update[row]:
+                    continue
+                self.enqueue(payload, response_topic)
+
+    def stats(self):
+        # Com host, as estatisticas dos componentes compartilhados sao as do GroupHost
+        stats = {} if self.host else {
+            "workers": self.pool.stats(),
+            "influx_writer": self.writer.stats(),
+            "central": self.central.stats(),
+        }
+        stats["liveness"] = self.liveness.stats()
+        stats["rules"] = self.rules.stats()
+        if self.command_tracker:
+            stats["commands"] = self.command_tracker.stats()
+        if self.write_filter:
+            stats["write_filter"] = self.write_filter.stats()
+        if self.rollups:
+            stats["rollups"] = self.rollups.stats()
+        if self.snapshot:
+            stats["snapshot"] = self.snapshot.stats()
+        if self.cluster:
+            stats["cluster"] = self.cluster.stats()
+        if self.read_api:
+            stats["read_api"] = self.read_api.stats()
+        return stats
+
+    def report_stats(self):
         while True:
-            for room_number in self.connected_rooms.copy():  # Faz uma cópia da lista
-                last_update = datetime.datetime.strptime(self.rooms[room_number]["last_update"], "%Y-%m-%d %H:%M:%S")
-                current_time = datetime.datetime.now()
-                time_diff = current_time - last_update
-                if time_diff.total_seconds() > 15:
-                    self.rooms[room_number]["connected"] = False
-                    self.connected_rooms.remove(room_number)
-
-            for room_number in self.connected_rooms.copy():
-                if not self.rooms[room_number]["connected"]:
-                    self.send_disconnect_alert(room_number)
-
-                    point = (
-                        Point("room_status")
-                        .tag("room_number", room_number)
-                        .field("connected", False)
-                    )
+            time.sleep(self.stats_interval)
+            print(json.dumps(self.stats()))
+
+    def handle_room_disconnect(self, room_number):
+        # Chamado pelo LivenessTracker uma unica vez quando o prazo da sala expira
+        if self.liveness.is_connected(room_number):
+            return  # A sala voltou a enviar leituras enquanto a desconexao era tratada
+        row = self.rooms.row(room_number)
+        self.rooms.connected[row] = 0
+        self.rooms.mark_dirty(row)
+        self.send_disconnect_alert(room_number)
+        if self.command_tracker:
+            self.command_tracker.forget(room_number)
+        if self.rollups:
+            self.rollups.close_room(room_number)
 
-                    self.influx_client.write(database=self.influx_bucket, record=point)
+        point = (
+            Point("room_status")
+            .tag("room_number", room_number)
+            .field("connected", False)
+        )
 
+        self.writer.write(point)
 
     def process_sensor_data(self, data, response_topic):
         room_number = data["numero_sala"]
@@ -91,27 +345,15 @@ class DataProcessor:
         hc_funcionando = data["hc_funcionando"]
         movement = data["movimento"]
         timestamp = data["timestamp"]
+        if self.command_tracker:
+            self.command_tracker.observe(room_number, ac_funcionando, hc_funcionando, movement)
 
         if movement and self.alarm:
-            alarm_data = {"numero_sala": room_number, "tipo_controle": "ALARM", "acao": "MOVEMENT", "response_topic": response_topic, "timestamp": timestamp}
-            self.send_to_central(alarm_data)
-
-            point = (
-                Point("alarm_data")
-                .tag("room_number", room_number)
-                .field("intrusion", True)
-            )
-
-            self.influx_client.write(database=self.influx_bucket, record=point)
+            self.send_movement_alarm(room_number, response_topic, timestamp)
+            self.write_alarm_data(room_number, True)
 
         else:
-            point = (
-                Point("alarm_data")
-                .tag("room_number", room_number)
-                .field("intrusion", False)
-            )
-
-            self.influx_client.write(database=self.influx_bucket, record=point)
+            self.write_alarm_data(room_number, False)
 
         if sensor_type != 1 and sensor_type != 2:
             alarm_data = {"numero_sala": room_number, "tipo_controle": "DATA", "acao": "DESCART", "response_topic": response_topic, "timestamp": timestamp}
@@ -123,165 +365,385 @@ class DataProcessor:
                 .field("invalid_data", True)
             )
 
-            self.influx_client.write(database=self.influx_bucket, record=point)
+            self.writer.write(point)
 
             return
 
-        if room_number not in self.rooms:
-            self.rooms[room_number] = {
-                "temperature": temperature,
-                "humidity": humidity,
-                "last_update": timestamp,
-                "hc_cost": 0,
-                "ac_cost": 0,
-                "ac_power_consumption": 0,
-                "hc_power_consumption": 0,
-                "connected": True,
-                "ac_funcionando": ac_funcionando,
-                "hc_funcionando": hc_funcionando,
-                "movement": movement,
-            }
-            self.connected_rooms.append(room_number)  # Adiciona a sala à lista de salas conectadas
+        rooms = self.rooms
+        last_update = parse_timestamp(timestamp)
+        ac_energy = hc_energy = 0.0
+        ac_seconds = hc_seconds = 0.0  # Tempo com cada atuador ligado, para os rollups
+        row = rooms.row(room_number)
+        if row is None:
+            row = rooms.add(room_number, temperature, humidity, last_update, ac_funcionando, hc_funcionando, movement)
+        
+        else:
+            time_diff = last_update - rooms.last_update[row]
 
+            if ac_funcionando:
+                ac_seconds = time_diff
+                rooms.ac_cost[row] += time_diff / 3600 * 3 * 0.15  # Calculating cost based on power consumption (Watts)
+                ac_energy = time_diff / 3600 * 3000  # Calculating power consumption (Watts)
+                rooms.ac_power_consumption[row] += ac_energy
+            
+            if hc_funcionando:
+                hc_seconds = time_diff
+                rooms.hc_cost[row] += time_diff / 3600 * 1 * 0.15  # Calculating cost based on power consumption (Watts)
+                hc_energy = time_diff / 3600 * 1000  # Calculating power consumption (Watts)
+                rooms.hc_power_consumption[row] += hc_energy
+
+            rooms.temperature[row] = temperature
+            rooms.humidity[row] = humidity
+            rooms.last_update[row] = last_update
+            rooms.connected[row] = 1
+            rooms.ac_funcionando[row] = ac_funcionando
+            rooms.hc_funcionando[row] = hc_funcionando
+            rooms.movement[row] = movement
+        rooms.mark_dirty(row)
+
+        if self.liveness.touch(room_number):  # Sala nova ou reconectada
             point = (
                 Point("room_status")
                 .tag("room_number", room_number)
                 .field("connected", True)
             )
 
-            self.influx_client.write(database=self.influx_bucket, record=point)
-        
-        else:
-            last_update = datetime.datetime.strptime(self.rooms[room_number]["last_update"], "%Y-%m-%d %H:%M:%S")
-            current_update = datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
-            time_diff = current_update - last_update
-
-            if ac_funcionando:
-                self.rooms[room_number]["ac_cost"] += time_diff.total_seconds() / 3600 * 3 * 0.15  # Calculating cost based on power consumption (Watts)
-                self.rooms[room_number]["ac_power_consumption"] += time_diff.total_seconds() / 3600 * 3000  # Calculating power consumption (Watts)
-            
-            if hc_funcionando:
-                self.rooms[room_number]["hc_cost"] += time_diff.total_seconds() / 3600 * 1 * 0.15  # Calculating cost based on power consumption (Watts)
-                self.rooms[room_number]["hc_power_consumption"] += time_diff.total_seconds() / 3600 * 1000  # Calculating power consumption (Watts)
-
-            self.rooms[room_number]["temperature"] = temperature
-            self.rooms[room_number]["humidity"] = humidity
-            self.rooms[room_number]["last_update"] = timestamp
-            self.rooms[room_number]["connected"] = True
-            self.rooms[room_number]["ac_funcionando"] = ac_funcionando
-            self.rooms[room_number]["hc_funcionando"] = hc_funcionando
-            self.rooms[room_number]["movement"] = movement
-            self.connected_rooms.append(room_number)  # Adiciona a sala à lista de salas conectadas
+            self.writer.write(point)
 
             
 
         if sensor_type == 1 or sensor_type == 2:
             if sensor_type == 2:
                 temperature = (temperature - 32) * 5 / 9  # Conversão de Fahrenheit para Celsius
-            if self.config:
-                if temperature > self.config["temperature"]["high"] and not ac_funcionando:
-                    print(f"{timestamp}: Alta temperatura registrada na sala {room_number}, enviando comando para a central ligar o ar condicionado.")
-                    self.send_ac_command(room_number, "DOWN", self.config["temperature"]["ideal"], response_topic)
+            rule = self.rules.lookup(room_number)
+            if temperature > rule.temperature_high and not ac_funcionando:
+                self.log(f"{timestamp}: Alta temperatura registrada na sala {room_number}, enviando comando para a central ligar o ar condicionado.")
+                self.send_ac_command(room_number, "DOWN", rule.temperature_ideal, response_topic)
 
-                elif temperature < self.config["temperature"]["low"] and not ac_funcionando:
-                    print(f"{timestamp}: Baixa temperatura registrada na sala {room_number}, enviando comando para a central ligar o ar condicionado.")
-                    self.send_ac_command(room_number, "UP", self.config["temperature"]["ideal"], response_topic)
+            elif temperature < rule.temperature_low and not ac_funcionando:
+                self.log(f"{timestamp}: Baixa temperatura registrada na sala {room_number}, enviando comando para a central ligar o ar condicionado.")
+                self.send_ac_command(room_number, "UP", rule.temperature_ideal, response_topic)
 
-                elif temperature > self.config["temperature"]["low"]+3 and temperature < self.config["temperature"]["high"]-3 and ac_funcionando:
-                    print(f"{timestamp}: Temperatura ideal registrada na sala {room_number}, enviando comando para a central desligar o ar condicionado.")
-                    self.send_ac_command(room_number, "OFF", self.config["temperature"]["ideal"], response_topic)
+            elif temperature > rule.temperature_low + rule.temperature_margin and temperature < rule.temperature_high - rule.temperature_margin and ac_funcionando:
+                self.log(f"{timestamp}: Temperatura ideal registrada na sala {room_number}, enviando comando para a central desligar o ar condicionado.")
+                self.send_ac_command(room_number, "OFF", rule.temperature_ideal, response_topic)
 
-                if humidity > self.config["humidity"]["high"] and not hc_funcionando:
-                    print(f"{timestamp}: Alta umidade registrada na sala {room_number}, enviando comando para a central diminuir a umidade.")
-                    self.send_hc_command(room_number, "DOWN", self.config["humidity"]["ideal"], response_topic)
+            if humidity > rule.humidity_high and not hc_funcionando:
+                self.log(f"{timestamp}: Alta umidade registrada na sala {room_number}, enviando comando para a central diminuir a umidade.")
+                self.send_hc_command(room_number, "DOWN", rule.humidity_ideal, response_topic)
 
-                elif humidity < self.config["humidity"]["low"] and not hc_funcionando:
-                    print(f"{timestamp}: Baixa umidade registrada na sala {room_number}, enviando comando para a central aumentar a umidade.")
-                    self.send_hc_command(room_number, "UP", self.config["humidity"]["ideal"], response_topic)
+            elif humidity < rule.humidity_low and not hc_funcionando:
+                self.log(f"{timestamp}: Baixa umidade registrada na sala {room_number}, enviando comando para a central aumentar a umidade.")
+                self.send_hc_command(room_number, "UP", rule.humidity_ideal, response_topic)
 
-                elif humidity > self.config["humidity"]["low"]+5 and humidity < self.config["humidity"]["high"]-5 and hc_funcionando:
-                    print(f"{timestamp}: Umidade ideal registrada na sala {room_number}, enviando comando para a central desligar o controlador de umidade.")
-                    self.send_hc_command(room_number, "OFF", self.config["humidity"]["ideal"], response_topic)
+            elif humidity > rule.humidity_low + rule.humidity_margin and humidity < rule.humidity_high - rule.humidity_margin and hc_funcionando:
+                self.log(f"{timestamp}: Umidade ideal registrada na sala {room_number}, enviando comando para a central desligar o controlador de umidade.")
+                self.send_hc_command(room_number, "OFF", rule.humidity_ideal, response_topic)
+
+            if self.rollups:
+                self.rollups.add(room_number, last_update, temperature, humidity, movement and self.alarm,
+                                 ac_energy, hc_energy, ac_seconds, hc_seconds)
+
+            # Salva os dados no InfluxDB
+            self.update_rooms_database(row)
+
+    def process_sensor_batch(self, items):
+        # Equivalente a process_sensor_data para um lote, mas enviando apenas o ultimo comando de cada sala
+        # por tipo de controle e gravando um unico ponto por sala em cada medida (room_data, alarm_data, com
+        # intrusion se houve intrusao no lote, room_status e invalid_data), enviados ao writer de uma vez
+        commands = {}
+        points = {}  # (medida, sala) -> Point
+        intrusions = {}
+        valid = []
+        for data, response_topic in items:
+            room_number = data["numero_sala"]
+            timestamp = data["timestamp"]
+            if self.command_tracker:
+                self.command_tracker.observe(room_number, data["ac_funcionando"], data["hc_funcionando"], data["movimento"])
+
+            if data["movimento"] and self.alarm:
+                commands[(room_number, "ALARM")] = (self.send_movement_alarm, (room_number, response_topic, timestamp))
+                intrusions[room_number] = True
+            else:
+                intrusions.setdefault(room_number, False)
+
+            if data["tipo_sensor"] != 1 and data["tipo_sensor"] != 2:
+                alarm_data = {"numero_sala": room_number, "tipo_controle": "DATA", "acao": "DESCART", "response_topic": response_topic, "timestamp": timestamp}
+                commands[(room_number, "DATA")] = (self.send_to_central, (alarm_data,))
+                points[("invalid_data", room_number)] = Point("invalid_data").tag("room_number", room_number).field("invalid_data", True)
+                continue
+
+            valid.append((data, response_topic))
+
+        for room_number, intrusion in intrusions.items():
+            point = self.alarm_data_point(room_number, intrusion)
+            if point:
+                points[("alarm_data", room_number)] = point
+
+        if valid:
+            self.evaluate_batch(valid, commands, points)
+
+        self.writer.write_many(list(points.values()))
+        for send, args in commands.values():
+            send(*args)
+
+    def evaluate_batch(self, valid, commands, points):
+        rooms = self.rooms
+        batch_evaluator = self.batch_evaluator
+        readings = batch_evaluator.decode_readings([data for data, _ in valid])
+        timestamps = readings["timestamp"]
+        rows, previous_update = batch_evaluator.resolve_rows(rooms, [data for data, _ in valid], timestamps)
+
+        unique_rows, ac_hours, hc_hours, last = batch_evaluator.integrate_energy(
+            rows, timestamps, readings["ac_funcionando"], readings["hc_funcionando"], previous_update)
+
+        temperature = batch_evaluator.to_celsius(readings["temperature"], readings["sensor_type"])
+        ruleset = self.rules.current  # O lote inteiro e avaliado com o mesmo conjunto de regras
+        room_rules = {}
+        for data, _ in valid:
+            room_number = data["numero_sala"]
+            if room_number not in room_rules:
+                room_rules[room_number] = ruleset.lookup(room_number)
+        rules = [room_rules[data["numero_sala"]] for data, _ in valid]
+        limits = batch_evaluator.rule_columns(rules)
+        ac_actions = batch_evaluator.evaluate_thresholds(temperature, readings["ac_funcionando"],
+                                                         limits["temperature_low"], limits["temperature_high"], limits["temperature_margin"])
+        hc_actions = batch_evaluator.evaluate_thresholds(readings["humidity"], readings["hc_funcionando"],
+                                                         limits["humidity_low"], limits["humidity_high"], limits["humidity_margin"])
+
+        for i in batch_evaluator.last_actions(rows, ac_actions).tolist():
+            data, response_topic = valid[i]
+            action = batch_evaluator.ACTIONS[ac_actions[i]]
+            self.log(f"{data['timestamp']}: Sala {data['numero_sala']}, enviando comando {action} do ar condicionado para a central.")
+            commands[(data["numero_sala"], "AC")] = (self.send_ac_command, (data["numero_sala"], action, rules[i].temperature_ideal, response_topic))
+
+        for i in batch_evaluator.last_actions(rows, hc_actions).tolist():
+            data, response_topic = valid[i]
+            action = batch_evaluator.ACTIONS[hc_actions[i]]
+            self.log(f"{data['timestamp']}: Sala {data['numero_sala']}, enviando comando {action} do controlador de umidade para a central.")
+            commands[(data["numero_sala"], "HC")] = (self.send_hc_command, (data["numero_sala"], action, rules[i].humidity_ideal, response_topic))
+
+        if self.rollups:
+            # A energia e o tempo ligado integrados no lote entram na janela da ultima leitura de cada sala
+            energy = {i: (ac * 3000, hc * 1000, ac * 3600, hc * 3600) for i, ac, hc in zip(last.tolist(), ac_hours.tolist(), hc_hours.tolist())}
+            for i, ((data, _), timestamp, celsius) in enumerate(zip(valid, timestamps.tolist(), temperature.tolist())):
+                self.rollups.add(data["numero_sala"], timestamp, celsius, data["umidade"], data["movimento"] and self.alarm,
+                                 *energy.get(i, (0.0, 0.0, 0.0, 0.0)))
+
+        for row, ac, hc, i in zip(unique_rows.tolist(), ac_hours.tolist(), hc_hours.tolist(), last.tolist()):
+            data = valid[i][0]
+            rooms.ac_cost[row] += ac * 3 * 0.15  # Calculating cost based on power consumption (Watts)
+            rooms.ac_power_consumption[row] += ac * 3000  # Calculating power consumption (Watts)
+            rooms.hc_cost[row] += hc * 1 * 0.15  # Calculating cost based on power consumption (Watts)
+            rooms.hc_power_consumption[row] += hc * 1000  # Calculating power consumption (Watts)
+            rooms.temperature[row] = data["temperatura"]
+            rooms.humidity[row] = data["umidade"]
+            rooms.last_update[row] = timestamps[i]
+            rooms.connected[row] = 1
+            rooms.ac_funcionando[row] = data["ac_funcionando"]
+            rooms.hc_funcionando[row] = data["hc_funcionando"]
+            rooms.movement[row] = data["movimento"]
+            rooms.mark_dirty(row)
+
+            if self.liveness.touch(data["numero_sala"]):  # Sala nova ou reconectada
+                points[("room_status", data["numero_sala"])] = Point("room_status").tag("room_number", data["numero_sala"]).field("connected", True)
 
             # Salva os dados no InfluxDB
-            self.update_rooms_database(room_number)
+            point = self.room_data_point(row)
+            if point:
+                points[("room_data", data["numero_sala"])] = point
 
     def process_alarm_control(self, data, response_topic):
         command = data["command"]
-        for room_number in self.connected_rooms:  # Itera sobre as salas conectadas
-            if command == "ON":
-                self.alarm = True
-                print("Alarme de movimento ativado.")
-            elif command == "OFF":
-                self.alarm = False
-                print("Alarme de movimento desativado.")
+        if command == "ON":
+            self.alarm = True
+            self.log("Alarme de movimento ativado.")
+        elif command == "OFF":
+            self.alarm = False
+            self.log("Alarme de movimento desativado.")
+
+        # Uma unica mensagem para a central com todas as salas conectadas; a central divide em poucas publicacoes.
+        # Sem salas conectadas a mensagem segue com a lista vazia, e a central responde com a conclusao (salas: 0)
+        rooms = sorted(self.liveness.connected_rooms())
+        data = {"salas": rooms, "tipo_controle": "ALARM", "acao": command, "broadcast_id": uuid.uuid4().hex[:12],
+                "response_topic": response_topic, "timestamp": datetime.datetime.now().isoformat()}
+        self.send_to_central(data)
 
-            data = {"numero_sala": room_number, "tipo_controle": "ALARM", "acao": "OFF", "response_topic": response_topic, "timestamp": datetime.datetime.now().isoformat()}
-            self.send_to_central(data)
+    def send_movement_alarm(self, room_number, response_topic, timestamp):
+        if self.command_tracker and not self.command_tracker.should_send(room_number, "ALARM", "MOVEMENT"):
+            return
+        alarm_data = {"numero_sala": room_number, "tipo_controle": "ALARM", "acao": "MOVEMENT", "response_topic": response_topic, "timestamp": timestamp}
+        self.send_to_central(alarm_data)
 
     def send_ac_command(self, room_number, action, ideal_value, response_topic):
+        if self.command_tracker and not self.command_tracker.should_send(room_number, "AC", action):
+            return
         ac_data = {"numero_sala":room_number, "tipo_controle": "AC", "acao": action, "valor_ideal": ideal_value, "response_topic": response_topic, "timestamp": datetime.datetime.now().isoformat()}
         self.send_to_central(ac_data)
 
     def send_hc_command(self, room_number, action, ideal_value, response_topic):
+        if self.command_tracker and not self.command_tracker.should_send(room_number, "HC", action):
+            return
         hc_data = {"numero_sala":room_number, "tipo_controle": "HC", "acao": action, "valor_ideal": ideal_value, "response_topic": response_topic, "timestamp": datetime.datetime.now().isoformat()}
         self.send_to_central(hc_data)
 
     def send_to_central(self, data):
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as central_socket:
-            central_socket.connect((self.central_ip, self.central_port))
-            central_socket.send(json.dumps(data).encode())
+        data["grupo"] = self.group_id  # A central publica nos topicos do grupo, e uma mesma central pode atender varios grupos
+        self.central.send(data)
+        self.commands_sent.inc()
 
     def send_disconnect_alert(self, room_number):
         data = {"numero_sala": room_number, "tipo_controle": "DISCONNECT", "acao": "DISCONNECT", "response_topic": f"{self.group_id}_ACT", "timestamp": datetime.datetime.now().isoformat()}
         self.send_to_central(data)
     
-    def update_rooms_database(self, room_number):
-        temperature = self.rooms[room_number]["temperature"]
-        humidity = self.rooms[room_number]["humidity"]
-        ac_cost = self.rooms[room_number]["ac_cost"]
-        hc_cost = self.rooms[room_number]["hc_cost"]
-        ac_power_consumption = self.rooms[room_number]["ac_power_consumption"]
-        hc_power_consumption = self.rooms[room_number]["hc_power_consumption"]
-        ac_funcionando = self.rooms[room_number]["ac_funcionando"]
-        hc_funcionando = self.rooms[room_number]["hc_funcionando"]
-        movement = self.rooms[room_number]["movement"]
-        connected = self.rooms[room_number]["connected"]
-
-        point = (
-            Point("room_data")
+    def update_rooms_database(self, row):
+        point = self.room_data_point(row)
+        if point:
+            self.writer.write(point)
+
+    def room_data_point(self, row):
+        # Ponto room_data com o estado atual da sala, ou None se o filtro de escrita nao tiver campos a gravar
+        rooms = self.rooms
+        room_number = rooms.room_numbers[row]
+        temperature = rooms.temperature[row]
+        humidity = rooms.humidity[row]
+        ac_cost = rooms.ac_cost[row]
+        hc_cost = rooms.hc_cost[row]
+        ac_power_consumption = rooms.ac_power_consumption[row]
+        hc_power_consumption = rooms.hc_power_consumption[row]
+        ac_funcionando = rooms.ac_funcionando[row]
+        hc_funcionando = rooms.hc_funcionando[row]
+        movement = rooms.movement[row]
+        connected = bool(rooms.connected[row])
+
+        fields = {
+            "temperature": float(temperature),
+            "humidity": float(humidity),
+            "ac_cost": float(ac_cost),
+            "hc_cost": float(hc_cost),
+            "ac_power_consumption": float(ac_power_consumption),
+            "hc_power_consumption": float(hc_power_consumption),
+            "ac_funcionando": ac_funcionando,
+            "hc_funcionando": hc_funcionando,
+            "connected": connected,
+            "movement": movement,
+            "alarm": self.alarm,
+        }
+        if self.write_filter:
+            fields = self.write_filter.filter(("room_data", room_number), fields)
+            if not fields:
+                return None
+
+        point = Point("room_data").tag("room_number", room_number)
+        point.fields.update(fields)
+        return point
+
+    def write_rollup(self, room_number, size, window):
+        # Chamado pelo RollupAggregator quando uma janela fecha; o ponto recebe o inicio da janela como timestamp
+        point = Point(f"room_rollup_{window_label(size)}").tag("room_number", room_number)
+        for field, value in window.fields().items():
+            point.field(field, value)
+
+        self.writer.write(point, int(window.start * 1_000_000_000))
+
+    def write_alarm_data(self, room_number, intrusion):
+        point = self.alarm_data_point(room_number, intrusion)
+        if point:
+            self.writer.write(point)
+
+    def alarm_data_point(self, room_number, intrusion):
+        if self.write_filter:
+            # Intrusoes sao sempre gravadas; intrusion=False apenas na transicao (ou no heartbeat)
+            if not self.write_filter.filter(("alarm_data", room_number), {"intrusion": intrusion}, force=intrusion):
+                return None
+
+        return (
+            Point("alarm_data")
             .tag("room_number", room_number)
-            .field("temperature", float(temperature))
-            .field("humidity", float(humidity))
-            .field("ac_cost", float(ac_cost))
-            .field("hc_cost", float(hc_cost))
-            .field("ac_power_consumption", float(ac_power_consumption))
-            .field("hc_power_consumption", float(hc_power_consumption))
-            .field("ac_funcionando", ac_funcionando)
-            .field("hc_funcionando", hc_funcionando)
-            .field("connected", connected)
-            .field("movement", movement)
-            .field("alarm", self.alarm)
+            .field("intrusion", intrusion)
         )
 
-        self.influx_client.write(database=self.influx_bucket, record=point)
-
-if __name__ == "__main__":
-    # Configurações iniciais
-    group_id = 1
-    broker_address = "192.168.1.66"
-    broker_port = 1883
-
-    central_ip = "192.168.1.66"
-    central_port = 5000
-
+def read_config(path="config.ini"):
+    # Argumentos do DataProcessor (exceto group_id) lidos do config.ini; tambem usados pelo GroupHost
     config = configparser.ConfigParser()
-    config.read("config.ini")
-
-    influx_api_key = config['influxdb']['api_key']
-    influx_url = config['influxdb']['url']
-    influx_org = config['influxdb']['org']
-    influx_bucket = config['influxdb']['bucket']
+    config.read(path)
+    options = {}
+
+    options["broker_address"] = config.get('network', 'broker_address', fallback="192.168.1.66")
+    options["broker_port"] = config.getint('network', 'broker_port', fallback=1883)
+    options["central_ip"] = config.get('network', 'central_ip', fallback="192.168.1.66")
+    options["central_port"] = config.getint('network', 'central_port', fallback=5000)
+
+    options["influx_token"] = config.get('influxdb', 'api_key', fallback="")
+    options["influx_host"] = config.get('influxdb', 'url', fallback="")
+    options["influx_org"] = config.get('influxdb', 'org', fallback="")
+    options["influx_bucket"] = config.get('influxdb', 'bucket', fallback="")
+
+    options["sink"] = config.get('sink', 'type', fallback="influx")
+    options["sink_path"] = config.get('sink', 'path', fallback="data/points.lp")
+
+    options["batch_size"] = config.getint('influx_writer', 'batch_size', fallback=500)
+    options["flush_interval"] = config.getfloat('influx_writer', 'flush_interval', fallback=1.0)
+    options["max_queue"] = config.getint('influx_writer', 'max_queue', fallback=10000)
+    options["drop_policy"] = config.get('influx_writer', 'drop_policy', fallback="block")
+    options["spool_dir"] = config.get('influx_writer', 'spool_dir', fallback="") or None
+    options["spool_max_mb"] = config.getint('influx_writer', 'spool_max_mb', fallback=512)
+    options["replay_rate"] = config.getint('influx_writer', 'replay_rate', fallback=50000)
+
+    options["rules_path"] = config.get('rules', 'file', fallback="rules.ini")
+    options["rules_poll"] = config.getfloat('rules', 'poll_interval', fallback=2.0)
+
+    options["command_tracking"] = config.getboolean('processor', 'command_tracking', fallback=False)
+    options["ack_timeout"] = config.getfloat('processor', 'ack_timeout', fallback=10.0)
+    options["movement_window"] = config.getfloat('processor', 'movement_window', fallback=5.0)
+
+    options["room_timeout"] = config.getfloat('processor', 'room_timeout', fallback=15)
+    options["workers"] = config.getint('processor', 'workers', fallback=4)
+    options["worker_queue"] = config.getint('processor', 'worker_queue', fallback=10000)
+    options["stats_interval"] = config.getfloat('processor', 'stats_interval', fallback=0)
+    options["conflate"] = config.getboolean('processor', 'conflate', fallback=False)
+    options["conflate_threshold"] = config.getint('processor', 'conflate_threshold', fallback=0)
+    options["shed_threshold"] = config.getint('processor', 'shed_threshold', fallback=options["worker_queue"])
+    options["batch_mode"] = config.getboolean('processor', 'batch_mode', fallback=False)
+    options["batch_max"] = config.getint('processor', 'batch_max', fallback=256)
+    options["batch_window"] = config.getfloat('processor', 'batch_window', fallback=0.05)
+
+    options["metrics_port"] = config.getint('metrics', 'processor_port', fallback=0)
+    options["log_messages"] = config.getboolean('metrics', 'log_messages', fallback=True)
+    options["log_rate"] = config.getint('metrics', 'log_rate', fallback=10)
+
+    # Bandas mortas por campo de room_data; campos ausentes sao gravados a cada mudanca
+    options["write_deadbands"] = None
+    if config.getboolean('write_filter', 'enabled', fallback=False):
+        options["write_deadbands"] = {field: float(value) for field, value in config['write_filter'].items() if field not in ("enabled", "heartbeat")}
+    options["write_heartbeat"] = config.getfloat('write_filter', 'heartbeat', fallback=60)
+
+    options["rollup_windows"] = [int(size) for size in config.get('rollups', 'windows', fallback="").split(",") if size.strip()]
+    options["rollup_lateness"] = config.getfloat('rollups', 'allowed_lateness', fallback=60)
+
+    options["snapshot_path"] = config.get('snapshot', 'path', fallback="") or None
+    options["snapshot_interval"] = config.getfloat('snapshot', 'interval', fallback=5.0)
+    options["snapshot_full_every"] = config.getint('snapshot', 'full_every', fallback=60)
+
+    options["cluster_partitions"] = config.getint('cluster', 'partitions', fallback=0)
+    options["instance_id"] = config.get('cluster', 'instance_id', fallback="") or None
+    options["cluster_heartbeat"] = config.getfloat('cluster', 'heartbeat_interval', fallback=1.0)
+    options["cluster_timeout"] = config.getfloat('cluster', 'member_timeout', fallback=5.0)
+    options["handoff_timeout"] = config.getfloat('cluster', 'handoff_timeout', fallback=0)
+
+    options["read_api_port"] = config.getint('read_api', 'port', fallback=0)
+    options["read_api_refresh"] = config.getfloat('read_api', 'refresh_interval', fallback=0.5)
+
+    options["profiling_dir"] = config.get('profiling', 'directory', fallback="") or None
+    options["profiling_hz"] = config.getint('profiling', 'sample_hz', fallback=100)
+    return options
 
-    processor = DataProcessor(broker_address, broker_port, central_ip, central_port, influx_api_key, influx_org, influx_url, influx_bucket, group_id)
+if __name__ == "__main__":
+    processor = DataProcessor(group_id=1, **read_config())
     processor.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        if processor.cluster:
+            processor.cluster.stop()  # Transfere as particoes para as outras instancias antes de sair
+        processor.client.disconnect()
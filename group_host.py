@@ -0,0 +1,300 @@
+import configparser
+import json
+import os
+import threading
+import time
+import paho.mqtt.client as mqtt
+from central_link import CentralLink
+from data_processing_unit import DataProcessor, read_config
+from influx_writer import InfluxBatchWriter
+from liveness import GroupLiveness, LivenessTracker
+from metrics import MetricsRegistry, MetricsServer, stats_gauges
+from profiling import ProfilingControl
+from rules import RuleEngine
+from sinks import create_sink
+from spool import DiskSpool
+from telemetry_codec import decode_payload
+from worker_pool import ShardedWorkerPool
+
+def read_groups(path):
+    # Um grupo por linha ou separados por virgula; o que vem depois de # e comentario
+    groups = []
+    with open(path, "r") as file:
+        for line in file:
+            groups.extend(group.strip() for group in line.split("#", 1)[0].split(",") if group.strip())
+    return groups
+
+def group_path(path, group_id, separate=False):
+    # {group} no caminho e substituido pelo grupo; com separate, um caminho sem {group} recebe o grupo antes da extensao
+    if not path:
+        return path
+    if "{group}" in path:
+        return path.replace("{group}", str(group_id))
+    if separate:
+        root, extension = os.path.splitext(path)
+        return f"{root}-{group_id}{extension}"
+    return path
+
+class GroupWriter:
+    # Escritas de um grupo no InfluxBatchWriter compartilhado: cada ponto recebe a tag group
+    def __init__(self, writer, group_id):
+        self.writer = writer
+        self.group_id = str(group_id)
+
+    def write(self, point, timestamp=None):
+        return self.writer.write(point.tag("group", self.group_id), timestamp)
+
+    def write_many(self, points, timestamp=None):
+        for point in points:
+            point.tag("group", self.group_id)
+        return self.writer.write_many(points, timestamp)
+
+class GroupHost:
+    # Varios grupos atendidos por um unico processo. Uma conexao MQTT, uma conexao com a central, um writer, um pool de
+    # workers e uma thread de prazos das salas sao compartilhados; cada grupo e um DataProcessor com o proprio estado das
+    # salas, limites, alarme e topicos. A lista de grupos e relida de groups_path quando o arquivo muda, e grupos sao
+    # adicionados ou removidos sem reiniciar o processo. Uma unica thread de manutencao recarrega a lista de grupos e as
+    # regras e grava os snapshots de todos os grupos.
+    def __init__(self, options, groups_path="groups.txt", poll_interval=2.0):
+        self.options = options
+        self.groups_path = groups_path
+        self.poll_interval = poll_interval
+        self.groups_mtime = None
+        # Sem cluster no host: cada grupo atende todas as salas, mas com partitions no config.ini os simuladores
+        # publicam em {grupo}_ROOM_DATA/{particao}, e esses topicos tambem sao assinados
+        self.partitions = options["cluster_partitions"]
+        if self.partitions:
+            print(f"O modo cluster nao e usado no GroupHost; cada grupo assina as {self.partitions} particoes das suas salas")
+
+        self.metrics = MetricsRegistry("processor")
+        self.metrics.add_collector(self.collect)
+        self.messages_received = self.metrics.counter("messages_received", "Mensagens recebidas do broker MQTT")
+        self.decode_seconds = self.metrics.stage("decode")
+
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+        self.central = CentralLink(options["central_ip"], options["central_port"], metrics=self.metrics)
+        self.sink = create_sink(options["sink"], options["influx_host"], options["influx_token"], options["influx_org"],
+                                options["influx_bucket"], options["sink_path"])
+        self.spool = DiskSpool(options["spool_dir"], max_bytes=options["spool_max_mb"] * 1024 * 1024) if options["spool_dir"] else None
+        self.writer = InfluxBatchWriter(self.sink, options["batch_size"], options["flush_interval"], options["max_queue"], options["drop_policy"],
+                                        metrics=self.metrics, spool=self.spool, replay_rate=options["replay_rate"])
+        # Prazos de todas as salas de todos os grupos, identificadas por (grupo, sala)
+        self.liveness = LivenessTracker(options["room_timeout"], self.on_room_disconnect)
+        # A chave de cada leitura inclui o grupo, e o item leva o DataProcessor que a processa
+        self.pool = ShardedWorkerPool(options["workers"], self.process_sensor_data, options["worker_queue"], options["conflate"],
+                                      options["conflate_threshold"], options["shed_threshold"],
+                                      self.process_sensor_batch if options["batch_mode"] else None, options["batch_max"],
+                                      options["batch_window"], self.metrics)
+        self.rule_engines = {}  # Arquivo de regras -> RuleEngine, compartilhado pelos grupos que usam o mesmo arquivo
+        self.profiling = ProfilingControl("processor-host", self.stats, options["profiling_dir"], options["profiling_hz"]) if options["profiling_dir"] else None
+
+        self.groups = {}  # Grupo -> DataProcessor
+        self.topics = {}  # Topico do grupo -> DataProcessor
+        self.lock = threading.Lock()
+        self.groups_added = 0
+        self.groups_removed = 0
+        self.reload_groups()
+
+    def group_writer(self, group_id):
+        return GroupWriter(self.writer, group_id)
+
+    def group_liveness(self, group_id, on_disconnect):
+        return GroupLiveness(self.liveness, group_id, on_disconnect)
+
+    def rule_engine(self, rules_path):
+        with self.lock:
+            engine = self.rule_engines.get(rules_path)
+            if engine is None:
+                engine = self.rule_engines[rules_path] = RuleEngine(rules_path, "intervals.cfg", 0)  # Recarregado pela thread do host
+        return engine
+
+    def group_topics(self, group_id):
+        topics = [f"{group_id}_ROOM_DATA", f"{group_id}_ALARM_CONTROL"]
+        if self.partitions:
+            topics.append(f"{group_id}_ROOM_DATA/+")
+        return topics
+
+    def add_group(self, group_id):
+        group_id = str(group_id)
+        if group_id in self.groups:
+            return
+        options = dict(self.options)
+        options.update(
+            rules_path=group_path(self.options["rules_path"], group_id),
+            snapshot_path=group_path(self.options["snapshot_path"], group_id, separate=True),
+            metrics_port=0, stats_interval=0, read_api_port=0, profiling_dir=None, cluster_partitions=0, instance_id=None,
+        )
+        processor = DataProcessor(group_id=group_id, host=self, **options)
+        with self.lock:
+            self.groups[group_id] = processor
+            for topic in self.group_topics(group_id):
+                self.topics[topic] = processor
+        self.groups_added += 1
+        if self.client.is_connected():
+            self.client.subscribe([(topic, 0) for topic in self.group_topics(group_id)])
+        print(f"Grupo {group_id} adicionado ({len(self.groups)} grupos)")
+
+    def remove_group(self, group_id):
+        group_id = str(group_id)
+        with self.lock:
+            processor = self.groups.pop(group_id, None)
+            if processor is None:
+                return
+            for topic in self.group_topics(group_id):
+                self.topics.pop(topic, None)
+        self.client.unsubscribe(self.group_topics(group_id))
+        processor.wait_idle()  # Leituras do grupo ja enfileiradas
+        processor.liveness.forget(processor.liveness.connected_rooms())
+        if processor.rollups:
+            for room_number in list(processor.rooms.room_numbers):
+                processor.rollups.close_room(room_number)
+        if processor.snapshot:
+            processor.snapshot.save()  # O estado volta se o grupo for adicionado novamente
+        self.groups_removed += 1
+        print(f"Grupo {group_id} removido ({len(self.groups)} grupos)")
+
+    def reload_groups(self):
+        try:
+            mtime = os.stat(self.groups_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self.groups_mtime:
+            return
+        self.groups_mtime = mtime
+        try:
+            groups = read_groups(self.groups_path) if mtime is not None else []
+        except OSError as e:
+            print(f"Erro ao ler a lista de grupos, mantendo os grupos atuais: {e}")
+            return
+        for group_id in [group_id for group_id in self.groups if group_id not in groups]:
+            self.remove_group(group_id)
+        for group_id in groups:
+            self.add_group(group_id)
+
+    def start(self):
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.client.connect(self.options["broker_address"], self.options["broker_port"], 60)
+
+        self.writer.start()
+        self.central.start()
+        self.liveness.start()
+        self.pool.start()
+        threading.Thread(target=self.run, name="group-host", daemon=True).start()
+        if self.profiling:
+            self.profiling.start()
+        if self.options["stats_interval"] > 0:
+            threading.Thread(target=self.report_stats, daemon=True).start()
+        if self.options["metrics_port"] > 0:
+            MetricsServer(self.metrics, port=self.options["metrics_port"]).start()
+        threading.Thread(target=self.client.loop_forever).start()
+
+    def stop(self):
+        for group_id in list(self.groups):
+            self.remove_group(group_id)
+        self.client.disconnect()
+
+    def on_connect(self, client, userdata, flags, rc):
+        print(f"Conectado ao Broker MQTT endereco {self.options['broker_address']} ({len(self.groups)} grupos)")
+        with self.lock:
+            topics = list(self.topics)
+        client.subscribe([("OTHER_ROOMS", 0)] + [(topic, 0) for topic in topics])
+
+    def on_message(self, client, userdata, message):
+        processor = self.topics.get(message.topic) or self.topics.get(message.topic.split("/", 1)[0])  # Topicos de particao
+        if processor is not None:
+            processor.on_message(client, userdata, message)
+            return
+        if message.topic == "OTHER_ROOMS":
+            # Uma unica decodificacao, e a leitura segue para todos os grupos, como com um processo por grupo
+            received = time.perf_counter()
+            payload = decode_payload(message.payload)
+            self.decode_seconds.observe(time.perf_counter() - received)
+            self.messages_received.inc()
+            for group_id, processor in list(self.groups.items()):
+                processor.dispatch_reading(payload, f"{group_id}_OTHER_ROOMS_ACT")
+
+    def on_room_disconnect(self, key):
+        group_id, room_number = key
+        processor = self.groups.get(group_id)
+        if processor is not None:
+            processor.liveness.expired(room_number)
+
+    def process_sensor_data(self, processor, data, response_topic):
+        processor.process_sensor_data(data, response_topic)
+
+    def process_sensor_batch(self, items):
+        # Um lote do worker pode ter leituras de varios grupos; cada grupo avalia as suas, na ordem de chegada
+        batches = {}
+        for processor, data, response_topic in items:
+            batches.setdefault(processor, []).append((data, response_topic))
+        for processor, batch in batches.items():
+            processor.process_sensor_batch(batch)
+
+    def run(self):
+        # Thread de manutencao de todos os grupos, cada tarefa no proprio intervalo
+        tasks = [[time.monotonic() + interval, interval, task] for interval, task in (
+            (self.poll_interval, self.reload_groups),
+            (self.options["rules_poll"], self.reload_rules),
+            (self.options["snapshot_interval"] if self.options["snapshot_path"] else 0, self.save_snapshots),
+        ) if interval > 0]
+        while tasks:
+            time.sleep(max(min(task[0] for task in tasks) - time.monotonic(), 0))
+            for task in tasks:
+                if time.monotonic() >= task[0]:
+                    task[0] = time.monotonic() + task[1]
+                    try:
+                        task[2]()
+                    except Exception as e:
+                        print(f"Erro na manutencao dos grupos ({task[2].__name__}): {e}")
+
+    def reload_rules(self):
+        for engine in list(self.rule_engines.values()):
+            engine.reload_if_changed()
+
+    def save_snapshots(self):
+        for group_id, processor in list(self.groups.items()):
+            try:
+                processor.snapshot.save()
+            except OSError as e:
+                print(f"Erro ao gravar o snapshot do grupo {group_id}: {e}")
+
+    def stats(self):
+        return {
+            "groups": len(self.groups),
+            "groups_added": self.groups_added,
+            "groups_removed": self.groups_removed,
+            "rule_engines": len(self.rule_engines),
+            "workers": self.pool.stats(),
+            "influx_writer": self.writer.stats(),
+            "central": self.central.stats(),
+            "liveness": self.liveness.stats(),
+            "group_stats": {group_id: processor.stats() for group_id, processor in list(self.groups.items())},
+        }
+
+    def collect(self):
+        # Gauges dos componentes compartilhados e, com o label group, os de cada grupo
+        stats = self.stats()
+        group_stats = stats.pop("group_stats")
+        yield from stats_gauges(stats)
+        for group_id, processor_stats in group_stats.items():
+            for name, help_text, labels, value in stats_gauges(processor_stats):
+                yield f"group_{name}", help_text, {"group": group_id, **labels}, value
+
+    def report_stats(self):
+        while True:
+            time.sleep(self.options["stats_interval"])
+            print(json.dumps(self.stats()))
+
+if __name__ == "__main__":
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    groups_path = config.get('host', 'groups_file', fallback="groups.txt")
+    poll_interval = config.getfloat('host', 'poll_interval', fallback=2.0)
+
+    host = GroupHost(read_config(), groups_path, poll_interval)
+    host.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        host.stop()
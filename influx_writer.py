@@ -0,0 +1,267 @@
+import threading
+import time
+from collections import deque
+from sinks import RejectedWriteError, SinkUnavailableError
+
+DROP_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+class InfluxBatchWriter:
+    def __init__(self, sink, batch_size=500, flush_interval=1.0, max_queue=10000, drop_policy="block", block_timeout=1.0, metrics=None,
+                 spool=None, replay_bytes=1024 * 1024, replay_rate=50000, retry_interval=5.0,
+                 max_attempts=5):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Politica de descarte invalida: {drop_policy}")
+
+        self.sink = sink  # InfluxSink, LineProtocolFileSink ou NullSink (sinks.py)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval  # Latencia maxima (s) de um ponto na fila
+        self.max_queue = max_queue
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout  # Tempo maximo (s) que um produtor espera com a fila cheia
+
+        self.queue = deque()
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.oldest_enqueued = None  # Instante (monotonic) em que o ponto mais antigo entrou na fila
+
+        self.points_written = 0  # Pontos aceitos na fila
+        self.points_flushed = 0  # Pontos enviados com sucesso ao InfluxDB
+        self.points_dropped = 0  # Pontos descartados (fila cheia ou erro de escrita)
+        self.flushes = 0
+        self.flush_errors = 0
+        self.write_seconds = metrics.stage("influx_write") if metrics else None  # Duracao de cada escrita de lote
+
+        # Com um DiskSpool, lotes que falham (e todos os lotes enquanto o InfluxDB esta indisponivel) vao para o disco
+        # e sao reenviados por outra thread em blocos de ate replay_bytes, limitados a replay_rate linhas/s
+        self.spool = spool
+        self.replay_bytes = replay_bytes
+        self.replay_rate = replay_rate
+        self.retry_interval = retry_interval  # Espera (s) entre tentativas de reenvio com o InfluxDB indisponivel
+        # Um bloco do spool que falha max_attempts vezes por um erro que nao e de indisponibilidade vai para a quarentena
+        self.max_attempts = max_attempts
+        self.healthy = True
+        self.points_spooled = 0
+        self.points_rejected = 0  # Pontos recusados pelo destino (descartados ou em quarentena)
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="influx-writer", daemon=True)
+        self.thread.start()
+        if self.spool:
+            threading.Thread(target=self.replay, name="influx-replay", daemon=True).start()
+
+    def stop(self, timeout=5.0):
+        with self.lock:
+            self.running = False
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def write(self, point, timestamp=None):
+        # O timestamp (ns) e fixado na entrada da fila para nao depender do momento do flush
+        point.time(time.time_ns() if timestamp is None else timestamp)
+        with self.lock:
+            if len(self.queue) >= self.max_queue:
+                if self.drop_policy == "drop_newest":
+                    self.points_dropped += 1
+                    return False
+                elif self.drop_policy == "drop_oldest":
+                    self.queue.popleft()
+                    self.points_dropped += 1
+                else:
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self.queue) >= self.max_queue and self.running:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self.not_full.wait(remaining)
+                    if len(self.queue) >= self.max_queue:
+                        self.points_dropped += 1
+                        return False
+
+            if not self.queue:
+                self.oldest_enqueued = time.monotonic()
+            self.queue.append(point)
+            self.points_written += 1
+            if len(self.queue) == 1 or len(self.queue) >= self.batch_size:
+                # Acorda a thread para iniciar a contagem da latencia maxima ou enviar o lote cheio
+                self.not_empty.notify()
+        return True
+
+    def write_many(self, points, timestamp=None):
+        # Pontos de um lote, com o mesmo timestamp e uma unica passagem pelo lock; com a fila sem espaco para todos,
+        # cada ponto segue a politica de descarte como em write()
+        timestamp = time.time_ns() if timestamp is None else timestamp
+        if not points:
+            return 0
+        with self.lock:
+            if len(self.queue) + len(points) <= self.max_queue:
+                for point in points:
+                    point.time(timestamp)
+                if not self.queue:
+                    self.oldest_enqueued = time.monotonic()
+                self.queue.extend(points)
+                self.points_written += len(points)
+                if len(self.queue) == len(points) or len(self.queue) >= self.batch_size:
+                    self.not_empty.notify()
+                return len(points)
+        return sum(self.write(point, timestamp) for point in points)
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.queue and self.running:
+                    self.not_empty.wait()
+                if not self.queue and not self.running:
+                    return
+
+                # Espera completar o lote ou estourar a latencia maxima do ponto mais antigo
+                while len(self.queue) < self.batch_size and self.running:
+                    remaining = self.oldest_enqueued + self.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.not_empty.wait(remaining)
+
+                batch = [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+                self.oldest_enqueued = time.monotonic() if self.queue else None
+                self.not_full.notify_all()
+
+            self.flush(batch)
+
+    def flush(self, batch):
+        if self.spool and not self.healthy:
+            self.spool_batch(batch)  # Nao espera o timeout do InfluxDB enquanto o reenvio nao confirmar a volta
+            return
+
+        start = time.perf_counter()
+        try:
+            self.sink.write(batch)
+            if self.write_seconds:
+                self.write_seconds.observe(time.perf_counter() - start)
+            self.points_flushed += len(batch)
+            self.flushes += 1
+        except RejectedWriteError:
+            # Linhas invalidas no lote nao indicam queda do InfluxDB: as validas sao enviadas e as recusadas separadas.
+            # Se o InfluxDB cair no meio, apenas as linhas ainda nao tratadas vao para o spool
+            self.flush_errors += 1
+            progress = [0, 0]
+            try:
+                self.write_valid([point.to_line_protocol() for point in batch], progress)
+                self.flushes += 1
+            except Exception as e:
+                self.write_failed(batch[progress[0]:], e)
+            self.points_flushed += progress[1]
+        except Exception as e:
+            self.flush_errors += 1
+            self.write_failed(batch, e)
+
+    def write_failed(self, batch, error):
+        if self.spool:
+            self.healthy = False
+            print(f"InfluxDB indisponivel ({error}), gravando os pontos no spool")
+            self.spool_batch(batch)
+        else:
+            self.points_dropped += len(batch)
+            print(f"Erro ao escrever {len(batch)} pontos no InfluxDB: {error}")
+
+    def spool_batch(self, batch):
+        try:
+            self.spool.append([point.to_line_protocol() for point in batch])
+            self.points_spooled += len(batch)
+        except OSError as e:
+            self.points_dropped += len(batch)
+            print(f"Erro ao gravar {len(batch)} pontos no spool: {e}")
+
+    def write_valid(self, lines, progress):
+        # Reenvia as linhas em metades ate isolar as recusadas, que vao para a quarentena do spool (ou sao descartadas).
+        # progress = [linhas tratadas, linhas aceitas]; as metades sao tratadas em ordem, entao quando uma falha de
+        # indisponibilidade interrompe e e propagada, as linhas tratadas sao as primeiras progress[0] de lines
+        try:
+            self.sink.write(lines)
+            progress[0] += len(lines)
+            progress[1] += len(lines)
+            return
+        except SinkUnavailableError:
+            raise
+        except Exception as e:
+            if len(lines) == 1:
+                self.reject(lines, e)
+                progress[0] += 1
+                return
+        middle = len(lines) // 2
+        self.write_valid(lines[:middle], progress)
+        self.write_valid(lines[middle:], progress)
+
+    def reject(self, lines, error):
+        self.points_rejected += len(lines)
+        if self.spool:
+            try:
+                self.spool.quarantine(lines)
+                print(f"InfluxDB recusou {len(lines)} pontos ({error}), gravados na quarentena do spool")
+                return
+            except OSError as e:
+                print(f"Erro ao gravar {len(lines)} pontos na quarentena: {e}")
+        self.points_dropped += len(lines)
+        print(f"InfluxDB recusou {len(lines)} pontos, descartados: {error}")
+
+    def replay(self):
+        failed_cursor = None
+        attempts = 0
+        while self.running:
+            lines, cursor = self.spool.read(self.replay_bytes)
+            if not lines:
+                time.sleep(0.5)
+                continue
+
+            start = time.monotonic()
+            progress = [0, 0]
+            try:
+                try:
+                    self.sink.write(lines)
+                except RejectedWriteError:
+                    self.write_valid(lines, progress)
+                except SinkUnavailableError:
+                    raise
+                except Exception:
+                    # Erro desconhecido: o bloco pode ser o problema, e nao o InfluxDB. Depois de max_attempts
+                    # tentativas, as linhas que continuam falhando sao isoladas e o restante do spool segue
+                    attempts = attempts + 1 if cursor == failed_cursor else 1
+                    failed_cursor = cursor
+                    if attempts < self.max_attempts:
+                        raise
+                    self.write_valid(lines, progress)
+            except Exception as e:
+                if progress[0]:
+                    # Linhas ja gravadas ou em quarentena antes da falha nao sao reenviadas
+                    self.spool.ack(self.spool.prefix(cursor, lines, progress[0]))
+                self.healthy = False
+                print(f"Falha ao reenviar {len(lines)} pontos do spool: {e}")
+                time.sleep(self.retry_interval)
+                continue
+            self.spool.ack(cursor)
+            if not self.healthy:
+                self.healthy = True
+                print(f"InfluxDB disponivel novamente, reenviando {self.spool.depth()} pontos do spool")
+            # Limita a vazao do reenvio para nao competir com o trafego atual
+            time.sleep(max(len(lines) / self.replay_rate - (time.monotonic() - start), 0))
+
+    def stats(self):
+        stats = {
+            "queue_size": len(self.queue),
+            "points_written": self.points_written,
+            "points_flushed": self.points_flushed,
+            "points_dropped": self.points_dropped,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "points_rejected": self.points_rejected,
+        }
+        if self.spool:
+            stats["healthy"] = self.healthy
+            stats["points_spooled"] = self.points_spooled
+            stats["spool"] = self.spool.stats()
+        return stats
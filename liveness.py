@@ -0,0 +1,148 @@
+import heapq
+import itertools
+import threading
+import time
+
+class LivenessTracker:
+    def __init__(self, timeout, on_disconnect):
+        self.timeout = timeout  # Segundos sem leitura ate a sala ser considerada desconectada
+        self.on_disconnect = on_disconnect
+
+        self.deadlines = {}  # Sala conectada -> prazo (monotonic) da proxima leitura
+        self.heap = []  # (prazo, seq, sala), no maximo uma entrada por sala conectada
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+
+        self.connections = 0
+        self.disconnections = 0
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="liveness", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        with self.lock:
+            self.running = False
+            self.wakeup.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def touch(self, room_number):
+        # Registra uma leitura; retorna True se a sala era nova ou estava desconectada
+        deadline = time.monotonic() + self.timeout
+        with self.lock:
+            connected = room_number in self.deadlines
+            self.deadlines[room_number] = deadline  # Apenas empurra o prazo, sem mexer no heap
+            if not connected:
+                heapq.heappush(self.heap, (deadline, next(self.sequence), room_number))
+                self.connections += 1
+                if len(self.heap) == 1:
+                    self.wakeup.notify()
+        return not connected
+
+    def restore(self, room_numbers):
+        # Salas conectadas antes de um reinicio: recebem um prazo novo sem contar como conexoes
+        deadline = time.monotonic() + self.timeout
+        with self.lock:
+            for room_number in room_numbers:
+                if room_number not in self.deadlines:
+                    self.deadlines[room_number] = deadline
+                    self.heap.append((deadline, next(self.sequence), room_number))
+            heapq.heapify(self.heap)
+            self.wakeup.notify()
+
+    def forget(self, room_numbers):
+        # Salas transferidas para outra instancia: deixam de ser acompanhadas, sem desconexao
+        with self.lock:
+            for room_number in room_numbers:
+                self.deadlines.pop(room_number, None)
+            self.heap = [entry for entry in self.heap if entry[2] in self.deadlines]
+            heapq.heapify(self.heap)
+
+    def is_connected(self, room_number):
+        return room_number in self.deadlines
+
+    def connected_rooms(self):
+        with self.lock:
+            return list(self.deadlines)
+
+    def run(self):
+        while True:
+            with self.lock:
+                while not self.heap and self.running:
+                    self.wakeup.wait()
+                if not self.running:
+                    return
+
+                deadline, _, room_number = self.heap[0]
+                now = time.monotonic()
+                if deadline > now:
+                    self.wakeup.wait(deadline - now)
+                    continue
+
+                heapq.heappop(self.heap)
+                current = self.deadlines[room_number]
+                if current > now:
+                    # A sala recebeu leituras depois que a entrada foi criada; reagenda com o prazo atual
+                    heapq.heappush(self.heap, (current, next(self.sequence), room_number))
+                    continue
+
+                del self.deadlines[room_number]
+                self.disconnections += 1
+
+            self.on_disconnect(room_number)
+
+    def stats(self):
+        return {
+            "connected_rooms": len(self.deadlines),
+            "connections": self.connections,
+            "disconnections": self.disconnections,
+        }
+
+class GroupLiveness:
+    # Visao de um grupo sobre um LivenessTracker compartilhado entre os grupos de um GroupHost, que identifica as salas
+    # por (grupo, sala): uma unica thread acompanha os prazos de todos os grupos. Mesma interface do LivenessTracker.
+    def __init__(self, tracker, group_id, on_disconnect):
+        self.tracker = tracker
+        self.group_id = group_id
+        self.on_disconnect = on_disconnect  # Chamado pelo GroupHost com o numero da sala
+
+        self.connections = 0
+        self.disconnections = 0
+
+    def start(self):
+        pass  # A thread e a do LivenessTracker compartilhado
+
+    def touch(self, room_number):
+        connected = self.tracker.touch((self.group_id, room_number))
+        if connected:
+            self.connections += 1
+        return connected
+
+    def restore(self, room_numbers):
+        self.tracker.restore((self.group_id, room_number) for room_number in room_numbers)
+
+    def forget(self, room_numbers):
+        self.tracker.forget([(self.group_id, room_number) for room_number in room_numbers])
+
+    def expired(self, room_number):
+        self.disconnections += 1
+        self.on_disconnect(room_number)
+
+    def is_connected(self, room_number):
+        return self.tracker.is_connected((self.group_id, room_number))
+
+    def connected_rooms(self):
+        return [room_number for group_id, room_number in self.tracker.connected_rooms() if group_id == self.group_id]
+
+    def stats(self):
+        return {
+            "connected_rooms": len(self.connected_rooms()),
+            "connections": self.connections,
+            "disconnections": self.disconnections,
+        }
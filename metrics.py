@@ -0,0 +1,200 @@
+import bisect
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Limites (s) dos buckets dos histogramas: de 50 us a 10 s, em progressao aproximadamente geometrica
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        yield name + "_total" + format_labels(labels), self.value
+
+class RateWindow:
+    # Taxa por segundo de um contador monotono nos ultimos window segundos. Cada leitura registra no maximo uma
+    # amostra por segundo e nao muda a referencia das outras: Prometheus, report_stats e o canal de diagnostico
+    # leem a mesma taxa
+    def __init__(self, window=10.0):
+        self.window = window
+        self.samples = deque()  # (instante, valor), da mais antiga a mais recente
+        self.lock = threading.Lock()
+
+    def rate(self, value):
+        now = time.monotonic()
+        with self.lock:
+            samples = self.samples
+            if not samples or now - samples[-1][0] >= 1.0:
+                samples.append((now, value))
+            # Mantem como referencia a amostra mais recente com pelo menos window segundos
+            while len(samples) > 1 and now - samples[1][0] >= self.window:
+                samples.popleft()
+            start, start_value = samples[0]
+        elapsed = now - start
+        return (value - start_value) / elapsed if elapsed > 0 else 0.0
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Ultima posicao: acima do maior limite
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def samples(self, name, labels):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield name + "_bucket" + format_labels({**labels, "le": repr(bound)}), cumulative
+        cumulative += counts[-1]
+        yield name + "_bucket" + format_labels({**labels, "le": "+Inf"}), cumulative
+        yield name + "_sum" + format_labels(labels), total
+        yield name + "_count" + format_labels(labels), cumulative
+
+class MetricsRegistry:
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.families = {}  # Nome -> (tipo, descricao, {labels: metrica})
+        self.collectors = []  # Funcoes chamadas a cada coleta, para gauges lidos de stats()
+        self.lock = threading.Lock()
+
+    def register(self, name, kind, help_text, labels, factory):
+        name = f"{self.prefix}_{name}"
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            family = self.families.setdefault(name, (kind, help_text, {}))
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory()
+        return metric
+
+    def counter(self, name, help_text, **labels):
+        return self.register(name, "counter", help_text, labels, Counter)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS, **labels):
+        return self.register(name, "histogram", help_text, labels, lambda: Histogram(buckets))
+
+    def stage(self, stage):
+        # Histograma de uma etapa do processamento, todos na mesma familia stage_seconds
+        return self.histogram("stage_seconds", "Duracao de cada etapa do processamento (s)", stage=stage)
+
+    def add_collector(self, collector):
+        # collector() retorna tuplas (nome, descricao, labels, valor), exportadas como gauges
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            families = [(name, kind, help_text, list(metrics.items())) for name, (kind, help_text, metrics) in self.families.items()]
+        for name, kind, help_text, metrics in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in metrics:
+                for sample, value in metric.samples(name, dict(key)):
+                    lines.append(f"{sample} {value}")
+
+        gauges = {}
+        for collector in self.collectors:
+            for name, help_text, labels, value in collector():
+                gauges.setdefault(f"{self.prefix}_{name}", (help_text, []))[1].append((labels, value))
+        for name, (help_text, samples) in gauges.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+def stats_gauges(stats):
+    # Converte o dicionario de stats() em gauges: chaves aninhadas viram o nome e listas viram o label shard
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            for sample in stats_gauges(value):
+                yield (f"{name}_{sample[0]}",) + sample[1:]
+        elif isinstance(value, list):
+            for shard, item in enumerate(value):
+                for sample_name, help_text, labels, sample in stats_gauges(item):
+                    yield f"{name}_{sample_name}", help_text, {"shard": shard, **labels}, sample
+        elif isinstance(value, (bool, int, float)):
+            yield name, name.replace("_", " "), {}, float(value)
+
+class MetricsServer:
+    # Endpoint HTTP local que exporta o registro no formato texto do Prometheus em /metrics
+    def __init__(self, registry, host="127.0.0.1", port=9100):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True).start()
+        print(f"Metricas disponiveis em http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+
+class RateLimitedLog:
+    # Substitui os prints por mensagem: opcional e limitado a max_per_second linhas por segundo
+    def __init__(self, enabled=True, max_per_second=10):
+        self.enabled = enabled
+        self.max_per_second = max_per_second
+        self.window = 0
+        self.count = 0
+        self.suppressed = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, message):
+        if not self.enabled:
+            return
+        now = int(time.monotonic())
+        with self.lock:
+            if now != self.window:
+                if self.suppressed:
+                    print(f"... {self.suppressed} mensagens suprimidas")
+                self.window = now
+                self.count = 0
+                self.suppressed = 0
+            if self.count >= self.max_per_second:
+                self.suppressed += 1
+                return
+            self.count += 1
+        print(message)
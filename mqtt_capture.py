@@ -0,0 +1,102 @@
+import bisect
+import os
+import struct
+import threading
+import time
+
+# Captura: cabecalho MAGIC seguido de registros (recebido em ns, tamanho do topico, tamanho do payload) + topico + payload.
+# O indice <arquivo>.idx guarda pares (recebido em ns, posicao no arquivo) a cada index_interval segundos de captura.
+MAGIC = b"MQTTCAP1"
+RECORD = struct.Struct(">qHI")
+INDEX_ENTRY = struct.Struct(">qQ")
+
+class CaptureWriter:
+    def __init__(self, path, buffer_size=1024 * 1024, flush_interval=1.0, index_interval=1.0):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab", buffering=buffer_size)  # Escritas acumuladas em memoria e gravadas em blocos
+        self.index = open(path + ".idx", "ab")
+        if new:
+            self.file.write(MAGIC)
+        self.flush_interval = flush_interval
+        self.index_interval = int(index_interval * 1_000_000_000)
+        self.next_index = 0
+        self.lock = threading.Lock()
+        self.running = True
+
+        self.messages = 0
+        self.bytes = 0
+
+    def start(self):
+        threading.Thread(target=self.run, name="capture-flush", daemon=True).start()
+
+    def write(self, topic, payload, received_ns=None):
+        received_ns = time.time_ns() if received_ns is None else received_ns
+        encoded_topic = topic.encode()
+        with self.lock:
+            if received_ns >= self.next_index:
+                self.index.write(INDEX_ENTRY.pack(received_ns, self.file.tell()))
+                self.next_index = received_ns + self.index_interval
+            self.file.write(RECORD.pack(received_ns, len(encoded_topic), len(payload)))
+            self.file.write(encoded_topic)
+            self.file.write(payload)
+            self.messages += 1
+            self.bytes += RECORD.size + len(encoded_topic) + len(payload)
+
+    def run(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+            self.index.flush()
+
+    def close(self):
+        self.running = False
+        with self.lock:
+            self.file.close()
+            self.index.close()
+
+class CaptureReader:
+    def __init__(self, path):
+        self.path = path
+        self.index = []  # [(recebido em ns, posicao)]
+        if os.path.exists(path + ".idx"):
+            with open(path + ".idx", "rb") as file:
+                data = file.read()
+            self.index = [INDEX_ENTRY.unpack_from(data, offset) for offset in range(0, len(data) - INDEX_ENTRY.size + 1, INDEX_ENTRY.size)]
+
+    def first_timestamp(self):
+        if self.index:
+            return self.index[0][0]
+        for received_ns, _, _ in self.records():
+            return received_ns
+        return None
+
+    def offset_for(self, start_ns):
+        # Posicao do ultimo ponto do indice anterior a start_ns, para nao ler a captura desde o inicio
+        i = bisect.bisect_right(self.index, (start_ns, float("inf"))) - 1
+        return self.index[i][1] if i >= 0 else len(MAGIC)
+
+    def records(self, start_ns=None, end_ns=None):
+        # Gera (recebido em ns, topico, payload) em ordem de gravacao
+        with open(self.path, "rb", buffering=1024 * 1024) as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} nao e um arquivo de captura")
+            if start_ns is not None:
+                file.seek(self.offset_for(start_ns))
+            while True:
+                header = file.read(RECORD.size)
+                if len(header) < RECORD.size:
+                    return  # Fim do arquivo (ou registro incompleto de uma captura interrompida)
+                received_ns, topic_length, payload_length = RECORD.unpack(header)
+                topic = file.read(topic_length)
+                payload = file.read(payload_length)
+                if len(payload) < payload_length:
+                    return
+                if start_ns is not None and received_ns < start_ns:
+                    continue
+                if end_ns is not None and received_ns > end_ns:
+                    return
+                yield received_ns, topic.decode(), payload
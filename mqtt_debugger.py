@@ -1,31 +1,125 @@
+import argparse
 import paho.mqtt.client as mqtt
 import datetime
+import threading
+import time
+from mqtt_capture import CaptureReader, CaptureWriter
+from profiling import ProfilingControl
+from telemetry_codec import decode_room_data, is_binary
 
 class MQTTDebugger:
-    def __init__(self, broker_address, broker_port):
+    def __init__(self, broker_address, broker_port, topics=("#",), capture=None, report_interval=5.0, profiling_dir=None):
         self.broker_address = broker_address
         self.broker_port = broker_port
+        self.topics = topics
+        self.capture = capture  # CaptureWriter: grava as mensagens em vez de imprimi-las
+        self.report_interval = report_interval
         self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
+        self.received = 0
+        self.published = 0
+        self.profiling = ProfilingControl("debugger", self.status, profiling_dir) if profiling_dir else None
+
+    def status(self):
+        status = {"topics": list(self.topics), "received": self.received, "published": self.published}
+        if self.capture:
+            status["captured"] = self.capture.messages
+            status["captured_bytes"] = self.capture.bytes
+        return status
 
     def start(self):
+        if self.profiling:
+            self.profiling.start()
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.connect(self.broker_address, self.broker_port, 60)
-        self.client.loop_forever()
+        if self.capture:
+            self.capture.start()
+            threading.Thread(target=self.report, name="capture-report", daemon=True).start()
+        try:
+            self.client.loop_forever()
+        finally:
+            if self.capture:
+                self.capture.close()
 
     def on_connect(self, client, userdata, flags, rc):
         print("Connected to MQTT Broker with result code", rc)
-        client.subscribe("#")  # Subscribe to all topics on connect
+        for topic in self.topics:
+            client.subscribe(topic)  # Subscribe to the configured topics (all by default) on connect
 
     def on_message(self, client, userdata, message):
+        self.received += 1
+        if self.capture:
+            self.capture.write(message.topic, message.payload)
+            return
         topic = message.topic
-        payload = message.payload.decode("utf-8")
+        if is_binary(message.payload):
+            payload = decode_room_data(message.payload)
+        else:
+            payload = message.payload.decode("utf-8")
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         print(f"[{timestamp}]:[{topic}]:[{payload}]")
 
+    def report(self):
+        messages = 0
+        while True:
+            time.sleep(self.report_interval)
+            rate = (self.capture.messages - messages) / self.report_interval
+            messages = self.capture.messages
+            print(f"{datetime.datetime.now():%Y-%m-%d %H:%M:%S}: {messages} mensagens capturadas ({rate:.0f}/s), {self.capture.bytes / 1e6:.1f} MB")
+
+    def replay(self, path, speed=1.0, skip=0.0, duration=None):
+        # Republica a captura mantendo os intervalos originais divididos por speed (0 = velocidade maxima)
+        reader = CaptureReader(path)
+        first = reader.first_timestamp()
+        if first is None:
+            print("Captura vazia")
+            return
+        start_ns = first + int(skip * 1e9)
+        end_ns = start_ns + int(duration * 1e9) if duration is not None else None
+
+        if self.profiling:
+            self.profiling.start()
+        self.client.connect(self.broker_address, self.broker_port, 60)
+        self.client.loop_start()
+        started = time.perf_counter()
+        base = None
+        info = None
+        for received_ns, topic, payload in reader.records(start_ns, end_ns):
+            if not any(mqtt.topic_matches_sub(pattern, topic) for pattern in self.topics):
+                continue
+            if speed > 0:
+                if base is None:
+                    base = received_ns
+                delay = started + (received_ns - base) / 1e9 / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            info = self.client.publish(topic, payload)
+            self.published += 1
+        if info:
+            info.wait_for_publish(timeout=10)  # Aguarda a fila de saida antes de desconectar
+        elapsed = time.perf_counter() - started
+        self.client.loop_stop()
+        self.client.disconnect()
+        print(f"{self.published} mensagens republicadas em {elapsed:.1f}s ({self.published / max(elapsed, 1e-9):.0f}/s)")
+
 if __name__ == "__main__":
-    broker_address = "192.168.1.66"  # Change to your broker's address
-    broker_port = 1883  # Change to your broker's port
+    parser = argparse.ArgumentParser(description="Exibe, captura ou republica mensagens MQTT")
+    parser.add_argument("--broker", default="192.168.1.66")  # Change to your broker's address
+    parser.add_argument("--port", type=int, default=1883)  # Change to your broker's port
+    parser.add_argument("--topic", action="append", help="Filtro de topicos MQTT (pode ser repetido, padrao #)")
+    parser.add_argument("--capture", metavar="ARQUIVO", help="Grava as mensagens em um arquivo de captura em vez de imprimi-las")
+    parser.add_argument("--replay", metavar="ARQUIVO", help="Republica um arquivo de captura no broker")
+    parser.add_argument("--speed", default="1", help="Velocidade do replay: 1, N vezes ou max")
+    parser.add_argument("--skip", type=float, default=0.0, help="Segundos do inicio da captura a pular no replay")
+    parser.add_argument("--duration", type=float, help="Segundos da captura a republicar")
+    parser.add_argument("--profiling-dir", default="", help="Diretorio do canal de diagnostico (ex.: profiling; vazio desativa)")
+    args = parser.parse_args()
 
-    debugger = MQTTDebugger(broker_address, broker_port)
-    debugger.start()
+    topics = args.topic or ["#"]
+    if args.replay:
+        speed = 0.0 if args.speed == "max" else float(args.speed)
+        MQTTDebugger(args.broker, args.port, topics, profiling_dir=args.profiling_dir or None).replay(args.replay, speed, args.skip, args.duration)
+    else:
+        capture = CaptureWriter(args.capture) if args.capture else None
+        debugger = MQTTDebugger(args.broker, args.port, topics, capture, profiling_dir=args.profiling_dir or None)
+        debugger.start()
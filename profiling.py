@@ -0,0 +1,281 @@
+import argparse
+import collections
+import datetime
+import glob
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+
+# Canal de controle local para diagnosticar um componente em execucao sem reinicia-lo: pilhas das threads,
+# estado das threads e das filas e perfis por amostragem gravados em pilhas dobradas (formato "folded" do
+# flamegraph.pl, aceito tambem pelo speedscope). Com o perfil desligado, o custo e uma thread bloqueada no accept.
+
+COMMANDS = "status | stacks | profile <segundos> [hz] [cpu|wall] | stop"
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def thread_state(native_id):
+    # Estado do escalonador (R executando, S aguardando, D em E/S) e tempo de CPU da thread, lidos de /proc (Linux)
+    try:
+        with open(f"/proc/self/task/{native_id}/stat") as file:
+            fields = file.read().rsplit(")", 1)[1].split()
+    except (OSError, TypeError):
+        return None, None
+    return fields[0], (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+class SamplingProfiler:
+    # Amostra as pilhas das threads (exceto as do proprio canal) a cada 1/hz segundos e conta as pilhas dobradas
+    # "thread;funcao externa;...;funcao interna". No modo cpu entram apenas as threads em execucao no instante da
+    # amostra (estado R no Linux), sem as esperas em filas e sockets; no modo wall entram todas.
+    # O custo existe apenas enquanto o perfil esta ativo.
+    def __init__(self, hz=100, mode="cpu", exclude=frozenset()):
+        if mode not in ("cpu", "wall"):
+            raise ValueError(f"Modo invalido: {mode} (use cpu ou wall)")
+        self.interval = 1.0 / hz
+        self.mode = mode
+        self.exclude = exclude  # Conjunto mantido pelo canal, atualizado enquanto o perfil esta ativo
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+
+    def running(self, files, native_id):
+        # Le o estado da thread com pread em um descritor mantido aberto durante o perfil
+        fd = files.get(native_id)
+        if fd is None:
+            try:
+                fd = files[native_id] = os.open(f"/proc/self/task/{native_id}/stat", os.O_RDONLY)
+            except (OSError, TypeError):
+                return True  # Sem /proc: a thread entra na amostra
+        try:
+            return os.pread(fd, 512, 0).rsplit(b")", 1)[1][1:2] == b"R"
+        except OSError:
+            return False  # Thread encerrada
+
+    def run(self, duration):
+        names = {}
+        native_ids = {}
+        files = {}
+        deadline = time.monotonic() + duration
+        next_sample = time.monotonic()
+        try:
+            while not self.stopped.is_set() and next_sample < deadline:
+                self.sample(names, native_ids, files)
+                next_sample += self.interval
+                self.stopped.wait(max(next_sample - time.monotonic(), 0))
+        finally:
+            for fd in files.values():
+                os.close(fd)
+
+    def sample(self, names, native_ids, files):
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own or ident in self.exclude:
+                continue
+            name = names.get(ident)
+            if name is None:
+                for thread in threading.enumerate():
+                    names[thread.ident] = thread.name.replace(";", "_").replace(" ", "_")
+                    native_ids[thread.ident] = thread.native_id
+                name = names.setdefault(ident, str(ident))
+            if self.mode == "cpu" and not self.running(files, native_ids.get(ident)):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            stack.append(name)
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def stop(self):
+        self.stopped.set()
+
+    def write(self, path):
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+    def top(self, limit=10):
+        # Funcoes com mais amostras no topo da pilha (tempo proprio)
+        leaves = collections.Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [f"{count / total:6.1%}  {leaf}" for leaf, count in leaves.most_common(limit)]
+
+class ProfilingControl:
+    # Socket Unix em {directory}/{name}-{pid}.sock, acessivel apenas pelo usuario do processo. Cada conexao envia
+    # um comando em uma linha e recebe a resposta em texto; status() do componente informa filas e contadores.
+    def __init__(self, name, status=None, directory="profiling", hz=100):
+        self.name = name
+        self.status_source = status
+        self.directory = directory
+        self.hz = hz
+        self.path = os.path.join(directory, f"{name}-{os.getpid()}.sock")
+        self.started = time.time()
+        self.server = None
+        self.profiler = None
+        self.lock = threading.Lock()
+        self.threads = set()  # Threads do canal, fora das amostras
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Socket deixado por um processo anterior com o mesmo PID
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.server.listen()
+        threading.Thread(target=self.accept, name="profiling-control", daemon=True).start()
+        print(f"Canal de diagnostico em {self.path}")
+
+    def stop(self):
+        if self.profiler:
+            self.profiler.stop()
+        if self.server:
+            self.server.close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def accept(self):
+        self.threads.add(threading.get_ident())
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return
+            # Uma thread por conexao: um perfil em andamento nao bloqueia status, stacks ou stop
+            threading.Thread(target=self.serve, args=(connection,), name="profiling-command", daemon=True).start()
+
+    def serve(self, connection):
+        ident = threading.get_ident()
+        self.threads.add(ident)
+        try:
+            with connection, connection.makefile("rwb") as stream:
+                command = stream.readline().decode().split()
+                try:
+                    response = self.handle(command)
+                except Exception as e:
+                    response = f"Erro: {e}"
+                stream.write(response.encode() + b"\n")
+        except OSError:
+            pass
+        finally:
+            self.threads.discard(ident)
+
+    def handle(self, command):
+        if not command:
+            return f"Comandos: {COMMANDS}"
+        if command[0] == "status":
+            return json.dumps(self.status(), indent=2, default=str)
+        if command[0] == "stacks":
+            return self.stacks()
+        if command[0] == "profile":
+            return self.profile(float(command[1]) if len(command) > 1 else 10.0, int(command[2]) if len(command) > 2 else self.hz,
+                                command[3] if len(command) > 3 else "cpu")
+        if command[0] == "stop":
+            profiler = self.profiler
+            if profiler is None:
+                return "Nenhum perfil em andamento"
+            profiler.stop()
+            return "Perfil interrompido"
+        return f"Comando desconhecido: {command[0]} ({COMMANDS})"
+
+    def status(self):
+        frames = sys._current_frames()
+        threads = []
+        for thread in threading.enumerate():
+            state, cpu = thread_state(thread.native_id)
+            frame = frames.get(thread.ident)
+            threads.append({
+                "name": thread.name,
+                "daemon": thread.daemon,
+                "state": state,
+                "cpu_seconds": cpu,
+                "frame": frame_label(frame) if frame else None,
+            })
+        status = {
+            "component": self.name,
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "profiling": self.profiler is not None,
+            "threads": threads,
+        }
+        if self.status_source:
+            status["component_status"] = self.status_source()
+        return status
+
+    def stacks(self):
+        frames = sys._current_frames()
+        lines = []
+        for thread in threading.enumerate():
+            frame = frames.get(thread.ident)
+            state, cpu = thread_state(thread.native_id)
+            lines.append(f"Thread {thread.name} (daemon={thread.daemon}, estado={state}, cpu={cpu}s)")
+            if frame is not None:
+                lines.extend(line.rstrip("\n") for line in traceback.format_stack(frame))
+            lines.append("")
+        return "\n".join(lines)
+
+    def profile(self, seconds, hz, mode):
+        with self.lock:
+            if self.profiler is not None:
+                return "Ja existe um perfil em andamento (use stop)"
+            self.profiler = profiler = SamplingProfiler(hz, mode, self.threads)
+        try:
+            start = time.monotonic()
+            profiler.run(seconds)
+            elapsed = time.monotonic() - start
+        finally:
+            self.profiler = None
+        path = os.path.join(self.directory, f"{self.name}-{os.getpid()}-{datetime.datetime.now():%Y%m%d-%H%M%S}-{mode}.folded")
+        profiler.write(path)
+        return "\n".join([f"Perfil {mode} de {elapsed:.1f}s gravado em {path} ({profiler.samples} amostras a {hz} Hz)",
+                          "Funcoes com mais amostras:", *profiler.top()])
+
+def find_socket(target, directory):
+    if os.path.exists(target):
+        return target
+    matches = sorted(glob.glob(os.path.join(directory, f"{target}*.sock")))
+    if len(matches) != 1:
+        available = ", ".join(os.path.basename(path) for path in glob.glob(os.path.join(directory, "*.sock"))) or "nenhum"
+        raise SystemExit(f"{'Varios' if matches else 'Nenhum'} canal para '{target}' em {directory} (disponiveis: {available})")
+    return matches[0]
+
+def send_command(path, command):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path)
+        connection.sendall(" ".join(command).encode() + b"\n")
+        chunks = []
+        while True:
+            chunk = connection.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b"".join(chunks).decode()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Envia comandos de diagnostico a um componente em execucao",
+                                     epilog=f"Comandos: {COMMANDS}")
+    parser.add_argument("--dir", default="profiling", help="Diretorio dos sockets de controle")
+    parser.add_argument("target", nargs="?", help="Socket ou prefixo do nome (ex.: processor-1, central-1, simulator-101)")
+    parser.add_argument("command", nargs="*", default=["status"])
+    args = parser.parse_args()
+
+    if not args.target:
+        for path in sorted(glob.glob(os.path.join(args.dir, "*.sock"))):
+            print(os.path.basename(path))
+        sys.exit(0)
+    try:
+        print(send_command(find_socket(args.target, args.dir), args.command), end="")
+    except (ConnectionRefusedError, FileNotFoundError):
+        print(f"O componente de {args.target} nao esta em execucao")
+        sys.exit(1)
@@ -0,0 +1,162 @@
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class ReadSnapshot:
+    # Uma versao do estado, nunca alterada depois de publicada. Cada resposta e montada na primeira
+    # consulta ao seu caminho e reaproveitada por todas as consultas seguintes da mesma versao.
+    def __init__(self, version, alarm, energy, rooms, connected, epoch):
+        self.version = version
+        self.etag = f'"{epoch}-{version}"'
+        self.alarm = alarm
+        self.energy = energy
+        self.rooms = rooms  # Numero da sala -> JSON da sala
+        self.connected = connected
+        self.responses = {}  # Caminho -> corpo JSON
+        self.lock = threading.Lock()
+
+    def body(self, path):
+        body = self.responses.get(path)
+        if body is None:
+            with self.lock:
+                body = self.responses.get(path)
+                if body is None:
+                    body = self.build(path)
+                    if body is not None:
+                        self.responses[path] = body
+        return body
+
+    def build(self, path):
+        header = f'{{"version": {self.version}, "alarm": {json.dumps(self.alarm)}, '
+        if path == "/rooms":
+            return (header + '"rooms": [' + ", ".join(self.rooms.values()) + "]}").encode()
+        if path == "/rooms/connected":
+            return (header + '"rooms": [' + ", ".join(self.rooms[room] for room in self.connected) + "]}").encode()
+        if path == "/energy":
+            return json.dumps({"version": self.version, **self.energy}).encode()
+        if path == "/alarm":
+            return json.dumps({"version": self.version, "alarm": self.alarm, "connected_rooms": len(self.connected)}).encode()
+        if path.startswith("/rooms/"):
+            try:
+                room = self.rooms.get(int(path[len("/rooms/"):]))
+            except ValueError:
+                return None
+            return room.encode() if room is not None else None
+        return None
+
+class ReadApi:
+    # Endpoint HTTP/JSON somente leitura com o estado atual das salas, servido a partir de um cache versionado.
+    # O cache e reconstruido sob demanda, no maximo a cada refresh_interval segundos e apenas se alguma sala
+    # foi marcada como alterada ou o alarme mudou; cada sala alterada e recodificada, as demais reaproveitadas.
+    # As respostas levam a versao como ETag, e If-None-Match com a versao atual recebe 304 sem corpo. A versao
+    # recomeca em 1 a cada processo, entao o ETag inclui um identificador aleatorio do processo: depois de um
+    # reinicio, um ETag antigo nunca coincide com a nova versao de mesmo numero.
+    def __init__(self, rooms, get_alarm, host="127.0.0.1", port=9103, refresh_interval=0.5):
+        self.rooms = rooms
+        self.get_alarm = get_alarm
+        self.host = host
+        self.port = port
+        self.refresh_interval = refresh_interval
+        self.dirty = rooms.track_dirty()
+
+        self.fragments = {}  # Numero da sala -> JSON da sala na versao atual
+        self.connected = set()
+        self.alarm = None
+        self.version = 0
+        self.epoch = secrets.token_hex(4)
+        self.snapshot = None
+        self.checked = 0.0
+        self.rebuild_lock = threading.Lock()
+        self.server = None
+
+        self.requests = 0
+        self.not_modified = 0
+        self.rebuilds = 0
+
+    def current(self):
+        # Snapshot mais recente; verifica mudancas se o intervalo passou e nenhuma outra thread ja o faz
+        now = time.monotonic()
+        if (self.snapshot is None or now - self.checked >= self.refresh_interval) and self.rebuild_lock.acquire(blocking=self.snapshot is None):
+            try:
+                self.checked = now
+                self.refresh()
+            finally:
+                self.rebuild_lock.release()
+        return self.snapshot
+
+    def refresh(self):
+        rooms = self.rooms
+        rows = self.dirty.drain()
+        if self.snapshot is None:
+            rows = range(len(rooms))  # Primeira versao: todas as salas, incluindo as restauradas de um snapshot
+        alarm = self.get_alarm()
+        if self.snapshot is not None and not rows and alarm == self.alarm:
+            return
+        for row in rows:
+            record = rooms.record(row)
+            room_number = record["room_number"]
+            self.fragments[room_number] = json.dumps(record)
+            if record["connected"]:
+                self.connected.add(room_number)
+            else:
+                self.connected.discard(room_number)
+        self.alarm = alarm
+        self.version += 1
+
+        energy = {
+            "rooms": len(rooms),
+            "ac_cost": sum(rooms.ac_cost),
+            "hc_cost": sum(rooms.hc_cost),
+            "ac_power_consumption": sum(rooms.ac_power_consumption),
+            "hc_power_consumption": sum(rooms.hc_power_consumption),
+        }
+        energy["total_cost"] = energy["ac_cost"] + energy["hc_cost"]
+        self.snapshot = ReadSnapshot(self.version, alarm, energy, dict(self.fragments), frozenset(self.connected), self.epoch)
+        self.rebuilds += 1
+
+    def start(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Conexoes persistentes para quem consulta em intervalos curtos
+
+            def do_GET(self):
+                api.requests += 1
+                snapshot = api.current()
+                body = snapshot.body(self.path.split("?", 1)[0].rstrip("/"))
+                if body is None:
+                    self.send_error(404)
+                    return
+                if self.headers.get("If-None-Match") == snapshot.etag:
+                    api.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", snapshot.etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", snapshot.etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="read-api", daemon=True).start()
+        print(f"Estado das salas disponivel em http://{self.host}:{self.port}/rooms")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "rebuilds": self.rebuilds,
+        }
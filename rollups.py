@@ -0,0 +1,134 @@
+import threading
+
+def window_label(size):
+    # Sufixo da medida de cada janela: 60 -> "1m", 3600 -> "1h"
+    if size % 3600 == 0:
+        return f"{size // 3600}h"
+    if size % 60 == 0:
+        return f"{size // 60}m"
+    return f"{size}s"
+
+class Window:
+    __slots__ = ("start", "size", "count", "temperature_min", "temperature_max", "temperature_sum", "temperature_last",
+                 "humidity_min", "humidity_max", "humidity_sum", "humidity_last", "last_timestamp",
+                 "ac_seconds", "hc_seconds", "ac_energy", "hc_energy", "intrusions")
+
+    def __init__(self, start, size):
+        self.start = start
+        self.size = size
+        self.count = 0
+        self.temperature_min = self.humidity_min = float("inf")
+        self.temperature_max = self.humidity_max = float("-inf")
+        self.temperature_sum = self.humidity_sum = 0.0
+        self.temperature_last = self.humidity_last = None
+        self.last_timestamp = float("-inf")
+        self.ac_seconds = self.hc_seconds = 0.0  # Tempo com o atuador ligado, dos mesmos intervalos da energia
+        self.ac_energy = self.hc_energy = 0.0  # Consumo (Wh) acumulado na janela
+        self.intrusions = 0
+
+    def add(self, timestamp, temperature, humidity, intrusion, ac_energy, hc_energy, ac_seconds, hc_seconds):
+        self.count += 1
+        self.temperature_min = min(self.temperature_min, temperature)
+        self.temperature_max = max(self.temperature_max, temperature)
+        self.temperature_sum += temperature
+        self.humidity_min = min(self.humidity_min, humidity)
+        self.humidity_max = max(self.humidity_max, humidity)
+        self.humidity_sum += humidity
+        if timestamp >= self.last_timestamp:  # Leituras fora de ordem nao substituem o ultimo valor
+            self.last_timestamp = timestamp
+            self.temperature_last = temperature
+            self.humidity_last = humidity
+        self.ac_seconds += ac_seconds
+        self.hc_seconds += hc_seconds
+        self.ac_energy += ac_energy
+        self.hc_energy += hc_energy
+        self.intrusions += bool(intrusion)
+
+    def fields(self):
+        return {
+            "count": self.count,
+            "temperature_min": float(self.temperature_min),
+            "temperature_max": float(self.temperature_max),
+            "temperature_mean": float(self.temperature_sum / self.count),
+            "temperature_last": float(self.temperature_last),
+            "humidity_min": float(self.humidity_min),
+            "humidity_max": float(self.humidity_max),
+            "humidity_mean": float(self.humidity_sum / self.count),
+            "humidity_last": float(self.humidity_last),
+            # O intervalo ate a primeira leitura da janela pode comecar na janela anterior
+            "ac_duty_cycle": min(self.ac_seconds / self.size, 1.0),
+            "hc_duty_cycle": min(self.hc_seconds / self.size, 1.0),
+            "ac_energy": float(self.ac_energy),
+            "hc_energy": float(self.hc_energy),
+            "intrusions": self.intrusions,
+        }
+
+class RollupAggregator:
+    # Janelas fixas (tumbling) por sala, atualizadas em O(1) por leitura e fechadas pelo tempo das leituras:
+    # a janela de uma sala fecha quando a sala envia uma leitura allowed_lateness segundos depois do seu fim.
+    # Leituras atrasadas entram na janela certa enquanto ela estiver aberta e sao descartadas depois.
+    def __init__(self, windows=(60, 3600), allowed_lateness=60, on_close=None):
+        self.windows = tuple(windows)  # Tamanhos (s) das janelas
+        self.allowed_lateness = allowed_lateness
+        self.on_close = on_close  # Chamado como on_close(sala, tamanho, janela) fora do lock
+
+        self.open = {}  # Sala -> uma lista de {inicio: Window} por tamanho de janela
+        self.watermarks = {}  # Sala -> maior timestamp recebido menos allowed_lateness
+        self.lock = threading.Lock()
+
+        self.readings = 0
+        self.late_readings = 0
+        self.windows_closed = 0
+
+    def add(self, room, timestamp, temperature, humidity, intrusion, ac_energy=0.0, hc_energy=0.0, ac_seconds=0.0, hc_seconds=0.0):
+        # ac_seconds/hc_seconds: tempo com o atuador ligado no intervalo desde a leitura anterior da sala
+        closed = []
+        with self.lock:
+            self.readings += 1
+            room_windows = self.open.get(room)
+            if room_windows is None:
+                room_windows = self.open[room] = [{} for _ in self.windows]
+            watermark = self.watermarks.get(room, float("-inf"))
+
+            late = False
+            for size, open_windows in zip(self.windows, room_windows):
+                start = timestamp - timestamp % size
+                if start + size <= watermark:
+                    late = True  # A janela desta leitura ja foi fechada
+                    continue
+                window = open_windows.get(start)
+                if window is None:
+                    window = open_windows[start] = Window(start, size)
+                window.add(timestamp, temperature, humidity, intrusion, ac_energy, hc_energy, ac_seconds, hc_seconds)
+            if late:
+                self.late_readings += 1
+
+            if timestamp - self.allowed_lateness > watermark:
+                watermark = self.watermarks[room] = timestamp - self.allowed_lateness
+                for size, open_windows in zip(self.windows, room_windows):
+                    for start in [start for start in open_windows if start + size <= watermark]:
+                        closed.append((size, open_windows.pop(start)))
+            self.windows_closed += len(closed)
+
+        for size, window in closed:
+            self.on_close(room, size, window)
+
+    def close_room(self, room):
+        # Fecha todas as janelas abertas da sala, por exemplo quando ela se desconecta
+        with self.lock:
+            room_windows = self.open.pop(room, [])
+            self.watermarks.pop(room, None)
+            closed = [(size, window) for size, open_windows in zip(self.windows, room_windows)
+                      for window in sorted(open_windows.values(), key=lambda window: window.start)]
+            self.windows_closed += len(closed)
+
+        for size, window in closed:
+            self.on_close(room, size, window)
+
+    def stats(self):
+        return {
+            "readings": self.readings,
+            "late_readings": self.late_readings,
+            "windows_closed": self.windows_closed,
+            "rooms": len(self.open),
+        }
@@ -0,0 +1,186 @@
+import argparse
+import datetime
+import json
+import threading
+import time
+
+import numpy as np
+import paho.mqtt.client as mqtt
+
+from room_simulator import AC_STEP, TEMPERATURE_DRIFT, HC_STEP, HUMIDITY_DRIFT
+from cluster import partition_of
+from telemetry_codec import encode_room_data
+
+# Direcao dos atuadores por sala: 0 desligado, -1 DOWN, +1 UP
+DIRECTIONS = {"DOWN": -1, "UP": 1, "OFF": 0}
+
+class RoomFleet:
+    def __init__(self, broker_address, broker_port, group_id, room_ids, temp_time, mov_time, spread=0.0, jitter=0.1,
+                 fahrenheit_ratio=0.0, intrusion_ratio=1.0, binary=False, connections=1, report_interval=10, seed=None, partitions=0):
+        self.broker_address = broker_address
+        self.broker_port = broker_port
+        self.group_id = group_id
+        self.room_ids = list(room_ids)
+        self.index = {room_id: i for i, room_id in enumerate(self.room_ids)}  # Numero da sala -> posicao nos arrays
+        self.jitter = jitter  # Variacao relativa do intervalo entre leituras a cada publicacao
+        self.binary = binary
+        self.report_interval = report_interval
+        self.rng = np.random.default_rng(seed)
+        # Topico de cada sala: o da sua particao quando os processadores estao em cluster
+        self.topics = [f"{group_id}_ROOM_DATA/{partition_of(room_id, partitions)}" if partitions else f"{group_id}_ROOM_DATA" for room_id in self.room_ids]
+
+        count = len(self.room_ids)
+        # Intervalos por sala: temp_time e mov_time variam em +-spread entre as salas
+        self.temp_time = temp_time * self.rng.uniform(1 - spread, 1 + spread, count)
+        self.mov_time = mov_time * self.rng.uniform(1 - spread, 1 + spread, count)
+        self.intrusion = self.rng.random(count) < intrusion_ratio  # Salas que simulam intrusao
+        self.sensor_type = np.where(self.rng.random(count) < fahrenheit_ratio, 2, 1).astype(np.int8)
+
+        self.temperatura = self.rng.uniform(20, 25, count)
+        self.umidade = self.rng.uniform(40, 60, count)
+        self.movimento = np.zeros(count, dtype=np.int8)
+        self.ac_direction = np.zeros(count, dtype=np.int8)
+        self.hc_direction = np.zeros(count, dtype=np.int8)
+        self.alarm_armed = np.ones(count, dtype=bool)  # Alarme de movimento de cada sala
+
+        self.clients = [mqtt.Client(mqtt.CallbackAPIVersion.VERSION1) for _ in range(connections)]
+        self.published = 0
+        self.commands = 0
+        self.broadcasts = 0
+
+    def start(self):
+        # Apenas a primeira conexao recebe os comandos, para nao processa-los em duplicidade
+        self.clients[0].on_connect = self.on_connect
+        self.clients[0].on_message = self.on_message
+        for client in self.clients:
+            client.connect(self.broker_address, self.broker_port, 60)
+            client.loop_start()
+
+        threading.Thread(target=self.run, name="fleet").start()
+        if self.report_interval > 0:
+            threading.Thread(target=self.report, daemon=True).start()
+
+    def on_connect(self, client, userdata, flags, rc):
+        print(f"Conectado ao Broker MQTT endereco {self.broker_address} ({len(self.room_ids)} salas)")
+        client.subscribe(f"{self.group_id}_ACT")
+
+    def on_message(self, client, userdata, message):
+        payload = json.loads(message.payload)
+        if "salas" in payload:
+            self.apply_broadcast(payload)
+            return
+
+        i = self.index.get(payload.get("numero_sala"))
+        if i is None:
+            return
+
+        direction = DIRECTIONS.get(payload.get("acao"))
+        if direction is None:
+            return
+        if payload.get("tipo_controle") == "AC":
+            self.ac_direction[i] = direction
+        elif payload.get("tipo_controle") == "HC":
+            self.hc_direction[i] = direction
+        self.commands += 1
+
+    def apply_broadcast(self, payload):
+        # Comando para varias salas: cada sala e localizada pelo indice, e o estado e alterado de uma vez
+        if payload.get("tipo_controle") != "ALARM":
+            return
+        rooms = [i for i in map(self.index.get, payload["salas"]) if i is not None]
+        self.alarm_armed[rooms] = payload.get("acao") == "ON"
+        self.commands += len(rooms)
+        self.broadcasts += 1
+
+    def run(self):
+        now = time.monotonic()
+        count = len(self.room_ids)
+        # Fases aleatorias para espalhar as publicacoes ao longo do primeiro intervalo
+        next_publish = now + self.rng.uniform(0, 1, count) * self.temp_time
+        next_toggle = now + self.mov_time
+        while True:
+            now = time.monotonic()
+
+            toggle = np.flatnonzero((next_toggle <= now) & self.intrusion)
+            if toggle.size:
+                self.movimento[toggle] ^= 1
+                next_toggle[toggle] += self.mov_time[toggle]
+
+            due = np.flatnonzero(next_publish <= now)
+            if due.size:
+                self.step(due)
+                self.publish(due)
+                next_publish[due] += self.temp_time[due] * self.rng.uniform(1 - self.jitter, 1 + self.jitter, due.size)
+
+            wake = min(next_publish.min(), next_toggle[self.intrusion].min(initial=np.inf))
+            time.sleep(max(wake - time.monotonic(), 0.001))
+
+    def step(self, rooms):
+        # Mesma dinamica de RoomSimulator.simulate_temperature/simulate_humidity, para todas as salas devidas de uma vez
+        ac = self.ac_direction[rooms]
+        drift = self.rng.uniform(*TEMPERATURE_DRIFT, rooms.size)
+        self.temperatura[rooms] += np.where(ac != 0, ac * AC_STEP, drift)
+
+        hc = self.hc_direction[rooms]
+        drift = self.rng.uniform(*HUMIDITY_DRIFT, rooms.size)
+        self.umidade[rooms] = np.clip(self.umidade[rooms] + np.where(hc != 0, hc * HC_STEP, drift), 0, 100)
+
+    def publish(self, rooms):
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp_ms = int(time.time() * 1000)
+        temperatura = self.temperatura[rooms]
+        # Sensores do tipo 2 reportam em Fahrenheit
+        temperatura = np.where(self.sensor_type[rooms] == 2, temperatura * 9 / 5 + 32, temperatura).round(2).tolist()
+        umidade = self.umidade[rooms].round(2).tolist()
+        for i, room, temp, hum in zip(rooms.tolist(), [self.room_ids[i] for i in rooms.tolist()], temperatura, umidade):
+            movimento = int(self.movimento[i])
+            ac_funcionando = int(self.ac_direction[i] != 0)
+            hc_funcionando = int(self.hc_direction[i] != 0)
+            if self.binary:
+                payload = encode_room_data(room, int(self.sensor_type[i]), temp, hum, movimento, ac_funcionando, hc_funcionando, timestamp_ms)
+            else:
+                payload = json.dumps({
+                    "temperatura": temp,
+                    "umidade": hum,
+                    "movimento": movimento,
+                    "ac_funcionando": ac_funcionando,
+                    "hc_funcionando": hc_funcionando,
+                    "tipo_sensor": int(self.sensor_type[i]),
+                    "numero_sala": room,
+                    "timestamp": timestamp,
+                })
+            self.clients[i % len(self.clients)].publish(self.topics[i], payload)
+        self.published += rooms.size
+
+    def report(self):
+        published = 0
+        while True:
+            time.sleep(self.report_interval)
+            rate = (self.published - published) / self.report_interval
+            published = self.published
+            print(f"{datetime.datetime.now():%Y-%m-%d %H:%M:%S}: {published} leituras publicadas ({rate:.0f}/s), "
+                  f"{self.commands} comandos ({self.broadcasts} para varias salas), alarme ativo em {np.count_nonzero(self.alarm_armed)} salas, AC ligado em {np.count_nonzero(self.ac_direction)} salas, HC em {np.count_nonzero(self.hc_direction)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simula varias salas em um unico processo")
+    parser.add_argument("group_id")
+    parser.add_argument("rooms", type=int, help="Numero de salas")
+    parser.add_argument("temp_time", type=float, help="Intervalo medio entre leituras (s)")
+    parser.add_argument("mov_time", type=float, help="Intervalo medio entre mudancas de movimento (s)")
+    parser.add_argument("--first-room", type=int, default=1)
+    parser.add_argument("--spread", type=float, default=0.0, help="Variacao relativa dos intervalos entre salas")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Variacao relativa do intervalo a cada leitura")
+    parser.add_argument("--fahrenheit", type=float, default=0.0, help="Fracao de sensores do tipo 2 (Fahrenheit)")
+    parser.add_argument("--intrusion", type=float, default=1.0, help="Fracao de salas que simulam intrusao")
+    parser.add_argument("--connections", type=int, default=1, help="Conexoes MQTT usadas para publicar")
+    parser.add_argument("--binary", action="store_true", help="Publica no formato binario")
+    parser.add_argument("--partitions", type=int, default=0, help="Particoes dos processadores em cluster (0 = topico unico)")
+    parser.add_argument("--broker", default="192.168.1.66")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+
+    room_ids = range(args.first_room, args.first_room + args.rooms)
+    fleet = RoomFleet(args.broker, args.port, args.group_id, room_ids, args.temp_time, args.mov_time, args.spread, args.jitter,
+                      args.fahrenheit, args.intrusion, args.binary, args.connections,
+                      partitions=args.partitions)
+    fleet.start()
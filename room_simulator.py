@@ -1,23 +1,49 @@
 import paho.mqtt.client as mqtt
+import configparser
 import json
 import random
 import time
 import sys
 import threading
 import datetime
+from telemetry_codec import encode_room_data
+from cluster import partition_of
+from metrics import MetricsRegistry, MetricsServer, RateLimitedLog
+from profiling import ProfilingControl
+
+# Dinamica das salas, compartilhada com a simulacao em frota (room_fleet.py)
+AC_STEP = 0.5  # Variacao da temperatura por leitura com o AC ligado
+TEMPERATURE_DRIFT = (-0.1, 0.5)  # Variacao aleatoria da temperatura com o AC desligado
+HC_STEP = 5  # Variacao da umidade por leitura com o controlador ligado
+HUMIDITY_DRIFT = (-5, 10)  # Variacao aleatoria da umidade com o controlador desligado
 
 class RoomSimulator:
-    def __init__(self, broker_address, broker_port, group_id, temp_time, mov_time, room_id):
+    def __init__(self, broker_address, broker_port, group_id, temp_time, mov_time, room_id, binary=False,
+                 metrics_port=0, log_messages=True, log_rate=10, partitions=0, profiling_dir=None, profiling_hz=100):
         self.broker_address = broker_address
         self.broker_port = broker_port
         self.group_id = group_id
         self.room_id = room_id
         self.temp_time = temp_time
         self.mov_time = mov_time
+        self.binary = binary  # Publica as leituras no formato binario de telemetry_codec em vez de JSON
+        # Com processadores em cluster, as leituras vao para o topico da particao da sala
+        self.topic = f"{group_id}_ROOM_DATA/{partition_of(room_id, partitions)}" if partitions else f"{group_id}_ROOM_DATA"
         
         self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1)
         self.ac_funcionando = False
         self.hc_funcionando = False
+        self.alarme_ativo = True  # Alarme de movimento da sala, ligado e desligado pelo Alarm Console
+
+        self.metrics = MetricsRegistry("simulator")
+        self.metrics_port = metrics_port
+        self.encode_seconds = self.metrics.stage("encode")
+        self.publish_seconds = self.metrics.stage("mqtt_publish")
+        self.command_seconds = self.metrics.stage("actuator_apply")
+        self.readings_published = self.metrics.counter("readings_published", "Leituras publicadas")
+        self.commands_received = self.metrics.counter("commands_received", "Comandos recebidos da central para esta sala")
+        self.log = RateLimitedLog(log_messages, log_rate)
+        self.profiling = ProfilingControl(f"simulator-{room_id}", self.status, profiling_dir, profiling_hz) if profiling_dir else None
 
     def start(self):
         self.temperatura = random.uniform(20, 25)
@@ -30,22 +56,46 @@ class RoomSimulator:
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.connect(self.broker_address, self.broker_port, 60)
+        if self.metrics_port > 0:
+            MetricsServer(self.metrics, port=self.metrics_port).start()
+        if self.profiling:
+            self.profiling.start()
 
         threading.Thread(target=self.client.loop_forever).start()
         time.sleep(3)
         threading.Thread(target=self.simulate_room_data).start()
         threading.Thread(target=self.simulate_intrusion).start()
 
+    def status(self):
+        return {
+            "room_id": self.room_id,
+            "ac_funcionando": self.ac_funcionando,
+            "hc_funcionando": self.hc_funcionando,
+            "alarme_ativo": self.alarme_ativo,
+            "readings_published": self.readings_published.value,
+            "commands_received": self.commands_received.value,
+        }
+
     def on_connect(self, client, userdata, flags, rc):
         print(f"Conectado ao Broker MQTT endereco {self.broker_address}")
         self.client.subscribe(f"{self.group_id}_ACT")
 
     def on_message(self, client, userdata, message):
+        start = time.perf_counter()
         payload = json.loads(message.payload)
         tipo_controle = payload.get("tipo_controle")
 
+        if "salas" in payload:
+            # Comando para varias salas (alarme ON/OFF), aplicado se esta sala estiver na lista
+            if tipo_controle == "ALARM" and self.room_id in set(payload["salas"]):
+                self.commands_received.inc()
+                self.alarme_ativo = payload.get("acao") == "ON"
+                self.log(f"Alarme de movimento {'ativado' if self.alarme_ativo else 'desativado'} na sala {self.room_id}")
+            return
+
         if payload.get("numero_sala") != self.room_id:
             return
+        self.commands_received.inc()
 
         if tipo_controle == "AC":
             if payload.get("acao") == "UP" or payload.get("acao") == "DOWN":
@@ -65,6 +115,8 @@ class RoomSimulator:
                 self.hc_funcionando = False
                 self.hc_acao = None
 
+        self.command_seconds.observe(time.perf_counter() - start)
+
     def simulate_room_data(self):
         while True:
             self.temperatura = self.simulate_temperature()
@@ -76,22 +128,22 @@ class RoomSimulator:
     def simulate_temperature(self):
         if self.ac_funcionando:
             if self.ac_acao == "DOWN":
-                self.temperatura -= 0.5
+                self.temperatura -= AC_STEP
             elif self.ac_acao == "UP":
-                self.temperatura += 0.5
+                self.temperatura += AC_STEP
         else:
-            self.temperatura += random.uniform(-0.1, 0.5)
+            self.temperatura += random.uniform(*TEMPERATURE_DRIFT)
 
         return self.temperatura
         
     def simulate_humidity(self):
         if self.hc_funcionando:
             if self.hc_acao == "DOWN":
-                self.umidade -= 5
+                self.umidade -= HC_STEP
             elif self.hc_acao == "UP":
-                self.umidade += 5
+                self.umidade += HC_STEP
         else:
-            self.umidade += random.uniform(-5, 10)
+            self.umidade += random.uniform(*HUMIDITY_DRIFT)
         return max(min(self.umidade, 100), 0)
 
     def simulate_intrusion(self):
@@ -103,6 +155,7 @@ class RoomSimulator:
                 self.movimento = 0
 
     def publish_room_data(self, temperatura, umidade, movimento, timestamp):
+        start = time.perf_counter()
         dados_sala = {
             "temperatura": round(temperatura, 2),
             "umidade": round(umidade, 2),
@@ -113,23 +166,43 @@ class RoomSimulator:
             "numero_sala": self.room_id,
             "timestamp": timestamp
         }
-        self.client.publish(f"{self.group_id}_ROOM_DATA", json.dumps(dados_sala))
-        print(f"{timestamp}: Temperatura: {dados_sala['temperatura']}°C, Umidade: {dados_sala['umidade']}%, Movimento: {dados_sala['movimento']}, AC: {dados_sala['ac_funcionando']}, HC: {dados_sala['hc_funcionando']}")
+        if self.binary:
+            payload = encode_room_data(self.room_id, 1, dados_sala["temperatura"], dados_sala["umidade"], movimento,
+                                       self.ac_funcionando, self.hc_funcionando, int(time.time() * 1000))
+        else:
+            payload = json.dumps(dados_sala)
+        encoded = time.perf_counter()
+        self.encode_seconds.observe(encoded - start)
+        self.client.publish(self.topic, payload)
+        self.publish_seconds.observe(time.perf_counter() - encoded)
+        self.readings_published.inc()
+        self.log(f"{timestamp}: Temperatura: {dados_sala['temperatura']}°C, Umidade: {dados_sala['umidade']}%, Movimento: {dados_sala['movimento']}, AC: {dados_sala['ac_funcionando']}, HC: {dados_sala['hc_funcionando']}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 5:
-        print("Usage: python script.py <group_id> <temp_time> <mov_time> <room_id>")
+    if len(sys.argv) not in (5, 6) or (len(sys.argv) == 6 and sys.argv[5] != "--binary"):
+        print("Usage: python script.py <group_id> <temp_time> <mov_time> <room_id> [--binary]")
         sys.exit(1)
 
-    broker_address = "192.168.1.66"
-    broker_port = 1883
     group_id = sys.argv[1]
     temp_time = int(sys.argv[2])
     mov_time = int(sys.argv[3])
     room_id = int(sys.argv[4])
+    binary = len(sys.argv) == 6
+
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    broker_address = config.get('network', 'broker_address', fallback="192.168.1.66")
+    broker_port = config.getint('network', 'broker_port', fallback=1883)
+    metrics_port = config.getint('metrics', 'simulator_port', fallback=0)
+    log_messages = config.getboolean('metrics', 'log_messages', fallback=True)
+    log_rate = config.getint('metrics', 'log_rate', fallback=10)
+    partitions = config.getint('cluster', 'partitions', fallback=0)
+    profiling_dir = config.get('profiling', 'directory', fallback="") or None
+    profiling_hz = config.getint('profiling', 'sample_hz', fallback=100)
 
     try:
-        simulator = RoomSimulator(broker_address, broker_port, group_id, temp_time, mov_time, room_id)
+        simulator = RoomSimulator(broker_address, broker_port, group_id, temp_time, mov_time, room_id, binary, metrics_port, log_messages, log_rate,
+                                  partitions, profiling_dir, profiling_hz)
         simulator.start()
     except Exception as e:
         print("Erro ao iniciar a simulação:", e)
@@ -0,0 +1,136 @@
+import datetime
+import functools
+import threading
+from array import array
+
+@functools.lru_cache(maxsize=4096)
+def local_seconds(timestamp):
+    # A conversao do horario local consulta o fuso a cada chamada; leituras do mesmo segundo repetem o texto
+    return datetime.datetime.fromisoformat(timestamp).timestamp()
+
+def parse_timestamp(timestamp):
+    # Converte o timestamp das leituras em segundos desde 1970 (UTC), o mesmo relogio dos pontos do writer: texto
+    # ("%Y-%m-%d %H:%M:%S" no horario local dos simuladores, sem passar por strptime) ou milissegundos, como na
+    # telemetria binaria
+    if isinstance(timestamp, int):
+        return timestamp / 1000
+    return local_seconds(timestamp)
+
+class DirtyTracker:
+    def __init__(self):
+        self.rows = set()
+        self.lock = threading.Lock()
+
+    def add(self, row):
+        with self.lock:
+            self.rows.add(row)
+
+    def drain(self):
+        # Retorna as linhas alteradas desde a ultima chamada
+        with self.lock:
+            rows, self.rows = self.rows, set()
+        return sorted(rows)
+
+class RoomStore:
+    # Colunas numericas (float64) e flags (int8); cada sala ocupa uma linha em todas as colunas
+    FLOAT_FIELDS = ("temperature", "humidity", "last_update", "ac_cost", "hc_cost", "ac_power_consumption", "hc_power_consumption")
+    FLAG_FIELDS = ("connected", "ac_funcionando", "hc_funcionando", "movement")
+    FIELDS = FLOAT_FIELDS + FLAG_FIELDS
+
+    def __init__(self):
+        self.index = {}  # Numero da sala -> linha
+        self.room_numbers = []  # Linha -> numero da sala
+        for field in self.FLOAT_FIELDS:
+            setattr(self, field, array("d"))
+        for field in self.FLAG_FIELDS:
+            setattr(self, field, array("b"))
+        self.trackers = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.room_numbers)
+
+    def __contains__(self, room_number):
+        return room_number in self.index
+
+    def row(self, room_number):
+        return self.index.get(room_number)
+
+    def add(self, room_number, temperature, humidity, last_update, ac_funcionando, hc_funcionando, movement):
+        # Salas novas podem chegar por workers diferentes; a insercao precisa ser atomica em todas as colunas.
+        # O numero da sala e gravado como inteiro de 64 bits no snapshot e no handoff do cluster: uma sala com
+        # outro tipo de numero e recusada aqui, e nao depois, ao gravar o estado
+        if not isinstance(room_number, int) or not -2 ** 63 <= room_number < 2 ** 63:
+            raise ValueError(f"Numero de sala invalido: {room_number!r}")
+        with self.lock:
+            row = self.index.get(room_number)
+            if row is not None:
+                return row
+            row = len(self.room_numbers)
+            self.temperature.append(temperature)
+            self.humidity.append(humidity)
+            self.last_update.append(last_update)
+            self.ac_cost.append(0)
+            self.hc_cost.append(0)
+            self.ac_power_consumption.append(0)
+            self.hc_power_consumption.append(0)
+            self.connected.append(1)
+            self.ac_funcionando.append(int(ac_funcionando))
+            self.hc_funcionando.append(int(hc_funcionando))
+            self.movement.append(int(movement))
+            self.room_numbers.append(room_number)
+            self.index[room_number] = row
+        return row
+
+    def track_dirty(self):
+        tracker = DirtyTracker()
+        self.trackers.append(tracker)
+        return tracker
+
+    def mark_dirty(self, row):
+        for tracker in self.trackers:
+            tracker.add(row)
+
+    def get(self, room_number):
+        row = self.index.get(room_number)
+        if row is None:
+            return None
+        return self.record(row)
+
+    def record(self, row):
+        record = {"room_number": self.room_numbers[row]}
+        for field in self.FLOAT_FIELDS:
+            record[field] = getattr(self, field)[row]
+        for field in self.FLAG_FIELDS:
+            record[field] = bool(getattr(self, field)[row])
+        return record
+
+    def snapshot(self):
+        # Copia consistente de todas as colunas, para exportacoes em massa
+        with self.lock:
+            snapshot = {field: array(getattr(self, field).typecode, getattr(self, field)) for field in self.FIELDS}
+            snapshot["room_number"] = list(self.room_numbers)
+        return snapshot
+
+    def columns(self):
+        # Referencias (sem copia) para as colunas atuais, para leituras de poucas linhas
+        columns = {field: getattr(self, field) for field in self.FIELDS}
+        columns["room_number"] = self.room_numbers
+        return columns
+
+    def restore(self, snapshot, index=None):
+        # Inverso de snapshot(): substitui todas as colunas, na carga do estado salvo
+        with self.lock:
+            for field in self.FIELDS:
+                setattr(self, field, snapshot[field])
+            self.room_numbers = list(snapshot["room_number"])
+            self.index = index if index is not None else dict(zip(self.room_numbers, range(len(self.room_numbers))))
+
+    def column(self, field):
+        # Copia NumPy de uma coluna, para varreduras vetorizadas. A visao sobre o buffer e
+        # liberada ainda dentro do lock, pois um array exportando o buffer nao pode crescer.
+        import numpy
+        values = getattr(self, field)
+        dtype = numpy.float64 if values.typecode == "d" else numpy.int8
+        with self.lock:
+            return numpy.frombuffer(values, dtype=dtype, count=len(values)).copy()
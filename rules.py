@@ -0,0 +1,163 @@
+import configparser
+import os
+import threading
+import time
+from collections import namedtuple
+
+# Limites de uma sala: liga o atuador fora de [low, high] e desliga com folga de margin dos limites
+Rule = namedtuple("Rule", ["temperature_low", "temperature_high", "temperature_ideal", "temperature_margin",
+                           "humidity_low", "humidity_high", "humidity_ideal", "humidity_margin"])
+
+DEFAULT_MARGINS = {"temperature": 3.0, "humidity": 5.0}
+
+def read_intervals(path):
+    # Formato original do intervals.cfg: "low high ideal" da temperatura e, na linha seguinte, da umidade
+    config = {}
+    with open(path, "r") as file:
+        for line in file:
+            values = line.strip().split()
+            config["temperature"] = {"low": float(values[0]), "high": float(values[1]), "ideal": float(values[2])}
+            values = next(file).strip().split()
+            config["humidity"] = {"low": float(values[0]), "high": float(values[1]), "ideal": float(values[2])}
+    return config
+
+def parse_rooms(text):
+    # "1-50, 60, 72" -> 1..50, 60 e 72
+    rooms = []
+    for part in text.replace(",", " ").split():
+        if "-" in part:
+            first, last = part.split("-")
+            rooms.extend(range(int(first), int(last) + 1))
+        else:
+            rooms.append(int(part))
+    return rooms
+
+def apply_section(values, section):
+    # Sobrepoe "low high ideal" e a margem de cada grandeza definidos na secao
+    values = dict(values)
+    for quantity in ("temperature", "humidity"):
+        if quantity in section:
+            low, high, ideal = (float(value) for value in section[quantity].split())
+            values[f"{quantity}_low"], values[f"{quantity}_high"], values[f"{quantity}_ideal"] = low, high, ideal
+        if f"{quantity}_margin" in section:
+            values[f"{quantity}_margin"] = float(section[f"{quantity}_margin"])
+    return values
+
+class RuleSet:
+    # Regras compiladas: um dicionario sala -> Rule, com as regras compartilhadas entre as salas do mesmo perfil
+    def __init__(self, default, rooms):
+        self.default = default
+        self.rooms = rooms
+
+    def lookup(self, room_number):
+        return self.rooms.get(room_number, self.default)
+
+def compile_rules(rules_path, intervals_path):
+    # Precedencia: [room:N] > [zone:nome] > [default] > intervals.cfg. Zonas e salas usam um perfil (profile = nome)
+    # e podem sobrepor valores diretamente na propria secao
+    base = {}
+    if os.path.exists(intervals_path):
+        for quantity, limits in read_intervals(intervals_path).items():
+            for key, value in limits.items():
+                base[f"{quantity}_{key}"] = value
+    for quantity, margin in DEFAULT_MARGINS.items():
+        base[f"{quantity}_margin"] = margin
+
+    parser = configparser.ConfigParser()
+    if rules_path and os.path.exists(rules_path):
+        with open(rules_path, "r") as file:
+            parser.read_file(file)
+    if parser.has_section("default"):
+        base = apply_section(base, parser["default"])
+    if set(Rule._fields) - set(base):
+        raise ValueError("Limites padrao incompletos: defina intervals.cfg ou a secao [default]")
+
+    profiles = {}
+    for name in parser.sections():
+        if name.startswith("profile:"):
+            profiles[name[len("profile:"):]] = apply_section(base, parser[name])
+
+    cache = {}  # Valores -> Rule, para que salas com os mesmos limites compartilhem o objeto
+
+    def resolve(section, inherited):
+        values = inherited
+        if "profile" in section:
+            if section["profile"] not in profiles:
+                raise ValueError(f"Perfil desconhecido: {section['profile']}")
+            values = profiles[section["profile"]]
+        values = apply_section(values, section)
+        rule = Rule(**values)
+        return cache.setdefault(rule, rule), values
+
+    default = Rule(**base)
+    rooms = {}
+    zones = {}
+    for name in parser.sections():
+        if name.startswith("zone:"):
+            rule, values = resolve(parser[name], base)
+            zones[name] = values
+            for room in parse_rooms(parser[name].get("rooms", "")):
+                rooms[room] = rule
+    for name in parser.sections():
+        if name.startswith("room:"):
+            room = int(name[len("room:"):])
+            zone = parser[name].get("zone")
+            inherited = zones[f"zone:{zone}"] if zone else base
+            rooms[room], _ = resolve(parser[name], inherited)
+    return RuleSet(default, rooms)
+
+class RuleEngine:
+    # Mantem o RuleSet atual e o recompila quando rules_path ou intervals_path mudam.
+    # A troca e uma unica atribuicao: cada leitura usa o conjunto antigo ou o novo, nunca uma mistura.
+    def __init__(self, rules_path, intervals_path="intervals.cfg", poll_interval=2.0):
+        self.rules_path = rules_path
+        self.intervals_path = intervals_path
+        self.poll_interval = poll_interval
+        self.mtimes = self.read_mtimes()
+        self.current = compile_rules(rules_path, intervals_path)
+        self.reloads = 0
+        self.reload_errors = 0
+
+    def lookup(self, room_number):
+        return self.current.lookup(room_number)
+
+    def read_mtimes(self):
+        mtimes = []
+        for path in (self.rules_path, self.intervals_path):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns if path else None)
+            except OSError:
+                mtimes.append(None)
+        return mtimes
+
+    def start(self):
+        if self.poll_interval > 0:
+            threading.Thread(target=self.run, name="rules-reload", daemon=True).start()
+
+    def run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            self.reload_if_changed()
+
+    def reload_if_changed(self):
+        mtimes = self.read_mtimes()
+        if mtimes == self.mtimes:
+            return False
+        self.mtimes = mtimes
+        try:
+            rules = compile_rules(self.rules_path, self.intervals_path)
+        except (OSError, ValueError, KeyError, IndexError, configparser.Error) as e:
+            self.reload_errors += 1
+            print(f"Erro ao recarregar as regras, mantendo as anteriores: {e}")
+            return False
+        self.current = rules
+        self.reloads += 1
+        print(f"Regras recarregadas: {len(rules.rooms)} salas com regras proprias")
+        return True
+
+    def stats(self):
+        return {
+            "rooms": len(self.current.rooms),
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+        }
@@ -0,0 +1,138 @@
+import math
+import numbers
+import os
+import threading
+
+# Destinos dos pontos gravados pelo InfluxBatchWriter. Todos recebem listas de Point ou de linhas ja em line protocol
+# (reenvio do spool); bibliotecas pesadas sao importadas apenas pelo sink que as usa.
+SINKS = ("influx", "file", "null")
+REJECTED_STATUS = (400, 422)  # Respostas do InfluxDB para linhas invalidas: o mesmo lote seria recusado de novo
+
+class SinkUnavailableError(Exception):
+    # Falha temporaria do destino (rede, servidor, autenticacao ou disco); o lote pode ser reenviado depois
+    pass
+
+class RejectedWriteError(Exception):
+    # O destino recusou os pontos; reenviar o mesmo lote nao adianta
+    pass
+
+def escape(text, characters):
+    text = str(text).replace("\\", "\\\\")
+    for character in characters:
+        text = text.replace(character, "\\" + character)
+    return text
+
+def format_field(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, numbers.Integral):
+        return f"{int(value)}i"
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        if not math.isfinite(value):
+            return None  # NaN e infinito nao sao aceitos pelo InfluxDB
+        text = repr(value)
+        return text[:-2] if text.endswith(".0") else text  # Sem sufixo o valor ja e float no line protocol
+    if isinstance(value, str):
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    return "true" if value else "false"  # numpy.bool_
+
+class Point:
+    # Ponto no formato do InfluxDB (medida, tags, campos e timestamp em ns), serializado em line protocol
+    # sem depender do influxdb_client_3. Mesma interface encadeavel e mesma saida (tags e campos ordenados
+    # pela chave) do Point do cliente oficial.
+    __slots__ = ("name", "tags", "fields", "timestamp")
+
+    def __init__(self, name):
+        self.name = name
+        self.tags = {}
+        self.fields = {}
+        self.timestamp = None
+
+    def tag(self, key, value):
+        self.tags[key] = value
+        return self
+
+    def field(self, key, value):
+        self.fields[key] = value
+        return self
+
+    def time(self, timestamp):
+        self.timestamp = timestamp
+        return self
+
+    def to_line_protocol(self):
+        line = escape(self.name, ", ")
+        for key, value in sorted(self.tags.items()):
+            if value is not None and value != "":
+                line += f",{escape(key, ',= ')}={escape(value, ',= ')}"
+        fields = []
+        for key, value in sorted(self.fields.items()):
+            formatted = format_field(value) if value is not None else None
+            if formatted is not None:
+                fields.append(f"{escape(key, ',= ')}={formatted}")
+        line += " " + ",".join(fields)
+        if self.timestamp is not None:
+            line += f" {int(self.timestamp)}"
+        return line
+
+def to_lines(records):
+    return [record if isinstance(record, str) else record.to_line_protocol() for record in records]
+
+class InfluxSink:
+    # InfluxDB Cloud. O influxdb_client_3 (e com ele o pyarrow) so e importado quando este sink e criado
+    def __init__(self, host, token, org, database):
+        from influxdb_client_3 import InfluxDBClient3, InfluxDBError
+        from urllib3.exceptions import HTTPError
+        self.client = InfluxDBClient3(host=host, token=token, org=org, database=database)
+        self.database = database
+        self.server_error = InfluxDBError
+        self.connection_errors = (HTTPError, OSError)
+
+    def write(self, records):
+        try:
+            self.client.write(database=self.database, record="\n".join(to_lines(records)))
+        except self.server_error as e:
+            status = getattr(e.response, "status", None)
+            if status in REJECTED_STATUS:
+                raise RejectedWriteError(f"HTTP {status}: {e}") from e
+            raise SinkUnavailableError(f"HTTP {status}: {e}") from e
+        except self.connection_errors as e:
+            raise SinkUnavailableError(str(e)) from e
+
+class LineProtocolFileSink:
+    # Arquivo local em line protocol, para nos de borda sem acesso a nuvem; pode ser importado depois com o CLI do InfluxDB
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "a", buffering=1024 * 1024)
+        self.lock = threading.Lock()
+
+    def write(self, records):
+        data = "\n".join(to_lines(records)) + "\n"
+        with self.lock:
+            try:
+                self.file.write(data)
+                self.file.flush()
+            except OSError as e:
+                raise SinkUnavailableError(str(e)) from e
+
+class NullSink:
+    # Descarta os pontos, apenas contando-os (testes, simulacoes e benchmarks)
+    def __init__(self):
+        self.points = 0
+        self.writes = 0
+
+    def write(self, records):
+        self.points += len(records)
+        self.writes += 1
+
+def create_sink(kind, host=None, token=None, org=None, database=None, path=None):
+    if kind == "influx":
+        return InfluxSink(host, token, org, database)
+    if kind == "file":
+        return LineProtocolFileSink(path)
+    if kind == "null":
+        return NullSink()
+    raise ValueError(f"Sink invalido: {kind} (use {', '.join(SINKS)})")
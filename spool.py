@@ -0,0 +1,142 @@
+import os
+import threading
+from metrics import RateWindow
+
+class DiskSpool:
+    # Fila em disco de linhas no line protocol do InfluxDB, em segmentos somente-anexados <diretorio>/<sequencia>.lp.
+    # As linhas sao lidas a partir do segmento mais antigo; segmentos confirmados por completo sao apagados
+    # e, acima de max_bytes, os segmentos mais antigos sao descartados.
+    def __init__(self, directory, segment_bytes=8 * 1024 * 1024, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.segments = []  # [sequencia, bytes, linhas], do mais antigo ao mais recente
+        self.bytes = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".lp"):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, "rb") as file:
+                data = file.read()
+            if not data:
+                os.remove(path)
+                continue
+            # Segmentos que sobraram de uma execucao anterior sao reenviados desde o inicio
+            self.segments.append([int(name[:-3]), len(data), data.count(b"\n")])
+            self.bytes += len(data)
+        self.file = None  # Segmento aberto para escrita (sempre o ultimo da lista)
+        self.read_offset = 0  # Posicao ja confirmada no segmento mais antigo
+        self.read_lines = 0
+
+        self.lines_spooled = 0
+        self.lines_replayed = 0
+        self.lines_evicted = 0
+        self.lines_quarantined = 0
+        self.replay_rate = RateWindow()
+
+    def path(self, sequence):
+        return os.path.join(self.directory, f"{sequence:012d}.lp")
+
+    def append(self, lines):
+        data = ("\n".join(lines) + "\n").encode()
+        with self.lock:
+            if self.file is None or self.segments[-1][1] >= self.segment_bytes:
+                self.rotate()
+            self.file.write(data)
+            self.file.flush()  # Visivel para a leitura e preservado se o processo cair
+            self.segments[-1][1] += len(data)
+            self.segments[-1][2] += len(lines)
+            self.bytes += len(data)
+            self.lines_spooled += len(lines)
+            self.evict()
+
+    def rotate(self):
+        if self.file:
+            self.file.close()
+        sequence = self.segments[-1][0] + 1 if self.segments else 0
+        self.segments.append([sequence, 0, 0])
+        self.file = open(self.path(sequence), "ab")
+
+    def evict(self):
+        # Descarta os segmentos mais antigos ate voltar ao limite, mantendo o segmento atual
+        while self.bytes > self.max_bytes and len(self.segments) > 1:
+            sequence, size, lines = self.segments.pop(0)
+            os.remove(self.path(sequence))
+            self.bytes -= size
+            self.lines_evicted += lines - self.read_lines
+            self.read_offset = 0
+            self.read_lines = 0
+
+    def read(self, max_bytes=1024 * 1024):
+        # Proximas linhas do segmento mais antigo, sem consumi-las: (linhas, cursor para ack)
+        with self.lock:
+            if not self.segments or self.read_offset >= self.segments[0][1]:
+                return [], None
+            sequence, size, _ = self.segments[0]
+            offset = self.read_offset
+            with open(self.path(sequence), "rb") as file:
+                file.seek(offset)
+                data = file.read(min(max_bytes, size - offset))
+                if b"\n" not in data:
+                    data += file.readline()  # Uma linha maior que max_bytes e lida inteira
+        end = data.rfind(b"\n") + 1 or len(data)
+        lines = data[:end].decode().split("\n")
+        if not lines[-1]:
+            lines.pop()
+        return lines, (sequence, offset + end, len(lines))
+
+    def prefix(self, cursor, lines, count):
+        # Cursor de ack que confirma apenas as primeiras count linhas de um read()
+        sequence, end, _ = cursor
+        return sequence, end - sum(len(line.encode()) + 1 for line in lines[count:]), count
+
+    def ack(self, cursor):
+        # Confirma as linhas de read(); o segmento e apagado quando lido por completo
+        sequence, offset, lines = cursor
+        with self.lock:
+            if not self.segments or self.segments[0][0] != sequence:
+                return  # Segmento descartado enquanto era reenviado
+            self.read_offset = offset
+            self.read_lines += lines
+            self.lines_replayed += lines
+            size = self.segments[0][1]
+            if offset >= size:
+                if len(self.segments) == 1 and self.file:
+                    self.file.close()
+                    self.file = None
+                self.segments.pop(0)
+                os.remove(self.path(sequence))
+                self.bytes -= size
+                self.read_offset = 0
+                self.read_lines = 0
+
+    def quarantine(self, lines):
+        # Linhas recusadas pelo destino ficam em <diretorio>/quarantine/rejected.lp, fora do reenvio, para inspecao
+        directory = os.path.join(self.directory, "quarantine")
+        os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            with open(os.path.join(directory, "rejected.lp"), "a") as file:
+                file.write("\n".join(lines) + "\n")
+            self.lines_quarantined += len(lines)
+
+    def depth(self):
+        # Linhas aguardando reenvio
+        with self.lock:
+            return sum(segment[2] for segment in self.segments) - self.read_lines
+
+    def stats(self):
+        replayed = self.lines_replayed
+        stats = {
+            "depth": self.depth(),
+            "bytes": self.bytes,
+            "segments": len(self.segments),
+            "lines_spooled": self.lines_spooled,
+            "lines_replayed": replayed,
+            "lines_evicted": self.lines_evicted,
+            "lines_quarantined": self.lines_quarantined,
+            "replay_rate": self.replay_rate.rate(replayed),
+        }
+        return stats
@@ -0,0 +1,187 @@
+import os
+import struct
+import threading
+import time
+from array import array
+from room_store import RoomStore
+
+# Copia completa: MAGIC, cabecalho e as colunas do RoomStore em sequencia (ordem nativa de bytes, arquivo local).
+# Delta: registros anexados com as mesmas colunas apenas para as linhas alteradas desde o registro anterior.
+MAGIC = b"DPSNAP01"
+HEADER = struct.Struct("<QBdI")  # geracao, alarme, instante da gravacao, salas
+DELTA = struct.Struct("<IQBI")  # bytes do registro, geracao, alarme, salas
+# O numero da sala e um inteiro de 64 bits; RoomStore.add recusa salas com outro tipo de numero
+COLUMNS = (("room_number", "q"),) + tuple((field, "d") for field in RoomStore.FLOAT_FIELDS) + tuple((field, "b") for field in RoomStore.FLAG_FIELDS)
+
+def encode_columns(columns, rows=None):
+    # Concatena as colunas, todas as linhas ou apenas as de rows
+    chunks = []
+    for field, typecode in COLUMNS:
+        values = columns[field]
+        if rows is not None:
+            values = [values[row] for row in rows]
+        chunks.append(values.tobytes() if isinstance(values, array) else array(typecode, values).tobytes())
+    return b"".join(chunks)
+
+def decode_columns(data, offset, count):
+    columns = {}
+    for field, typecode in COLUMNS:
+        values = array(typecode)
+        size = values.itemsize * count
+        values.frombytes(data[offset:offset + size])
+        columns[field] = values
+        offset += size
+    return columns
+
+class StateSnapshot:
+    # Estado do DataProcessor (colunas do RoomStore e flag do alarme) salvo em disco por uma thread propria.
+    # A cada full_every gravacoes, ou na primeira, o estado completo e gravado em um arquivo temporario e trocado
+    # com os.replace; entre elas, apenas as linhas marcadas como alteradas sao anexadas a <path>.delta.
+    # Cada copia completa inicia uma nova geracao, e so os deltas da geracao da copia sao aplicados na carga.
+    def __init__(self, path, rooms, get_alarm, interval=5.0, full_every=60):
+        self.path = path
+        self.rooms = rooms
+        self.get_alarm = get_alarm
+        self.interval = interval
+        self.full_every = full_every
+        self.dirty = rooms.track_dirty()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.generation = 0
+        self.deltas = full_every  # Forca uma copia completa na primeira gravacao
+        self.delta_file = None
+        self.last_alarm = None
+
+        self.full_snapshots = 0
+        self.delta_snapshots = 0
+        self.rows_written = 0
+        self.last_seconds = 0.0
+        self.restored_rooms = 0
+        self.load_seconds = 0.0
+
+    def load(self):
+        # Restaura as colunas no RoomStore; retorna o alarme salvo ou None se nao houver estado valido
+        started = time.perf_counter()
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        if data[:len(MAGIC)] != MAGIC or len(data) < len(MAGIC) + HEADER.size:
+            print(f"Snapshot invalido em {self.path}, iniciando sem estado")
+            return None
+        generation, alarm, _, count = HEADER.unpack_from(data, len(MAGIC))
+        columns = decode_columns(data, len(MAGIC) + HEADER.size, count)
+        if len(columns["room_number"]) != count or any(len(values) != count for values in columns.values()):
+            print(f"Snapshot incompleto em {self.path}, iniciando sem estado")
+            return None
+        index = dict(zip(columns["room_number"], range(count)))
+
+        try:
+            with open(self.path + ".delta", "rb") as file:
+                deltas = file.read()
+        except FileNotFoundError:
+            deltas = b""
+        offset = 0
+        while offset + DELTA.size <= len(deltas):
+            size, delta_generation, delta_alarm, rows = DELTA.unpack_from(deltas, offset)
+            start = offset + DELTA.size
+            if start + size > len(deltas):
+                break  # Registro incompleto, gravado durante uma queda
+            offset = start + size
+            if delta_generation != generation:
+                continue
+            alarm = delta_alarm
+            changes = decode_columns(deltas, start, rows)
+            targets = []  # Linha de cada sala do delta; salas novas sao anexadas ao final
+            for room_number in changes["room_number"]:
+                row = index.get(room_number)
+                if row is None:
+                    row = index[room_number] = len(columns["room_number"])
+                    columns["room_number"].append(room_number)
+                    for field in RoomStore.FIELDS:
+                        columns[field].append(0)
+                targets.append(row)
+            for field in RoomStore.FIELDS:
+                values = columns[field]
+                for row, value in zip(targets, changes[field]):
+                    values[row] = value
+
+        self.rooms.restore(columns, index)
+        self.generation = generation
+        self.restored_rooms = len(index)
+        self.load_seconds = time.perf_counter() - started
+        print(f"Estado restaurado: {self.restored_rooms} salas em {self.load_seconds * 1000:.1f} ms")
+        return bool(alarm)
+
+    def start(self):
+        threading.Thread(target=self.run, name="state-snapshot", daemon=True).start()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.save()
+            except Exception as e:
+                # Uma falha nao pode encerrar a thread. As linhas alteradas ja foram retiradas do DirtyTracker,
+                # entao a proxima gravacao e uma copia completa
+                print(f"Erro ao gravar o snapshot do estado: {e}")
+                self.deltas = self.full_every
+
+    def save(self):
+        started = time.perf_counter()
+        alarm = self.get_alarm()
+        if self.deltas >= self.full_every:
+            self.dirty.drain()  # A copia completa ja inclui todas as linhas
+            self.write_full(alarm)
+        else:
+            # Linhas alteradas depois do drain sao marcadas de novo e entram no proximo delta
+            rows = self.dirty.drain()
+            if not rows and alarm == self.last_alarm:
+                return
+            self.write_delta(rows, alarm)
+        self.last_alarm = alarm
+        self.last_seconds = time.perf_counter() - started
+
+    def write_full(self, alarm):
+        snapshot = self.rooms.snapshot()
+        count = len(snapshot["room_number"])
+        generation = self.generation + 1
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(MAGIC)
+            file.write(HEADER.pack(generation, alarm, time.time(), count))
+            file.write(encode_columns(snapshot))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+        # Deltas da geracao anterior deixam de valer
+        if self.delta_file:
+            self.delta_file.close()
+        self.delta_file = open(self.path + ".delta", "wb")
+        self.generation = generation
+        self.deltas = 0
+        self.full_snapshots += 1
+        self.rows_written += count
+
+    def write_delta(self, rows, alarm):
+        body = encode_columns(self.rooms.columns(), rows)
+        self.delta_file.write(DELTA.pack(len(body), self.generation, alarm, len(rows)) + body)
+        self.delta_file.flush()
+        os.fsync(self.delta_file.fileno())
+        self.deltas += 1
+        self.delta_snapshots += 1
+        self.rows_written += len(rows)
+
+    def stats(self):
+        return {
+            "generation": self.generation,
+            "full_snapshots": self.full_snapshots,
+            "delta_snapshots": self.delta_snapshots,
+            "rows_written": self.rows_written,
+            "last_seconds": self.last_seconds,
+            "restored_rooms": self.restored_rooms,
+            "load_seconds": self.load_seconds,
+        }
@@ -0,0 +1,41 @@
+import json
+import struct
+
+# Formato binario das leituras (big-endian, 20 bytes):
+# magic, versao, numero_sala (uint32), tipo_sensor (uint8), temperatura e umidade em centesimos (int16),
+# flags (bit 0 movimento, bit 1 AC, bit 2 HC) e timestamp em milissegundos desde 1970 (int64)
+MAGIC = 0xA5
+VERSION = 1
+ROOM_DATA = struct.Struct(">BBIBhhBq")
+
+FLAG_MOVEMENT = 1
+FLAG_AC = 2
+FLAG_HC = 4
+
+def encode_room_data(numero_sala, tipo_sensor, temperatura, umidade, movimento, ac_funcionando, hc_funcionando, timestamp_ms):
+    flags = (FLAG_MOVEMENT if movimento else 0) | (FLAG_AC if ac_funcionando else 0) | (FLAG_HC if hc_funcionando else 0)
+    return ROOM_DATA.pack(MAGIC, VERSION, numero_sala, tipo_sensor, round(temperatura * 100), round(umidade * 100), flags, timestamp_ms)
+
+def decode_room_data(payload):
+    magic, version, numero_sala, tipo_sensor, temperatura, umidade, flags, timestamp_ms = ROOM_DATA.unpack(payload)
+    if version != VERSION:
+        raise ValueError(f"Versao de telemetria nao suportada: {version}")
+    return {
+        "temperatura": temperatura / 100,
+        "umidade": umidade / 100,
+        "movimento": flags & FLAG_MOVEMENT,
+        "ac_funcionando": (flags & FLAG_AC) >> 1,
+        "hc_funcionando": (flags & FLAG_HC) >> 2,
+        "tipo_sensor": tipo_sensor,
+        "numero_sala": numero_sala,
+        "timestamp": timestamp_ms,
+    }
+
+def is_binary(payload):
+    return payload[:1] == b"\xa5"
+
+def decode_payload(payload):
+    # Aceita tanto o formato binario quanto o JSON dos publicadores existentes
+    if is_binary(payload):
+        return decode_room_data(payload)
+    return json.loads(payload)
@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import deque
+from queue import Empty, Queue
+from metrics import RateWindow
+
+class ConflatingMailbox:
+    def __init__(self, max_size, conflate_threshold, shed_threshold):
+        self.max_size = max_size
+        self.conflate_threshold = conflate_threshold  # A partir desta profundidade, leituras da mesma sala sao mescladas
+        self.shed_threshold = shed_threshold  # A partir desta profundidade, novas leituras mesclaveis sao descartadas
+
+        self.entries = deque()  # [chave, item], na ordem de chegada
+        self.pending = {}  # Chave -> entrada mesclavel ainda na fila
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+
+        self.merged = 0
+        self.dropped = 0
+
+    def put(self, key, item, mergeable=True):
+        with self.lock:
+            size = len(self.entries)
+            if mergeable and size >= self.conflate_threshold:
+                entry = self.pending.get(key)
+                if entry is not None:
+                    entry[1] = item  # Mantem a posicao na fila, mas com a leitura mais recente
+                    self.merged += 1
+                    return
+            if mergeable and size >= self.shed_threshold:
+                self.dropped += 1
+                return
+
+            while len(self.entries) >= self.max_size:
+                self.not_full.wait()
+            entry = [key, item]
+            self.entries.append(entry)
+            if mergeable:
+                self.pending[key] = entry
+            else:
+                # Leituras seguintes da sala entram depois desta, e nao na entrada anterior, a frente dela na fila
+                self.pending.pop(key, None)
+            self.not_empty.notify()
+
+    def get(self, timeout=None):
+        with self.lock:
+            if timeout is not None:
+                deadline = time.monotonic() + timeout
+            while not self.entries:
+                if timeout is None:
+                    self.not_empty.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Empty
+                    self.not_empty.wait(remaining)
+            key, item = entry = self.entries.popleft()
+            if self.pending.get(key) is entry:
+                del self.pending[key]
+            self.not_full.notify()
+            return item
+
+    def qsize(self):
+        return len(self.entries)
+
+class ShardedWorkerPool:
+    def __init__(self, workers, handler, max_queue=10000, conflate=False, conflate_threshold=0, shed_threshold=None,
+                 batch_handler=None, batch_max=256, batch_window=0.05, metrics=None):
+        self.workers = workers
+        self.handler = handler  # Chamado como handler(*item) na thread do shard
+        # Se definido, os itens sao agrupados em lotes de ate batch_max itens ou batch_window segundos
+        self.batch_handler = batch_handler
+        self.batch_max = batch_max
+        self.batch_window = batch_window
+        self.conflate = conflate
+        if conflate:
+            shed_threshold = max_queue if shed_threshold is None else shed_threshold
+            self.queues = [ConflatingMailbox(max_queue, conflate_threshold, shed_threshold) for _ in range(workers)]
+        else:
+            self.queues = [Queue(max_queue) for _ in range(workers)]
+        self.processed = [0] * workers
+        self.errors = [0] * workers
+
+        self.rates = [RateWindow() for _ in range(workers)]
+        self.threads = []
+
+        # Tempo de cada item na fila do shard e duracao do handler (por item, ou por lote no modo em lote)
+        self.wait_seconds = metrics.stage("queue_wait") if metrics else None
+        self.handle_seconds = metrics.stage("decision_batch" if batch_handler else "decision") if metrics else None
+
+    def start(self):
+        for shard in range(self.workers):
+            target = self.run_batches if self.batch_handler else self.run
+            thread = threading.Thread(target=target, args=(shard,), name=f"worker-{shard}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        for queue in self.queues:
+            if self.conflate:
+                queue.put(None, None, mergeable=False)
+            else:
+                queue.put(None)
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def shard_for(self, key):
+        # A mesma sala sempre cai no mesmo shard, preservando a ordem das suas leituras
+        return hash(key) % self.workers
+
+    def dispatch(self, key, item, mergeable=True):
+        # Bloqueia quando o shard esta cheio, aplicando contrapressao a thread do MQTT
+        # O item entra na fila junto com o instante do envio, para medir o tempo de espera
+        entry = (time.perf_counter(), item)
+        if self.conflate:
+            self.queues[self.shard_for(key)].put(key, entry, mergeable)
+        else:
+            self.queues[self.shard_for(key)].put(entry)
+
+    def observe_wait(self, enqueued, now):
+        if self.wait_seconds:
+            self.wait_seconds.observe(now - enqueued)
+
+    def run(self, shard):
+        queue = self.queues[shard]
+        while True:
+            entry = queue.get()
+            if entry is None:
+                return
+            enqueued, item = entry
+            start = time.perf_counter()
+            self.observe_wait(enqueued, start)
+            try:
+                self.handler(*item)
+            except Exception as e:
+                self.errors[shard] += 1
+                print(f"Erro ao processar mensagem no worker {shard}: {e}")
+            if self.handle_seconds:
+                self.handle_seconds.observe(time.perf_counter() - start)
+            self.processed[shard] += 1
+
+    def run_batches(self, shard):
+        queue = self.queues[shard]
+        while True:
+            entry = queue.get()
+            if entry is None:
+                return
+            self.observe_wait(entry[0], time.perf_counter())
+            batch = [entry[1]]
+            deadline = time.monotonic() + self.batch_window
+            stopping = False
+            while len(batch) < self.batch_max:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = queue.get(timeout=remaining)
+                except Empty:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                self.observe_wait(entry[0], time.perf_counter())
+                batch.append(entry[1])
+
+            start = time.perf_counter()
+            try:
+                self.batch_handler(batch)
+            except Exception as e:
+                self.errors[shard] += 1
+                print(f"Erro ao processar lote de {len(batch)} mensagens no worker {shard}: {e}")
+            if self.handle_seconds:
+                self.handle_seconds.observe(time.perf_counter() - start)
+            self.processed[shard] += len(batch)
+            if stopping:
+                return
+
+    def stats(self):
+        # Profundidade das filas e vazao (mensagens/s) de cada shard nos ultimos segundos
+        processed = list(self.processed)
+        shards = []
+        for shard in range(self.workers):
+            shard_stats = {
+                "queue_size": self.queues[shard].qsize(),
+                "processed": processed[shard],
+                "errors": self.errors[shard],
+                "rate": self.rates[shard].rate(processed[shard]),
+            }
+            if self.conflate:
+                shard_stats["merged"] = self.queues[shard].merged
+                shard_stats["dropped"] = self.queues[shard].dropped
+            shards.append(shard_stats)
+        return shards
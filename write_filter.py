@@ -0,0 +1,56 @@
+import threading
+import time
+
+class ChangeFilter:
+    # Reduz as escritas no InfluxDB: um campo so e gravado quando muda alem da sua banda morta
+    # (campos sem banda, como os booleanos, a cada transicao) ou quando a serie fica heartbeat
+    # segundos sem uma escrita completa, para manter os paineis continuos
+    def __init__(self, deadbands, heartbeat=60):
+        self.deadbands = deadbands  # Campo -> menor variacao gravada, em relacao ao ultimo valor gravado
+        self.heartbeat = heartbeat
+        self.last_values = {}  # (medida, sala) -> {campo: ultimo valor gravado}
+        self.last_full_write = {}  # (medida, sala) -> instante (monotonic) da ultima escrita completa
+        self.lock = threading.Lock()
+
+        self.points_seen = 0
+        self.points_written = 0
+        self.fields_seen = 0
+        self.fields_written = 0
+        self.heartbeats = 0
+
+    def filter(self, key, fields, force=False):
+        # Retorna os campos que devem ser gravados; vazio quando nenhum mudou
+        now = time.monotonic()
+        with self.lock:
+            self.points_seen += 1
+            self.fields_seen += len(fields)
+            last = self.last_values.get(key)
+            if last is None or force or now - self.last_full_write[key] >= self.heartbeat:
+                if last is not None and not force:
+                    self.heartbeats += 1
+                changed = dict(fields)
+                self.last_values[key] = dict(fields)
+                self.last_full_write[key] = now
+            else:
+                changed = {}
+                for field, value in fields.items():
+                    previous = last.get(field)
+                    deadband = self.deadbands.get(field)
+                    if previous is None or (value != previous if deadband is None else abs(value - previous) >= deadband):
+                        changed[field] = value
+                        last[field] = value
+
+            if changed:
+                self.points_written += 1
+                self.fields_written += len(changed)
+        return changed
+
+    def stats(self):
+        return {
+            "points_seen": self.points_seen,
+            "points_written": self.points_written,
+            "fields_seen": self.fields_seen,
+            "fields_written": self.fields_written,
+            "heartbeats": self.heartbeats,
+            "reduction_ratio": 1 - self.fields_written / self.fields_seen if self.fields_seen else 0.0,
+        }